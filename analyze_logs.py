@@ -1,62 +1,224 @@
 import re
 import sys
 import os
+import json
+import time
+import argparse
+from array import array
+from itertools import compress
 from datetime import datetime
-from collections import defaultdict
-import matplotlib.pyplot as plt
-from datetime import timedelta
-
-def parse_log_line(line):
-    """Parse a single log line into timestamp and message"""
-    try:
-        timestamp_str, message = line.strip().split(" - ", 1)
-        timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-        return timestamp, message
-    except ValueError:
-        return None, None
-
-def extract_value(message, pattern):
-    """Extract numerical value from message using regex pattern"""
-    match = re.search(pattern, message)
-    if match:
-        return int(match.group(1))
-    return None
-
-def get_tick_rate(filename):
-    """Extract tick rate from machine's initialization message"""
-    with open(filename, 'r') as f:
-        first_line = f.readline()
-        _, message = parse_log_line(first_line)
-        if message:
-            rate = extract_value(message, r"clock rate: (\d+)")
-            return rate
-    return None
-
-def read_log_file(filename):
-    """Read a log file and extract logical clock and queue length values"""
-    logical_clocks = []
-    queue_lengths = []
-    
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from event_store import EventStoreFile, find_event_stores
+
+# One pattern classifies every line and pulls out all of its fields:
+# timestamp, clock rate (initialization), event prefix, queue length and
+# logical clock. Only receipts have a value before the logical clock (the
+# queue length), and in vector clock mode a vector follows it. Lines it
+# does not match (errors, stats) are skipped
+LOG_LINE = re.compile(
+    r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) - "
+    r"(?:Machine initialized with clock rate: (\d+)"
+    r"|(Received|Sent message to ALL|Sent|Internal)[^:\n]*: (?:(\d+), Logical clock: )?(\d+)"
+    r"(?:, Vector clock: \[[^\]\n]*\])?$)",
+    re.MULTILINE
+)
+
+# Machine logs in a run folder
+LOG_FILE_NAME = re.compile(r"machine_(\d+)\.log$")
+
+# Logs are scanned in chunks of about this many bytes, cut at line ends
+CHUNK_SIZE = 1 << 20
+
+# Event kinds stored alongside the logical clock values
+EVENT_KINDS = {'Received': 0, 'Sent': 1, 'Sent message to ALL': 2, 'Internal': 3}
+EVENT_KIND_NAMES = ['receive', 'send', 'broadcast', 'internal']
+
+# Queue length percentiles reported in the run summary
+QUEUE_PERCENTILES = (50, 90, 99)
+
+# Longer series are downsampled to about this many points before plotting
+MAX_PLOT_POINTS = 2000
+
+# Plots only get a legend up to this many machines
+MAX_LEGEND_ENTRIES = 20
+
+# Logs are written in local time (EventLog's time.localtime converter), so
+# text timestamps are read as local time and every time, from a text log or
+# an event store, is converted back to local time for output
+
+def parse_timestamp(timestamp_str):
+    """Convert a log timestamp, in local time, to seconds since the epoch"""
+    return time.mktime((int(timestamp_str[0:4]), int(timestamp_str[5:7]), int(timestamp_str[8:10]),
+                        int(timestamp_str[11:13]), int(timestamp_str[14:16]), int(timestamp_str[17:19]),
+                        0, 0, -1))
+
+def to_datetime(timestamp):
+    """Convert seconds since the epoch back to the local time written in the log"""
+    return datetime.fromtimestamp(timestamp)
+
+def read_chunks(filename):
+    """Yield a file in large chunks that always end at a line boundary"""
     with open(filename, 'r') as f:
-        for line in f:
-            timestamp, message = parse_log_line(line)
-            if not timestamp:
-                continue
-                
-            logical_clock = extract_value(message, r"Logical clock: (\d+)")
-            if logical_clock is not None:
-                logical_clocks.append((timestamp, logical_clock))
-                
-            queue_length = extract_value(message, r"Queue length: (\d+)")
-            if queue_length is not None:
-                queue_lengths.append((timestamp, queue_length))
-                
-    return logical_clocks, queue_lengths
+        remainder = ''
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            # hold back a partial last line until the next chunk
+            chunk = remainder + chunk
+            cut = chunk.rfind('\n') + 1
+            remainder = chunk[cut:]
+            yield chunk[:cut]
+        if remainder:
+            yield remainder
+
+def parse_log_file(filename):
+    """Parse a machine log in a single pass into compact columns.
+
+    Returns a dict with the machine's tick rate and NumPy arrays of logical
+    clock times, values and event kinds, and of queue length times and
+    values. Times are seconds since the epoch; each distinct timestamp
+    string is only converted once.
+    """
+    clock_times = array('d')
+    clock_values = array('q')
+    event_kinds = array('b')
+    queue_times = array('d')
+    queue_values = array('q')
+    tick_rate = None
+
+    timestamps = {}
+    for chunk in read_chunks(filename):
+        rows = LOG_LINE.findall(chunk)
+        # the initialization line only carries the clock rate
+        if "Machine initialized" in chunk:
+            rates = [row[1] for row in rows if row[1]]
+            if rates and tick_rate is None:
+                tick_rate = int(rates[0])
+            rows = [row for row in rows if not row[1]]
+        if not rows:
+            continue
+
+        # Work column by column so the per-line loops run in C
+        stamps, _, events, queue_strs, clock_strs = zip(*rows)
+        for timestamp_str in set(stamps).difference(timestamps):
+            timestamps[timestamp_str] = parse_timestamp(timestamp_str)
+
+        clock_times.extend(map(timestamps.__getitem__, stamps))
+        clock_values.extend(map(int, clock_strs))
+        event_kinds.extend(map(EVENT_KINDS.__getitem__, events))
+        queue_times.extend(map(timestamps.__getitem__, compress(stamps, queue_strs)))
+        queue_values.extend(map(int, compress(queue_strs, queue_strs)))
+
+    # the arrays are handed to NumPy without copying
+    return {
+        'tick_rate': tick_rate,
+        'clock_times': np.frombuffer(clock_times, dtype=np.float64),
+        'clock_values': np.frombuffer(clock_values, dtype=np.int64),
+        'event_kinds': np.frombuffer(event_kinds, dtype=np.int8),
+        'queue_times': np.frombuffer(queue_times, dtype=np.float64),
+        'queue_values': np.frombuffer(queue_values, dtype=np.int64),
+    }
+
+def last_per_second(times, values):
+    """The distinct times of a series and the last value logged at each"""
+    if not len(times):
+        return times, values
+    # times are in log order, so a value is the last of its second when
+    # the next time differs
+    last = np.flatnonzero(np.diff(times))
+    last = np.append(last, len(times) - 1)
+    return times[last], values[last]
+
+def clock_jumps(times, values):
+    """Times and sizes of every increase in a machine's logical clock"""
+    steps = np.diff(values)
+    increases = np.flatnonzero(steps > 0)
+    return times[increases + 1], steps[increases]
+
+def clock_drift(logical_clocks):
+    """Spread between the highest and lowest logical clock each second.
+
+    logical_clocks holds a (times, values) pair for each machine. Every
+    machine's clock is carried forward to each second any machine logged,
+    starting from the first second all machines have a value. Returns the
+    seconds and the drift at each.
+    """
+    series = [last_per_second(times, values) for times, values in logical_clocks if len(times)]
+    if len(series) < len(logical_clocks) or not series:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    seconds = np.unique(np.concatenate([times for times, _ in series]))
+    seconds = seconds[seconds >= max(times[0] for times, _ in series)]
+    clocks = np.empty((len(series), len(seconds)), dtype=np.int64)
+    for i, (times, values) in enumerate(series):
+        clocks[i] = values[np.searchsorted(times, seconds, side='right') - 1]
+    return seconds, clocks.max(axis=0) - clocks.min(axis=0)
+
+def events_per_second(times):
+    """Number of logical clock events in each second from first to last"""
+    if not len(times):
+        return np.zeros(0, dtype=np.int64)
+    return np.bincount((times - times[0]).astype(np.int64))
+
+def describe(values):
+    """Mean and maximum of a series, or None for an empty one"""
+    if not len(values):
+        return {'mean': None, 'max': None}
+    return {'mean': float(values.mean()), 'max': int(values.max())}
+
+def summarize_machine(machine_id, parsed):
+    """Summary statistics for one machine's parsed log"""
+    clock_times, clock_values = parsed['clock_times'], parsed['clock_values']
+    queue_values = parsed['queue_values']
+    _, jumps = clock_jumps(clock_times, clock_values)
+    rates = events_per_second(clock_times)
+
+    queue = describe(queue_values)
+    for percentile in QUEUE_PERCENTILES:
+        queue[f'p{percentile}'] = (
+            float(np.percentile(queue_values, percentile)) if len(queue_values) else None)
+
+    counts = np.bincount(parsed['event_kinds'], minlength=len(EVENT_KIND_NAMES))
+    return {
+        'machine_id': machine_id,
+        'tick_rate': parsed['tick_rate'],
+        'events': int(len(clock_values)),
+        'event_counts': dict(zip(EVENT_KIND_NAMES, map(int, counts))),
+        'duration_seconds': float(clock_times[-1] - clock_times[0]) if len(clock_times) else 0.0,
+        'events_per_second': describe(rates),
+        'final_clock': int(clock_values[-1]) if len(clock_values) else None,
+        'jumps': dict(describe(jumps), count=int(len(jumps)), over_one=int(np.count_nonzero(jumps > 1))),
+        'queue_length': queue,
+    }
+
+def summarize_run(parsed_logs):
+    """Machine-readable summary of a run from each machine's parsed log"""
+    logical_clocks = [(parsed['clock_times'], parsed['clock_values']) for parsed in parsed_logs]
+    _, drift = clock_drift(logical_clocks)
+    return {
+        'machines': [summarize_machine(i, parsed) for i, parsed in enumerate(parsed_logs)],
+        'drift': dict(describe(drift), final=int(drift[-1]) if len(drift) else None),
+    }
+
+def write_summary(filename, summary):
+    """Write a run summary as JSON"""
+    with open(filename, 'w') as f:
+        json.dump(summary, f, indent=2)
+        f.write("\n")
 
 def write_value_file(filename, values, machine_count, tick_rates):
-    """Write values to file in chronological order with even column spacing"""
-    # Define column widths
-    timestamp_width = 10  # HH:MM:SS format
+    """Write values to file in chronological order with even column spacing.
+
+    values holds a (times, values) pair of columns for each machine.
+    """
+    # Define column widths; times from event stores are exact, so they
+    # keep their microseconds rather than collapsing into whole seconds
+    exact = any(np.any(times % 1) for times, _ in values)
+    timestamp_width = 17 if exact else 10  # HH:MM:SS.ffffff or HH:MM:SS format
+    time_format = '%H:%M:%S.%f' if exact else '%H:%M:%S'
     
     # Calculate required width for machine columns based on header length
     machine_headers = [f"Machine {i} ({tick_rates[i]} ticks/s)" for i in range(machine_count)]
@@ -72,126 +234,166 @@ def write_value_file(filename, values, machine_count, tick_rates):
         # Write separator line
         f.write("-" * (timestamp_width + (value_width + 3) * machine_count - 3) + "\n")
         
-        # Group values by timestamp
-        time_values = defaultdict(lambda: ["" for _ in range(machine_count)])
-        for machine_id, machine_values in enumerate(values):
-            for timestamp, value in machine_values:
-                time_values[timestamp][machine_id] = str(value)
+        # Line every machine's last value in each second up on one time axis
+        series = [last_per_second(times, machine_values) for times, machine_values in values]
+        seconds = np.unique(np.concatenate([times for times, _ in series] + [np.empty(0)]))
+        table = np.full((len(seconds), machine_count), "", dtype=object)
+        for machine_id, (times, machine_values) in enumerate(series):
+            table[np.searchsorted(seconds, times), machine_id] = machine_values.astype(str)
         
         # Write values in chronological order
-        for timestamp in sorted(time_values.keys()):
-            time_str = timestamp.strftime('%H:%M:%S')
+        for timestamp, row_values in zip(seconds, table):
+            time_str = to_datetime(timestamp).strftime(time_format)
             row = time_str.ljust(timestamp_width)
             
-            for value in time_values[timestamp]:
+            for value in row_values:
                 row += f" | {value:<{value_width-3}}"
             
             f.write(row + "\n")
 
-def plot_data(logical_clocks, queue_lengths, output_dir, tick_rates):
-    # Unzip the data into separate lists for each machine
-    logical_timestamps = [[timestamp for timestamp, _ in machine] for machine in logical_clocks]
-    logical_values = [[value for _, value in machine] for machine in logical_clocks]
-    
-    queue_timestamps = [[timestamp for timestamp, _ in machine] for machine in queue_lengths]
-    queue_values = [[value for _, value in machine] for machine in queue_lengths]
+def as_datetimes(times):
+    """Seconds since the epoch as local datetimes matching the log's timestamps"""
+    # UTC offsets only change on a minute boundary, so look each minute up once
+    minutes, inverse = np.unique(np.floor_divide(times, 60), return_inverse=True)
+    offsets = np.array([time.localtime(minute * 60).tm_gmtoff for minute in minutes.tolist()], dtype=np.float64)
+    return ((times + offsets[inverse]) * 1e6).astype('datetime64[us]')
+
+def downsample(times, values, max_points=MAX_PLOT_POINTS):
+    """Reduce a series to about max_points points, keeping its shape.
 
+    The series is cut into equal buckets and only the minimum and maximum
+    of each bucket are kept, in time order, along with the first and last
+    points, so spikes and steps survive.
+    """
+    count = len(values)
+    if count <= max_points:
+        return times, values
+    buckets = max_points // 2
+    size = -(-count // buckets)
+    # pad the last bucket with the final value so the buckets reshape evenly
+    padded = np.concatenate([values, np.full(buckets * size - count, values[-1], dtype=values.dtype)])
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    extremes = np.stack([offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1)], axis=1)
+    indices = np.unique(np.concatenate([[0], np.minimum(extremes.ravel(), count - 1), [count - 1]]))
+    return times[indices], values[indices]
+
+def machine_colors(machine_count):
+    """A distinct colour for each machine, for any number of machines"""
+    if machine_count <= 10:
+        return [matplotlib.colormaps['tab10'](i) for i in range(machine_count)]
+    colormap = matplotlib.colormaps['viridis']
+    return [colormap(i / (machine_count - 1)) for i in range(machine_count)]
+
+def save_plot(filename, series, ylabel, title, label_prefix='Machine'):
+    """Plot one downsampled line per machine and write the figure with Agg.
+
+    The figure is not registered with pyplot, so it is freed as soon as it
+    is saved, however many runs are plotted in one process.
+    """
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.subplots()
+    for i, ((times, values), color) in enumerate(zip(series, machine_colors(len(series)))):
+        times, values = downsample(times, values)
+        axes.plot(as_datetimes(times), values, color=color, label=f'{label_prefix} {i+1}')
+    axes.set_xlabel('Time')
+    axes.set_ylabel(ylabel)
+    axes.set_title(title)
+    if len(series) <= MAX_LEGEND_ENTRIES:
+        axes.legend()
+    figure.tight_layout()
+    figure.savefig(filename)
+
+def plot_data(logical_clocks, queue_lengths, output_dir, tick_rates):
     # Plot for Logical Clock
-    plt.figure()
-    for i in range(len(logical_values)):
-        plt.plot(logical_timestamps[i], logical_values[i], label=f'Machine {i+1}')
-        
-    plt.xlabel('Time')
-    plt.ylabel('Logical Clock')
-    plt.title('Logical Clock Over Time')
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(f"{output_dir}/logical_clock.png")
+    save_plot(f"{output_dir}/logical_clock.png", logical_clocks, 'Logical Clock', 'Logical Clock Over Time')
 
     # Plot for Jumps
-    plt.figure()
-    colors = ['red', 'blue', 'green']
-    for i in range(len(logical_values)):
-        jumps = [j for j in range(1, len(logical_values[i])) if logical_values[i][j] > logical_values[i][j - 1]]
-        jump_times = [logical_timestamps[i][j] for j in jumps]
-        jump_values = [logical_values[i][j] - logical_values[i][j - 1] for j in jumps]
-        
-        plt.plot(jump_times, jump_values, color=colors[i], label=f'Jumps Machine {i+1}')
-
-    plt.xlabel('Time')
-    plt.ylabel('Logical Clock Jumps')
-    plt.title('Logical Clock Jumps for Each Machine')
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(f"{output_dir}/logical_clock_jumps.png")
+    jumps = [clock_jumps(times, values) for times, values in logical_clocks]
+    save_plot(f"{output_dir}/logical_clock_jumps.png", jumps, 'Logical Clock Jumps',
+              'Logical Clock Jumps for Each Machine', label_prefix='Jumps Machine')
 
     # Plot for Queue Length
-    plt.figure()
-    for i in range(len(queue_values)):
-        plt.plot(queue_timestamps[i], queue_values[i], label=f'Machine {i+1}')
-    plt.xlabel('Time')
-    plt.ylabel('Queue Length')
-    plt.title('Queue Length Over Time')
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(f"{output_dir}/queue_length.png")
+    save_plot(f"{output_dir}/queue_length.png", queue_lengths, 'Queue Length', 'Queue Length Over Time')
+
+def find_log_files(log_folder):
+    """The machine_N.log files in a folder, ordered by machine id"""
+    log_files = []
+    for name in os.listdir(log_folder):
+        match = LOG_FILE_NAME.match(name)
+        if match:
+            log_files.append((int(match.group(1)), os.path.join(log_folder, name)))
+    return [log_file for _, log_file in sorted(log_files)]
+
+def analyze_run(log_folder, parsed_logs, plots=True, sources=None):
+    """Write the value files, summary and plots for a run and return its summary.
+
+    sources, if given, is recorded in the summary under 'logs' so a later
+    run can tell which log files the summary was made from.
+    """
+    tick_rates = [parsed['tick_rate'] for parsed in parsed_logs]
+    logical_clocks = [(parsed['clock_times'], parsed['clock_values']) for parsed in parsed_logs]
+    queue_lengths = [(parsed['queue_times'], parsed['queue_values']) for parsed in parsed_logs]
+    summary = summarize_run(parsed_logs)
+    if sources is not None:
+        summary['logs'] = sources
+
+    write_value_file(os.path.join(log_folder, "logical_clock.txt"), logical_clocks, len(parsed_logs), tick_rates)
+    write_value_file(os.path.join(log_folder, "queue_length.txt"), queue_lengths, len(parsed_logs), tick_rates)
+    write_summary(os.path.join(log_folder, "summary.json"), summary)
+    if plots:
+        plot_data(logical_clocks, queue_lengths, log_folder, tick_rates)
+    return summary
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python analyze_logs.py <path_to_log_folder>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Analyse the machine logs of a run")
+    parser.add_argument('log_folder', help="folder with the machine_N.log files")
+    parser.add_argument('--follow', action='store_true', help="tail the logs while the run is going and print rolling statistics")
+    parser.add_argument('--interval', type=float, default=2.0, help="seconds between summaries in follow mode")
+    parser.add_argument('--window', type=int, default=30, help="seconds of log covered by the rolling statistics in follow mode")
+    args = parser.parse_args()
 
-    log_folder = sys.argv[1]
+    log_folder = args.log_folder
     
     # Check if folder exists
     if not os.path.isdir(log_folder):
         print(f"Error: Folder '{log_folder}' does not exist")
         sys.exit(1)
     
-    # List of log files to analyze
-    log_files = [
-        os.path.join(log_folder, "machine_0.log"),
-        os.path.join(log_folder, "machine_1.log"),
-        os.path.join(log_folder, "machine_2.log")
-    ]
+    if args.follow:
+        # imported here because live_analysis builds on this module
+        from live_analysis import follow
+        follow(log_folder, args.interval, args.window)
+        return
     
-    # Check if all log files exist
-    for log_file in log_files:
-        if not os.path.exists(log_file):
-            print(f"Error: Log file '{log_file}' does not exist")
+    # Event stores, when the run wrote them, are memory-mapped instead of
+    # parsing the logs, and have exact times
+    stores = find_event_stores(log_folder)
+    if stores:
+        parsed_logs = [EventStoreFile(store).parsed() for store in stores]
+    else:
+        # Log files to analyze, one per machine
+        log_files = find_log_files(log_folder)
+        if not log_files:
+            print(f"Error: No machine_N.log files in '{log_folder}'")
             sys.exit(1)
+        
+        # Read all log files in a single pass each and extract values
+        parsed_logs = []
+        for log_file in log_files:
+            parsed = parse_log_file(log_file)
+            if parsed['tick_rate'] is None:
+                print(f"Error: Could not find tick rate in {log_file}")
+                sys.exit(1)
+            parsed_logs.append(parsed)
     
-    # Get tick rates for all machines
-    tick_rates = []
-    for log_file in log_files:
-        rate = get_tick_rate(log_file)
-        if rate is None:
-            print(f"Error: Could not find tick rate in {log_file}")
-            sys.exit(1)
-        tick_rates.append(rate)
-    
-    # Read all log files and extract values
-    logical_clocks = []
-    queue_lengths = []
-    
-    for log_file in log_files:
-        lc, ql = read_log_file(log_file)
-        logical_clocks.append(lc)
-        queue_lengths.append(ql)
-    
-    # Create output files
-    logical_clock_file = os.path.join(log_folder, "logical_clock.txt")
-    queue_length_file = os.path.join(log_folder, "queue_length.txt")
-    
-    # Write values to files
-    write_value_file(logical_clock_file, logical_clocks, len(log_files), tick_rates)
-    write_value_file(queue_length_file, queue_lengths, len(log_files), tick_rates)
-    
-    # Plot data
-    plot_data(logical_clocks, queue_lengths, log_folder, tick_rates)
+    # Write values, summary and plots
+    analyze_run(log_folder, parsed_logs)
     
-    print(f"Logical clock values written to {logical_clock_file}")
-    print(f"Queue lengths written to {queue_length_file}")
+    print(f"Logical clock values written to {os.path.join(log_folder, 'logical_clock.txt')}")
+    print(f"Queue lengths written to {os.path.join(log_folder, 'queue_length.txt')}")
+    print(f"Run summary written to {os.path.join(log_folder, 'summary.json')}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,98 @@
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+from datetime import datetime
+from analyze_logs import parse_log_file
+from simulation import Simulation
+
+# Benchmark comparing the single-pass log parser with the original one.
+# Run with: python analyze_logs_benchmark.py [simulated_hours]
+
+def legacy_parse_log_line(line):
+    """The original parser: split and strptime on every line"""
+    try:
+        timestamp_str, message = line.strip().split(" - ", 1)
+        timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
+        return timestamp, message
+    except ValueError:
+        return None, None
+
+def legacy_extract_value(message, pattern):
+    match = re.search(pattern, message)
+    if match:
+        return int(match.group(1))
+    return None
+
+def legacy_get_tick_rate(filename):
+    with open(filename, 'r') as f:
+        first_line = f.readline()
+        _, message = legacy_parse_log_line(first_line)
+        if message:
+            return legacy_extract_value(message, r"clock rate: (\d+)")
+    return None
+
+def legacy_read_log_file(filename):
+    """The original reader, including its second pass for the tick rate"""
+    legacy_get_tick_rate(filename)
+    logical_clocks = []
+    queue_lengths = []
+    with open(filename, 'r') as f:
+        for line in f:
+            timestamp, message = legacy_parse_log_line(line)
+            if not timestamp:
+                continue
+            # delivery lines were added to the logs after this parser
+            if message.startswith("Delivered"):
+                continue
+            logical_clock = legacy_extract_value(message, r"Logical clock: (\d+)")
+            if logical_clock is not None:
+                logical_clocks.append((timestamp, logical_clock))
+            queue_length = legacy_extract_value(message, r"Queue length: (\d+)")
+            if queue_length is not None:
+                queue_lengths.append((timestamp, queue_length))
+    return logical_clocks, queue_lengths
+
+def bench(label, func, log_files, num_lines):
+    """Time parsing all log files, best of three"""
+    best = min(timeit_once(func, log_files) for _ in range(3))
+    print(f"{label:<12} {best:8.3f} s  {num_lines / best:>12,.0f} lines/s")
+    return best
+
+def timeit_once(func, log_files):
+    start = time.perf_counter()
+    for log_file in log_files:
+        func(log_file)
+    return time.perf_counter() - start
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 6
+    log_dir = tempfile.mkdtemp()
+    try:
+        Simulation(3, seed=1, log_dir=log_dir).run(hours * 3600)
+        log_files = [os.path.join(log_dir, f"machine_{i}.log") for i in range(3)]
+        num_lines = 0
+        for log_file in log_files:
+            with open(log_file) as f:
+                num_lines += sum(1 for _ in f)
+        print(f"Parsing {num_lines:,} lines from a {hours:g} hour simulated run")
+        print()
+
+        # check both parsers agree before timing them
+        for log_file in log_files:
+            legacy_clocks, legacy_queues = legacy_read_log_file(log_file)
+            parsed = parse_log_file(log_file)
+            assert [value for _, value in legacy_clocks] == list(parsed['clock_values'])
+            assert [value for _, value in legacy_queues] == list(parsed['queue_values'])
+
+        legacy = bench("legacy", legacy_read_log_file, log_files, num_lines)
+        single_pass = bench("single-pass", parse_log_file, log_files, num_lines)
+        print()
+        print(f"Speedup: {legacy / single_pass:.1f}x")
+    finally:
+        shutil.rmtree(log_dir)
+
+if __name__ == "__main__":
+    main()
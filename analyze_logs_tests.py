@@ -0,0 +1,168 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import analyze_logs
+from analyze_logs import (parse_log_file, parse_timestamp, to_datetime, as_datetimes, last_per_second,
+                          clock_jumps, clock_drift, events_per_second, summarize_run,
+                          downsample, machine_colors, plot_data)
+from harness import ScratchFolder
+
+LOG_LINES = [
+    "2025-02-28 13:30:58 - Machine initialized with clock rate: 5 ticks/second",
+    "2025-02-28 13:31:00 - Startup barrier: all 2 peers ready after 3.1 ms",
+    "2025-02-28 13:31:00 - Sent message to Machine 1, Logical clock: 1",
+    "2025-02-28 13:31:00 - Sent message to ALL other machines, Logical clock: 2",
+    "2025-02-28 13:31:01 - Internal event, Logical clock: 3",
+    "2025-02-28 13:31:01 - Received message from Machine 2, Queue length: 4, Logical clock: 7",
+    "2025-02-28 13:31:02 - Error sending message to Machine 2: [Errno 111] Connection refused",
+    "2025-02-28 13:31:02 - Received 2 messages from Machines 1, 2, Queue length: 0, Logical clock: 9",
+    "2025-02-28 13:31:03 - Scheduler stats: ticks: 25, achieved rate: 5.000 ticks/second",
+]
+
+# analyze_logs.py tests
+class TestParseLogFile(ScratchFolder, unittest.TestCase):
+    def setUp(self):
+        """Write a log with every kind of line to a scratch folder"""
+        super().setUp()
+        self.log_file = os.path.join(self.log_dir, "machine_0.log")
+        with open(self.log_file, 'w') as f:
+            f.write("\n".join(LOG_LINES) + "\n")
+
+    def check_parsed(self, parsed):
+        start = parse_timestamp("2025-02-28 13:31:00")
+        self.assertEqual(parsed['tick_rate'], 5)
+        self.assertEqual(list(parsed['clock_values']), [1, 2, 3, 7, 9])
+        self.assertEqual(list(parsed['event_kinds']), [1, 2, 3, 0, 0])
+        self.assertEqual(list(parsed['clock_times']), [start, start, start + 1, start + 1, start + 2])
+        self.assertEqual(list(parsed['queue_values']), [4, 0])
+        self.assertEqual(list(parsed['queue_times']), [start + 1, start + 2])
+
+    def test_parse(self):
+        """Test that one pass extracts the tick rate, clocks and queue lengths"""
+        self.check_parsed(parse_log_file(self.log_file))
+
+    def test_small_chunks(self):
+        """Test that lines split across chunk boundaries are parsed once"""
+        with mock.patch.object(analyze_logs, 'CHUNK_SIZE', 50):
+            self.check_parsed(parse_log_file(self.log_file))
+
+    def test_timestamp_round_trip(self):
+        """Test that parsed timestamps convert back to the logged time"""
+        timestamp = parse_timestamp("2025-02-28 13:31:00")
+        self.assertEqual(to_datetime(timestamp).strftime('%Y-%m-%d %H:%M:%S'), "2025-02-28 13:31:00")
+
+    @unittest.skipUnless(hasattr(time, 'tzset'), "needs time.tzset")
+    def test_local_time(self):
+        """Test that text timestamps and event store times are both read and shown as local time"""
+        def restore(zone):
+            if zone is None:
+                os.environ.pop('TZ', None)
+            else:
+                os.environ['TZ'] = zone
+            time.tzset()
+        self.addCleanup(restore, os.environ.get('TZ'))
+        os.environ['TZ'] = 'America/New_York'
+        time.tzset()
+
+        # the time an event store records, and the line EventLog writes for it
+        wall_time = 1740753058.25
+        logged = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall_time))
+        self.assertEqual(logged, "2025-02-28 09:30:58")
+        self.assertEqual(parse_timestamp(logged), int(wall_time))
+        self.assertEqual(to_datetime(wall_time).strftime('%Y-%m-%d %H:%M:%S'), logged)
+        plotted = as_datetimes(np.array([wall_time, parse_timestamp(logged)]))
+        self.assertEqual([str(value) for value in plotted], ["2025-02-28T09:30:58.250000", "2025-02-28T09:30:58.000000"])
+
+class TestAnalysis(unittest.TestCase):
+    def test_last_per_second(self):
+        """Test that the last value logged in each second is kept"""
+        times, values = last_per_second(np.array([0.0, 0.0, 1.0, 3.0, 3.0]), np.array([1, 2, 3, 4, 5]))
+        self.assertEqual(times.tolist(), [0.0, 1.0, 3.0])
+        self.assertEqual(values.tolist(), [2, 3, 5])
+
+    def test_clock_jumps(self):
+        """Test that every clock increase is reported with its size"""
+        times, sizes = clock_jumps(np.array([0.0, 1.0, 2.0, 3.0]), np.array([1, 2, 6, 6]))
+        self.assertEqual(times.tolist(), [1.0, 2.0])
+        self.assertEqual(sizes.tolist(), [1, 4])
+
+    def test_clock_drift(self):
+        """Test that drift carries clocks forward and starts once all machines have one"""
+        seconds, drift = clock_drift([
+            (np.array([0.0, 1.0, 2.0]), np.array([1, 2, 3])),
+            (np.array([1.0, 3.0]), np.array([5, 9])),
+        ])
+        self.assertEqual(seconds.tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(drift.tolist(), [3, 2, 6])
+
+    def test_events_per_second(self):
+        """Test that events are counted per second including empty seconds"""
+        counts = events_per_second(np.array([10.0, 10.0, 12.0]))
+        self.assertEqual(counts.tolist(), [2, 0, 1])
+
+    def test_summarize_run(self):
+        """Test that a run summary has per-machine statistics and drift"""
+        log_dir = tempfile.mkdtemp()
+        try:
+            log_file = os.path.join(log_dir, "machine_0.log")
+            with open(log_file, 'w') as f:
+                f.write("\n".join(LOG_LINES) + "\n")
+            summary = summarize_run([parse_log_file(log_file)])
+        finally:
+            shutil.rmtree(log_dir)
+
+        machine = summary['machines'][0]
+        self.assertEqual(machine['tick_rate'], 5)
+        self.assertEqual(machine['events'], 5)
+        self.assertEqual(machine['event_counts'], {'receive': 2, 'send': 1, 'broadcast': 1, 'internal': 1})
+        self.assertEqual(machine['final_clock'], 9)
+        self.assertEqual(machine['jumps']['max'], 4)
+        self.assertEqual(machine['jumps']['over_one'], 2)
+        self.assertEqual(machine['queue_length']['max'], 4)
+        self.assertEqual(machine['queue_length']['p50'], 2.0)
+        self.assertEqual(machine['events_per_second']['max'], 2)
+        self.assertEqual(summary['drift']['max'], 0)
+
+class TestPlotting(unittest.TestCase):
+    def test_downsample_short(self):
+        """Test that short series are plotted as they are"""
+        times, values = np.arange(10.0), np.arange(10)
+        self.assertIs(downsample(times, values, 100)[1], values)
+
+    def test_downsample_keeps_shape(self):
+        """Test that downsampling keeps the ends, spikes and time order"""
+        times = np.arange(100001.0)
+        values = np.zeros(100001, dtype=np.int64)
+        values[31337] = 500
+        values[70000] = -20
+        sampled_times, sampled_values = downsample(times, values, 1000)
+        self.assertLessEqual(len(sampled_values), 1002)
+        self.assertEqual(sampled_times[0], 0.0)
+        self.assertEqual(sampled_times[-1], 100000.0)
+        self.assertTrue(np.all(np.diff(sampled_times) > 0))
+        self.assertIn(31337.0, sampled_times.tolist())
+        self.assertEqual(sampled_values.max(), 500)
+        self.assertEqual(sampled_values.min(), -20)
+
+    def test_machine_colors(self):
+        """Test that any number of machines gets distinct colours"""
+        for machine_count in (1, 3, 10, 25):
+            self.assertEqual(len(set(machine_colors(machine_count))), machine_count)
+
+    def test_plot_many_machines(self):
+        """Test that plots are written for more machines than the old colour list had"""
+        output_dir = tempfile.mkdtemp()
+        try:
+            series = [(np.arange(50.0) + 1735689600, np.arange(50) * (i + 1)) for i in range(12)]
+            plot_data(series, series, output_dir, [1] * 12)
+            for name in ("logical_clock.png", "logical_clock_jumps.png", "queue_length.png"):
+                self.assertTrue(os.path.exists(os.path.join(output_dir, name)))
+        finally:
+            shutil.rmtree(output_dir)
+
+if __name__ == '__main__':
+    unittest.main()
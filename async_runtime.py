@@ -0,0 +1,98 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+from virtual_machine import VirtualMachine
+from scheduler import TICK_POLICIES
+
+class AsyncMachine(VirtualMachine):
+    """A VirtualMachine that runs as a coroutine and talks over in-process channels"""
+    def __init__(self, runtime, machine_id, num_machines, rng, log_dir, clock_mode='lamport', tick_policy='skip'):
+        self.runtime = runtime
+        super().__init__(machine_id, num_machines, None, 0, rng=rng, log_dir=log_dir, clock_mode=clock_mode,
+                         tick_policy=tick_policy)
+
+    def _setup_network(self):
+        """Messages are handed over by the runtime, so nothing is bound"""
+        pass
+
+    def _send_message(self, peer_port, message):
+        """Put a message straight onto a peer's queue"""
+        # with a port base of 0 a peer's port is its machine id
+        self.runtime.deliver(peer_port, message)
+
+    async def run(self):
+        """Run the clock cycle on the event loop, paced against absolute deadlines like a threaded machine"""
+        self.next_report = self.scheduler.clock() + self.stats_interval
+        while self.running:
+            # wait for the deadline on the event loop, so the other machines keep running
+            delay = self.scheduler.delay()
+            await asyncio.sleep(delay)
+            self.scheduler.start_tick(slept=delay > 0)
+            if not self.running:
+                break
+            self._tick()
+            self._report_stats()
+
+    def stop(self):
+        """Stop the machine and close its log"""
+        self.running = False
+        self.logger.info(self.scheduler.summary())
+        self.logger.close()
+
+class AsyncRuntime:
+    """Hosts many virtual machines as coroutines on a single event loop.
+
+    Each machine keeps its own clock rate and log file, but there is no
+    listener thread or socket per machine, so hundreds of machines fit in
+    one process.
+    """
+    def __init__(self, num_machines, log_dir='.', seed=None, clock_mode='lamport', tick_policy='skip'):
+        self.num_machines = num_machines
+        rng = random.Random(seed)
+        self.machines = [
+            AsyncMachine(self, i, num_machines, random.Random(rng.getrandbits(64)), log_dir, clock_mode, tick_policy)
+            for i in range(num_machines)
+        ]
+
+    def deliver(self, machine_id, message):
+        """Hand a message to a machine; everything runs on one thread"""
+        self.machines[machine_id]._receive(message)
+
+    async def run(self, duration):
+        """Run all machines for duration seconds of real time"""
+        for machine in self.machines:
+            machine.running = True
+        tasks = [asyncio.create_task(machine.run()) for machine in self.machines]
+
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            for machine in self.machines:
+                machine.stop()
+            await asyncio.gather(*tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many virtual machines as coroutines in one process")
+    parser.add_argument('output_dir', help="folder to write machine_N.log files to")
+    parser.add_argument('--machines', type=int, default=3, help="number of virtual machines")
+    parser.add_argument('--duration', type=float, default=60, help="seconds to run for")
+    parser.add_argument('--seed', type=int, default=None, help="seed for the machines' random choices")
+    parser.add_argument('--clock-mode', choices=('lamport', 'vector'), default='lamport', help="keep vector clocks as well as Lamport clocks")
+    parser.add_argument('--tick-policy', choices=TICK_POLICIES, default='skip', help="what happens to ticks missed by a slow cycle")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    runtime = AsyncRuntime(args.machines, args.output_dir, args.seed, args.clock_mode, args.tick_policy)
+    print(f"Simulation running for {args.duration} seconds with {args.machines} machines...")
+    start = time.time()
+    try:
+        asyncio.run(runtime.run(args.duration))
+    except KeyboardInterrupt:
+        print("Simulation interrupted by user")
+    print(f"Simulation completed in {time.time() - start:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import time
+import asyncio
+import unittest
+from async_runtime import AsyncRuntime
+from harness import ScratchFolder
+
+# async_runtime.py tests
+class TestAsyncRuntime(ScratchFolder, unittest.TestCase):
+    def test_many_machines(self):
+        """Test hosting many machines on one event loop"""
+        num_machines = 100
+        runtime = AsyncRuntime(num_machines, self.log_dir, seed=1)
+        asyncio.run(runtime.run(1.5))
+
+        for machine in runtime.machines:
+            self.assertFalse(machine.running)
+            self.assertGreater(machine.logical_clock, 0)
+            self.assertTrue(os.path.exists(os.path.join(self.log_dir, f"machine_{machine.machine_id}.log")))
+
+        # the first peers of every machine receive messages
+        self.assertIsNotNone(runtime.machines[0].last_received_message)
+
+    def test_clock_rate(self):
+        """Test that machines tick at roughly their configured clock rate"""
+        runtime = AsyncRuntime(3, self.log_dir, seed=2)
+        ticks = [0] * 3
+        for machine in runtime.machines:
+            original_tick = machine._tick
+            def tick(machine=machine, original_tick=original_tick):
+                ticks[machine.machine_id] += 1
+                original_tick()
+            machine._tick = tick
+        asyncio.run(runtime.run(2))
+
+        for machine in runtime.machines:
+            expected = 2 * machine.clock_rate
+            self.assertLessEqual(abs(ticks[machine.machine_id] - expected), 1)
+
+    def test_tick_policy(self):
+        """Test that a slow cycle is handled by the machine's tick policy"""
+        for policy, overruns, skipped, caught_up, ticks in (('skip', 1, 2, 0, 4), ('catch_up', 1, 0, 2, 6)):
+            runtime = AsyncRuntime(1, self.log_dir, seed=3, tick_policy=policy)
+            machine = runtime.machines[0]
+            original_tick = machine._tick
+            def tick():
+                # the second tick, due at one cycle, ends at four and a half
+                if machine.scheduler.stats['ticks'] == 2:
+                    time.sleep(3.5 * machine.cycle_time)
+                original_tick()
+            machine._tick = tick
+            asyncio.run(runtime.run(4.75 * machine.cycle_time))
+
+            # skipping drops the ticks due at two and three cycles, catching up runs them late;
+            # either way the machine is stopped while waiting for the tick due at five
+            stats = machine.scheduler.stats
+            self.assertEqual((stats['overruns'], stats['skipped'], stats['caught_up'], stats['ticks']),
+                             (overruns, skipped, caught_up, ticks), policy)
+
+if __name__ == "__main__":
+    unittest.main()
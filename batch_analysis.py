@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from analyze_logs import find_log_files, parse_log_file, analyze_run
+from event_store import EventStoreFile, find_event_stores
+
+# Parsed logs are cached here, under the experiment tree's root
+CACHE_DIR_NAME = ".analysis_cache"
+
+# Bump when parse_log_file's output changes so stale caches are ignored
+CACHE_VERSION = 1
+
+COLUMNS = ('clock_times', 'clock_values', 'event_kinds', 'queue_times', 'queue_values')
+
+def find_run_folders(root):
+    """Every folder under root that holds machine logs, in sorted order"""
+    run_folders = []
+    for folder, dirs, _ in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        if find_log_files(folder):
+            run_folders.append(folder)
+    return run_folders
+
+def cache_path(cache_dir, root, log_file):
+    """Where the parsed columns of a log file are cached"""
+    relative = os.path.relpath(log_file, root)
+    return os.path.join(cache_dir, relative.replace(os.sep, '__') + ".npz")
+
+def cache_key(log_file):
+    """The cache version and the log's size and modification time"""
+    stat = os.stat(log_file)
+    return [CACHE_VERSION, stat.st_size, stat.st_mtime_ns]
+
+def load_parsed(log_file, cache_file):
+    """Parse a log, or load it from the cache if the file is unchanged.
+
+    Returns the parsed columns and whether they came from the cache. The
+    cache entry is keyed by the log's size and modification time.
+    """
+    key = np.array(cache_key(log_file), dtype=np.int64)
+    try:
+        with np.load(cache_file) as cached:
+            if np.array_equal(cached['key'], key):
+                parsed = {column: cached[column] for column in COLUMNS}
+                tick_rate = int(cached['tick_rate'])
+                parsed['tick_rate'] = tick_rate if tick_rate >= 0 else None
+                return parsed, True
+    except (OSError, KeyError, ValueError):
+        pass
+
+    parsed = parse_log_file(log_file)
+    tick_rate = -1 if parsed['tick_rate'] is None else parsed['tick_rate']
+    # write to a temporary file first so a crash never leaves half an entry
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as f:
+        np.savez(f, key=key, tick_rate=tick_rate, **{column: parsed[column] for column in COLUMNS})
+    os.replace(temp_file, cache_file)
+    return parsed, False
+
+def analyze_folder(run_folder, root, cache_dir, plots=True):
+    """Analyse one run folder; runs in a worker process.
+
+    A run whose logs all hit the cache and that already has a summary made
+    from exactly those logs is not analysed again, so a log added or
+    deleted since the summary was written is noticed. Returns (run_folder, summary, skipped, error).
+    """
+    # event stores need no parsing, so there is nothing to cache
+    stores = find_event_stores(run_folder)
+    if stores:
+        parsed_logs = [EventStoreFile(store).parsed() for store in stores]
+        return run_folder, analyze_run(run_folder, parsed_logs, plots), False, None
+
+    parsed_logs = []
+    sources = {}
+    unchanged = True
+    for log_file in find_log_files(run_folder):
+        parsed, cached = load_parsed(log_file, cache_path(cache_dir, root, log_file))
+        if parsed['tick_rate'] is None:
+            return run_folder, None, False, f"Could not find tick rate in {log_file}"
+        parsed_logs.append(parsed)
+        sources[os.path.basename(log_file)] = cache_key(log_file)
+        unchanged = unchanged and cached
+
+    summary_file = os.path.join(run_folder, "summary.json")
+    if unchanged and os.path.exists(summary_file):
+        with open(summary_file) as f:
+            summary = json.load(f)
+        if summary.get('logs') == sources:
+            return run_folder, summary, True, None
+    return run_folder, analyze_run(run_folder, parsed_logs, plots, sources), False, None
+
+def configuration_of(run_folder, root):
+    """The configuration a run belongs to: its parent folder within the tree"""
+    parent = os.path.dirname(os.path.relpath(run_folder, root))
+    return parent or '.'
+
+def weighted_mean(pairs):
+    """Mean of (mean, count) pairs weighted by count, or None"""
+    pairs = [(mean, count) for mean, count in pairs if mean is not None and count]
+    total = sum(count for _, count in pairs)
+    return sum(mean * count for mean, count in pairs) / total if total else None
+
+def machine_stats(machines):
+    """Statistics over a group of machine summaries"""
+    jump_max = [machine['jumps']['max'] for machine in machines if machine['jumps']['max'] is not None]
+    queue_max = [machine['queue_length']['max'] for machine in machines if machine['queue_length']['max'] is not None]
+    return {
+        'machines': len(machines),
+        'mean_jump': weighted_mean(
+            (machine['jumps']['mean'], machine['jumps'].get('count', 1)) for machine in machines),
+        'max_jump': max(jump_max, default=None),
+        'mean_events_per_second': weighted_mean(
+            (machine['events_per_second']['mean'], 1) for machine in machines),
+        'mean_queue_length': weighted_mean(
+            (machine['queue_length']['mean'], machine['event_counts']['receive']) for machine in machines),
+        'max_queue_length': max(queue_max, default=None),
+    }
+
+def run_stats(summaries):
+    """Statistics over a group of run summaries, including clock drift"""
+    drift_mean = [summary['drift']['mean'] for summary in summaries if summary['drift']['mean'] is not None]
+    drift_max = [summary['drift']['max'] for summary in summaries if summary['drift']['max'] is not None]
+    stats = {'runs': len(summaries)}
+    stats.update(machine_stats([machine for summary in summaries for machine in summary['machines']]))
+    stats['mean_drift'] = sum(drift_mean) / len(drift_mean) if drift_mean else None
+    stats['max_drift'] = max(drift_max, default=None)
+    return stats
+
+def aggregate(summaries_by_run, root):
+    """Compare configurations, and machines by tick rate, across all runs"""
+    by_configuration = {}
+    by_tick_rate = {}
+    for run_folder, summary in summaries_by_run.items():
+        by_configuration.setdefault(configuration_of(run_folder, root), []).append(summary)
+        for machine in summary['machines']:
+            by_tick_rate.setdefault(machine['tick_rate'], []).append(machine)
+
+    return {
+        'configurations': {
+            configuration: run_stats(summaries)
+            for configuration, summaries in sorted(by_configuration.items())
+        },
+        'tick_rates': {
+            str(tick_rate): machine_stats(machines)
+            for tick_rate, machines in sorted(by_tick_rate.items())
+        },
+    }
+
+def format_value(value, digits=2):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.{digits}f}"
+    return str(value)
+
+def write_report(filename, report):
+    """Write the aggregate report as an aligned text table"""
+    fields = [
+        ('Runs', 'runs'), ('Machines', 'machines'), ('Mean jump', 'mean_jump'), ('Max jump', 'max_jump'),
+        ('Events/s', 'mean_events_per_second'), ('Mean queue', 'mean_queue_length'),
+        ('Max queue', 'max_queue_length'), ('Mean drift', 'mean_drift'), ('Max drift', 'max_drift'),
+    ]
+    with open(filename, 'w') as f:
+        for title, groups in (("Configuration", report['configurations']), ("Tick rate", report['tick_rates'])):
+            columns = [(label, field) for label, field in fields if any(field in group for group in groups.values())]
+            rows = [[name] + [format_value(group[field]) for _, field in columns] for name, group in groups.items()]
+            header = [title] + [label for label, _ in columns]
+            widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+            f.write(" | ".join(cell.ljust(width) for cell, width in zip(header, widths)) + "\n")
+            f.write("-+-".join("-" * width for width in widths) + "\n")
+            for row in rows:
+                f.write(" | ".join(cell.ljust(width) for cell, width in zip(row, widths)) + "\n")
+            f.write("\n")
+
+def write_aggregate(summaries, root):
+    """Write aggregate.json and aggregate.txt for the runs under root; returns their paths"""
+    report = aggregate(summaries, root)
+    report_json = os.path.join(root, "aggregate.json")
+    report_txt = os.path.join(root, "aggregate.txt")
+    with open(report_json, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    write_report(report_txt, report)
+    return report_txt, report_json
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse every run folder in an experiment tree")
+    parser.add_argument('root', help="folder to search for run folders with machine_N.log files")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument('--no-plots', action='store_true', help="skip writing plots for each run")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"Error: Folder '{args.root}' does not exist")
+        sys.exit(1)
+
+    run_folders = find_run_folders(args.root)
+    if not run_folders:
+        print(f"Error: No run folders found under '{args.root}'")
+        sys.exit(1)
+
+    cache_dir = os.path.join(args.root, CACHE_DIR_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    start = time.time()
+    summaries = {}
+    analysed = skipped = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [
+            pool.submit(analyze_folder, run_folder, args.root, cache_dir, not args.no_plots)
+            for run_folder in run_folders
+        ]
+        for future in futures:
+            run_folder, summary, was_skipped, error = future.result()
+            if error:
+                print(f"Error: {error}")
+                continue
+            summaries[run_folder] = summary
+            skipped += was_skipped
+            analysed += not was_skipped
+
+    report_txt, report_json = write_aggregate(summaries, args.root)
+
+    print(f"Analysed {analysed} runs, {skipped} unchanged, in {time.time() - start:.2f} seconds")
+    print(f"Aggregate report written to {report_txt} and {report_json}")
+
+if __name__ == "__main__":
+    main()
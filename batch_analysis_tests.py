@@ -0,0 +1,93 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from simulation import Simulation
+from batch_analysis import (find_run_folders, cache_path, load_parsed, analyze_folder,
+                            aggregate, CACHE_DIR_NAME)
+
+# batch_analysis.py tests
+class TestBatchAnalysis(unittest.TestCase):
+    def setUp(self):
+        """Simulate a small experiment tree with two configurations"""
+        self.root = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.root, CACHE_DIR_NAME)
+        os.makedirs(self.cache_dir)
+        self.run_folders = []
+        for configuration, machines in (('pair', 2), ('trio', 3)):
+            for run in (1, 2):
+                run_folder = os.path.join(self.root, configuration, f"run{run}")
+                os.makedirs(run_folder)
+                Simulation(machines, seed=run, log_dir=run_folder).run(20)
+                self.run_folders.append(run_folder)
+
+    def tearDown(self):
+        """Clean up the experiment tree"""
+        shutil.rmtree(self.root)
+
+    def test_find_run_folders(self):
+        """Test that every folder with machine logs is found"""
+        self.assertEqual(find_run_folders(self.root), self.run_folders)
+
+    def test_cache(self):
+        """Test that a parsed log is cached until the file changes"""
+        log_file = os.path.join(self.run_folders[0], "machine_0.log")
+        cache_file = cache_path(self.cache_dir, self.root, log_file)
+
+        parsed, cached = load_parsed(log_file, cache_file)
+        self.assertFalse(cached)
+        reloaded, cached = load_parsed(log_file, cache_file)
+        self.assertTrue(cached)
+        self.assertEqual(reloaded['tick_rate'], parsed['tick_rate'])
+        self.assertEqual(reloaded['clock_values'].tolist(), parsed['clock_values'].tolist())
+
+        with open(log_file, 'a') as f:
+            f.write("2025-01-01 00:00:21 - Internal event, Logical clock: 100000\n")
+        changed, cached = load_parsed(log_file, cache_file)
+        self.assertFalse(cached)
+        self.assertEqual(changed['clock_values'][-1], 100000)
+
+    def test_unchanged_runs_skipped(self):
+        """Test that only runs with changed logs are analysed again"""
+        for run_folder in self.run_folders:
+            _, summary, skipped, error = analyze_folder(run_folder, self.root, self.cache_dir, plots=False)
+            self.assertIsNone(error)
+            self.assertFalse(skipped)
+            self.assertTrue(os.path.exists(os.path.join(run_folder, "summary.json")))
+
+        with open(os.path.join(self.run_folders[1], "machine_1.log"), 'a') as f:
+            f.write("2025-01-01 00:00:21 - Internal event, Logical clock: 100000\n")
+        skipped = [analyze_folder(run_folder, self.root, self.cache_dir, plots=False)[2]
+                   for run_folder in self.run_folders]
+        self.assertEqual(skipped, [True, False, True, True])
+
+    def test_deleted_log(self):
+        """Test that a run is analysed again when one of its logs is deleted"""
+        run_folder = self.run_folders[2]
+        summary = analyze_folder(run_folder, self.root, self.cache_dir, plots=False)[1]
+        self.assertEqual(len(summary['machines']), 3)
+
+        os.remove(os.path.join(run_folder, "machine_2.log"))
+        _, summary, skipped, _ = analyze_folder(run_folder, self.root, self.cache_dir, plots=False)
+        self.assertFalse(skipped)
+        self.assertEqual(len(summary['machines']), 2)
+        self.assertEqual(sorted(summary['logs']), ["machine_0.log", "machine_1.log"])
+
+    def test_aggregate(self):
+        """Test that runs are grouped by configuration and machines by tick rate"""
+        summaries = {}
+        for run_folder in self.run_folders:
+            summaries[run_folder] = analyze_folder(run_folder, self.root, self.cache_dir, plots=False)[1]
+        report = aggregate(summaries, self.root)
+
+        self.assertEqual(sorted(report['configurations']), ['pair', 'trio'])
+        self.assertEqual(report['configurations']['pair']['runs'], 2)
+        self.assertEqual(report['configurations']['pair']['machines'], 4)
+        self.assertEqual(report['configurations']['trio']['machines'], 6)
+        self.assertEqual(sum(group['machines'] for group in report['tick_rates'].values()), 10)
+        # the report must be JSON-serialisable
+        json.dumps(report)
+
+if __name__ == '__main__':
+    unittest.main()
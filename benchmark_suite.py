@@ -0,0 +1,285 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import timeit
+import platform
+import argparse
+import tempfile
+import threading
+from message import Message, encode_batch, decode_batch
+from virtual_machine import VirtualMachine
+from transport import NullTransport, free_port_base
+from analyze_logs import parse_log_file, find_log_files
+from simulation import Simulation
+
+# Benchmark suite covering message encoding, message throughput between
+# machines, tick rate accuracy and log parsing, compared against a stored
+# baseline. Run with: python benchmark_suite.py [--quick] [--save-baseline]
+
+BASELINE_FILE = "benchmark_baseline.json"
+
+# A result worse than the baseline by more than this fraction is a regression
+DEFAULT_THRESHOLD = 0.25
+
+TICK_RATES = (1, 10, 100, 1000)
+
+# Sizes of each benchmark, and smaller ones for --quick
+SIZES = {
+    'messages': 10000, 'batch_size': 100, 'point_to_point': 20000, 'broadcast': 5000,
+    'broadcast_machines': 4, 'tick_seconds': 2.0, 'log_hours': 1.0,
+}
+QUICK_SIZES = {
+    'messages': 2000, 'batch_size': 100, 'point_to_point': 2000, 'broadcast': 500,
+    'broadcast_machines': 4, 'tick_seconds': 0.5, 'log_hours': 0.1,
+}
+
+def result(value, unit, higher_is_better=True, tolerance=0.0):
+    """One benchmark result; changes smaller than tolerance, in the result's unit, are never regressions"""
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better, 'tolerance': tolerance}
+
+def best_rate(func, count, repeat=5):
+    """count / the best time of func over several repeats of at least 0.2 seconds each"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return count * number / min(timer.repeat(repeat, number))
+
+def bench_messages(sizes, log_dir):
+    """Encode and decode throughput of the wire formats"""
+    count, batch_size = sizes['messages'], sizes['batch_size']
+    messages = [Message(i % 3, i, i) for i in range(count)]
+    batches = [messages[i:i + batch_size] for i in range(0, count, batch_size)]
+    binary = [m.to_bytes() for m in messages]
+    binary_batches = [encode_batch(batch) for batch in batches]
+    json_batches = [encode_batch(batch, 'json') for batch in batches]
+    return {
+        'message.binary_encode': result(best_rate(lambda: [m.to_bytes() for m in messages], count), 'msgs/s'),
+        'message.binary_decode': result(best_rate(lambda: [Message.from_bytes(p) for p in binary], count), 'msgs/s'),
+        'message.batch_encode': result(best_rate(lambda: [encode_batch(b) for b in batches], count), 'msgs/s'),
+        'message.batch_decode': result(best_rate(lambda: [decode_batch(b) for b in binary_batches], count), 'msgs/s'),
+        'message.json_batch_encode': result(best_rate(lambda: [encode_batch(b, 'json') for b in batches], count), 'msgs/s'),
+        'message.json_batch_decode': result(best_rate(lambda: [decode_batch(b) for b in json_batches], count), 'msgs/s'),
+    }
+
+def start_machines(count, log_dir, **options):
+    """Machines with running socket transports past the startup barrier, but no clock cycles"""
+    port_base = free_port_base(count)
+    machines = [VirtualMachine(i, count, 'localhost', port_base, rng=random.Random(i), log_dir=log_dir, **options)
+                for i in range(count)]
+    for machine in machines:
+        machine.running = True
+        machine.transport.start()
+    # every machine announces itself from its own thread, as separate processes would
+    barriers = [
+        threading.Thread(target=machine.transport.wait_ready,
+                         args=([peer - port_base for peer in machine.peers], 10.0, lambda: True))
+        for machine in machines
+    ]
+    for barrier in barriers:
+        barrier.start()
+    for barrier in barriers:
+        barrier.join()
+    return machines
+
+def wait_for_messages(machines, count, timeout=60.0):
+    """Wait until the machines' queues hold count messages between them"""
+    deadline = time.perf_counter() + timeout
+    while sum(machine.message_queue.qsize() for machine in machines) < count:
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"Only {sum(m.message_queue.qsize() for m in machines)} of {count} messages arrived")
+        time.sleep(0.0005)
+
+def bench_throughput(sizes, log_dir):
+    """Messages per second from one machine to another, and broadcast to several"""
+    results = {}
+    machines = start_machines(2, log_dir)
+    try:
+        sender, receiver = machines
+        count = sizes['point_to_point']
+        started = time.perf_counter()
+        for i in range(count):
+            sender._send_message(receiver.port, Message(0, i, i))
+        wait_for_messages([receiver], count)
+        results['vm.point_to_point'] = result(count / (time.perf_counter() - started), 'msgs/s')
+    finally:
+        for machine in machines:
+            machine.stop()
+
+    # with queued dispatch the clock cycle only hands messages to sender threads
+    for dispatch, prefix in (('inline', 'vm.broadcast'), ('queued', 'vm.queued_broadcast')):
+        machines = start_machines(sizes['broadcast_machines'], log_dir, send_dispatch=dispatch)
+        try:
+            sender, receivers = machines[0], machines[1:]
+            count = sizes['broadcast']
+            started = time.perf_counter()
+            # the broadcast action of a clock cycle, without the clock update
+            for i in range(count):
+                message = Message(0, i, i)
+                for peer in sender.peers:
+                    sender._send_message(peer, sender._for_peer(message, peer - sender.port_base))
+            sent = time.perf_counter()
+            wait_for_messages(receivers, count * len(receivers))
+            finished = time.perf_counter()
+            results[prefix] = result(count * len(receivers) / (finished - started), 'msgs/s')
+            # what one broadcast costs the sender's clock-cycle thread
+            results[f'{prefix}_send_time'] = result((sent - started) / count * 1e6, 'us', False, tolerance=5.0)
+        finally:
+            for machine in machines:
+                machine.stop()
+    return results
+
+class TickMachine(VirtualMachine):
+    """A machine with no peers that records when each tick ran"""
+    def _setup_network(self):
+        self.transport = NullTransport()
+        self.tick_times = []
+
+    def _tick(self):
+        self.tick_times.append(time.perf_counter())
+
+def bench_ticks(sizes, log_dir):
+    """Achieved against configured tick rate, and how late ticks start"""
+    results = {}
+    for rate in TICK_RATES:
+        machine = TickMachine(0, 1, 'localhost', 0, log_dir=log_dir, clock_rate_range=(rate, rate))
+        machine.running = True
+        thread = threading.Thread(target=machine._run_clock_cycle)
+        thread.start()
+        # at least a few ticks even at the slowest rates
+        time.sleep(max(sizes['tick_seconds'], 4.0 / rate))
+        machine.running = False
+        thread.join()
+        machine.stop()
+
+        times = machine.tick_times
+        achieved = (len(times) - 1) / (times[-1] - times[0])
+        stats = machine.scheduler.stats
+        results[f'ticks.rate_{rate}.error'] = result(abs(achieved - rate) / rate * 100, '%', False, tolerance=5.0)
+        results[f'ticks.rate_{rate}.jitter_mean'] = result(
+            stats['jitter_total'] / stats['ticks'] * 1000, 'ms', False, tolerance=1.0)
+    return results
+
+def bench_analysis(sizes, log_dir):
+    """Log lines parsed per second by analyze_logs"""
+    run_dir = os.path.join(log_dir, "analysis_run")
+    os.makedirs(run_dir, exist_ok=True)
+    Simulation(3, seed=1, log_dir=run_dir).run(sizes['log_hours'] * 3600)
+    log_files = find_log_files(run_dir)
+    lines = 0
+    for log_file in log_files:
+        with open(log_file) as f:
+            lines += sum(1 for _ in f)
+    rate = best_rate(lambda: [parse_log_file(log_file) for log_file in log_files], lines, repeat=3)
+    return {'analysis.parse': result(rate, 'lines/s')}
+
+BENCHMARKS = {
+    'messages': bench_messages,
+    'throughput': bench_throughput,
+    'ticks': bench_ticks,
+    'analysis': bench_analysis,
+}
+
+def best_of(first, second):
+    """The better of two results of the same benchmark"""
+    if first is None:
+        return second
+    better = max if second['higher_is_better'] else min
+    return dict(second, value=better(first['value'], second['value']))
+
+def run_benchmarks(names=None, quick=False, runs=1):
+    """Run the named benchmark groups, or all of them, keeping each result's best of runs.
+
+    Returns the results document.
+    """
+    sizes = QUICK_SIZES if quick else SIZES
+    log_dir = tempfile.mkdtemp()
+    results = {}
+    try:
+        for _ in range(runs):
+            for name, bench in BENCHMARKS.items():
+                if names is None or name in names:
+                    for key, value in bench(sizes, log_dir).items():
+                        results[key] = best_of(results.get(key), value)
+    finally:
+        shutil.rmtree(log_dir)
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'quick': quick,
+            'runs': runs,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Results worse than the baseline by more than threshold, as (name, baseline, current, change) tuples.
+
+    change is the relative change in the direction of better, so a
+    regression has a negative change. Results missing from either side
+    are not compared.
+    """
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        difference = current['value'] - previous['value']
+        if not current['higher_is_better']:
+            difference = -difference
+        if difference >= 0 or -difference <= current.get('tolerance', 0.0):
+            continue
+        change = difference / previous['value'] if previous['value'] else float('-inf')
+        if change < -threshold:
+            regressions.append((name, previous['value'], current['value'], change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare it with the baseline")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="benchmark groups to run")
+    parser.add_argument('--quick', action='store_true', help="smaller sizes, for a fast check")
+    parser.add_argument('--runs', type=int, default=1, help="run the suite this many times and keep the best results")
+    parser.add_argument('--output', default="benchmark_results.json", help="file to write the results to")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline results to compare with")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="fraction by which a result may be worse than the baseline")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.quick, args.runs)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    for name, current in results['results'].items():
+        line = f"{name:<30} {current['value']:>14,.2f} {current['unit']:<7}"
+        previous = baseline['results'].get(name) if baseline else None
+        if previous:
+            line += f" baseline {previous['value']:>14,.2f}"
+        print(line)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to store one")
+        return
+    regressions = compare(results, baseline, args.threshold)
+    for name, previous, current, change in regressions:
+        print(f"Regression: {name} {previous:,.2f} -> {current:,.2f} ({change * 100:+.1f}%)")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold * 100:.0f}% of the baseline")
+
+if __name__ == "__main__":
+    main()
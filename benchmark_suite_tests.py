@@ -0,0 +1,51 @@
+import unittest
+from benchmark_suite import result, compare, best_of, run_benchmarks
+
+def document(**values):
+    return {'results': values}
+
+# benchmark_suite.py tests
+class TestCompare(unittest.TestCase):
+    def test_throughput_regression(self):
+        """Test that a throughput drop beyond the threshold is reported"""
+        baseline = document(encode=result(1000.0, 'msgs/s'))
+        self.assertEqual(compare(document(encode=result(800.0, 'msgs/s')), baseline, 0.25), [])
+        regressions = compare(document(encode=result(700.0, 'msgs/s')), baseline, 0.25)
+        self.assertEqual(len(regressions), 1)
+        name, previous, current, change = regressions[0]
+        self.assertEqual((name, previous, current), ('encode', 1000.0, 700.0))
+        self.assertAlmostEqual(change, -0.3)
+
+    def test_lower_is_better(self):
+        """Test that a rise in a lower-is-better result is a regression, and a fall is not"""
+        baseline = document(send=result(10.0, 'us', False))
+        self.assertEqual(compare(document(send=result(5.0, 'us', False)), baseline), [])
+        self.assertEqual(len(compare(document(send=result(20.0, 'us', False)), baseline)), 1)
+
+    def test_tolerance(self):
+        """Test that changes within a result's tolerance are ignored, however large relatively"""
+        baseline = document(error=result(0.1, '%', False, tolerance=5.0))
+        self.assertEqual(compare(document(error=result(3.0, '%', False, tolerance=5.0)), baseline), [])
+        self.assertEqual(len(compare(document(error=result(6.0, '%', False, tolerance=5.0)), baseline)), 1)
+
+    def test_missing_results(self):
+        """Test that results only on one side are not compared"""
+        self.assertEqual(compare(document(new=result(1.0, 'x')), document(old=result(5.0, 'x'))), [])
+
+    def test_best_of(self):
+        """Test that repeated runs keep the best value in each result's direction"""
+        self.assertEqual(best_of(result(5.0, 'x'), result(3.0, 'x'))['value'], 5.0)
+        self.assertEqual(best_of(result(5.0, 'x', False), result(3.0, 'x', False))['value'], 3.0)
+        self.assertEqual(best_of(None, result(3.0, 'x'))['value'], 3.0)
+
+class TestRun(unittest.TestCase):
+    def test_analysis_benchmark(self):
+        """Test that a benchmark group produces a results document"""
+        results = run_benchmarks(['analysis'], quick=True)
+        self.assertTrue(results['environment']['quick'])
+        parse = results['results']['analysis.parse']
+        self.assertEqual(parse['unit'], 'lines/s')
+        self.assertGreater(parse['value'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,250 @@
+import csv
+import time
+import atexit
+import struct
+import threading
+from collections import deque
+
+# Event kinds recorded by a virtual machine
+EVENT_TEXT = 0
+EVENT_RECEIVE = 1
+EVENT_RECEIVE_BATCH = 2
+EVENT_SEND = 3
+EVENT_BROADCAST = 4
+EVENT_INTERNAL = 5
+EVENT_DELIVER = 6
+EVENT_NAMES = {
+    EVENT_TEXT: 'text',
+    EVENT_RECEIVE: 'receive',
+    EVENT_RECEIVE_BATCH: 'receive_batch',
+    EVENT_SEND: 'send',
+    EVENT_BROADCAST: 'broadcast',
+    EVENT_INTERNAL: 'internal',
+    EVENT_DELIVER: 'deliver',
+}
+
+# File extension for each log format
+LOG_EXTENSIONS = {'text': 'log', 'csv': 'csv', 'binary': 'bin'}
+
+# Binary records are timestamp, kind, peer, queue length, logical clock,
+# message id and vector clock length, little-endian; fields an event does
+# not have are -1. The vector clock entries follow as int64s. A text record
+# stores the length of its UTF-8 message in the queue length field,
+# followed by the message bytes; a batch receipt, which has a queue
+# length, follows with a uint32 length and its list of senders and ids
+EVENT_STRUCT = struct.Struct('<dBiqqqH')
+TEXT_LENGTH = struct.Struct('<I')
+
+CSV_HEADER = ['timestamp', 'event', 'peer', 'queue_length', 'logical_clock', 'message_id', 'vector_clock', 'message']
+
+class EventLog:
+    """A machine log that keeps file I/O off the clock-cycle thread.
+
+    Recording an event only appends a small tuple to a deque. Formatting
+    and buffered writes happen when the log is flushed, which a shared
+    background writer thread does every few milliseconds, or the caller
+    does itself when background is False. Supports the human-readable
+    line format ('text') as well as 'csv' and compact 'binary' formats.
+    """
+    def __init__(self, filename, log_format='text', clock=time.time, converter=time.localtime, background=True):
+        if log_format not in LOG_EXTENSIONS:
+            raise ValueError(f"Unknown log format: {log_format}")
+        self.filename = filename
+        self.log_format = log_format
+        self.clock = clock
+        self.converter = converter
+        self.pending = deque()
+        self.lock = threading.Lock()
+        # events come from the clock cycle and every receive thread, so the
+        # time is read and the event queued under one lock: the log and the
+        # store then list events in the same order, and in time order
+        self.append_lock = threading.Lock()
+        self.closed = False
+        # an optional event_store.EventStore that gets every event but free-form lines
+        self.store = None
+
+        # timestamps within the same second share one formatted string
+        self.cached_second = None
+        self.cached_time_str = None
+
+        if log_format == 'binary':
+            self.file = open(filename, 'wb')
+        else:
+            self.file = open(filename, 'w', newline='' if log_format == 'csv' else None)
+        if log_format == 'csv':
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(CSV_HEADER)
+
+        self.writer = _shared_writer() if background else None
+        if self.writer:
+            self.writer.add(self)
+
+    def event(self, kind, peer=None, queue_length=None, logical_clock=None, text=None, message_id=None, vector=None):
+        """Record an event; this never touches the disk.
+
+        The event is formatted later, so a vector clock must be a copy
+        that is not changed afterwards, such as a tuple.
+        """
+        if not self.closed:
+            with self.append_lock:
+                self.pending.append((self.clock(), kind, peer, queue_length, logical_clock, text, message_id, vector))
+                if self.store is not None and kind != EVENT_TEXT:
+                    self.store.append(kind, peer, queue_length, logical_clock, message_id)
+
+    def info(self, text):
+        """Record a free-form line"""
+        self.event(EVENT_TEXT, text=text)
+
+    error = info
+
+    def flush(self):
+        """Format and write every pending event"""
+        with self.lock:
+            if self.file.closed:
+                return
+            pending = self.pending
+            write = self._write_text if self.log_format == 'text' else (
+                self._write_csv if self.log_format == 'csv' else self._write_binary)
+            while pending:
+                write(pending.popleft())
+            self.file.flush()
+            if self.store is not None:
+                self.store.flush()
+
+    def close(self):
+        """Write out everything recorded so far and close the file"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.writer:
+            self.writer.remove(self)
+        self.flush()
+        with self.lock:
+            self.file.close()
+            if self.store is not None:
+                self.store.close()
+
+    def _format_time(self, timestamp):
+        second = int(timestamp)
+        if second != self.cached_second:
+            self.cached_second = second
+            self.cached_time_str = time.strftime('%Y-%m-%d %H:%M:%S', self.converter(second))
+        return self.cached_time_str
+
+    def _write_text(self, record):
+        timestamp, kind, peer, queue_length, logical_clock, text, message_id, vector = record
+        # messages with an id name it right after the peer
+        tag = "" if message_id is None else f" (id {message_id})"
+        if kind == EVENT_TEXT:
+            line = text
+        elif kind == EVENT_RECEIVE:
+            line = f"Received message from Machine {peer}{tag}, Queue length: {queue_length}, Logical clock: {logical_clock}"
+        elif kind == EVENT_RECEIVE_BATCH:
+            line = f"Received {peer} messages from Machines {text}, Queue length: {queue_length}, Logical clock: {logical_clock}"
+        elif kind == EVENT_SEND:
+            line = f"Sent message to Machine {peer}{tag}, Logical clock: {logical_clock}"
+        elif kind == EVENT_BROADCAST:
+            line = f"Sent message to ALL other machines{tag}, Logical clock: {logical_clock}"
+        elif kind == EVENT_DELIVER:
+            line = f"Delivered message from Machine {peer}{tag}, Logical clock: {logical_clock}"
+        else:
+            line = f"Internal event, Logical clock: {logical_clock}"
+        if vector is not None:
+            line += f", Vector clock: [{', '.join(map(str, vector))}]"
+        self.file.write(f"{self._format_time(timestamp)} - {line}\n")
+
+    def _write_csv(self, record):
+        timestamp, kind, peer, queue_length, logical_clock, text, message_id, vector = record
+        self.csv_writer.writerow([
+            f"{timestamp:.6f}", EVENT_NAMES[kind],
+            '' if peer is None else peer,
+            '' if queue_length is None else queue_length,
+            '' if logical_clock is None else logical_clock,
+            '' if message_id is None else message_id,
+            '' if vector is None else ' '.join(map(str, vector)),
+            text or ''
+        ])
+
+    def _write_binary(self, record):
+        timestamp, kind, peer, queue_length, logical_clock, text, message_id, vector = record
+        data = b''
+        if kind == EVENT_TEXT:
+            data = text.encode()
+            queue_length = len(data)
+        elif kind == EVENT_RECEIVE_BATCH:
+            data = (text or '').encode()
+            data = TEXT_LENGTH.pack(len(data)) + data
+        vector = vector or ()
+        self.file.write(EVENT_STRUCT.pack(
+            timestamp, kind,
+            -1 if peer is None else peer,
+            -1 if queue_length is None else queue_length,
+            -1 if logical_clock is None else logical_clock,
+            -1 if message_id is None else message_id,
+            len(vector)
+        ) + struct.pack(f'<{len(vector)}q', *vector) + data)
+
+def read_binary_events(filename):
+    """Yield (timestamp, kind, peer, queue_length, logical_clock, text, message_id, vector) from a binary log"""
+    with open(filename, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        timestamp, kind, peer, queue_length, logical_clock, message_id, vector_length = EVENT_STRUCT.unpack_from(data, offset)
+        offset += EVENT_STRUCT.size
+        vector = None
+        if vector_length:
+            vector = struct.unpack_from(f'<{vector_length}q', data, offset)
+            offset += 8 * vector_length
+        text = None
+        if kind == EVENT_TEXT:
+            text = data[offset:offset + queue_length].decode()
+            offset += queue_length
+            queue_length = -1
+        elif kind == EVENT_RECEIVE_BATCH:
+            length, = TEXT_LENGTH.unpack_from(data, offset)
+            offset += TEXT_LENGTH.size
+            text = data[offset:offset + length].decode()
+            offset += length
+        yield timestamp, kind, peer, queue_length, logical_clock, text, message_id, vector
+
+class EventWriter(threading.Thread):
+    """Background thread that periodically flushes a set of event logs"""
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.logs = set()
+        self.logs_lock = threading.Lock()
+
+    def add(self, log):
+        with self.logs_lock:
+            self.logs.add(log)
+
+    def remove(self, log):
+        with self.logs_lock:
+            self.logs.discard(log)
+
+    def flush_all(self):
+        with self.logs_lock:
+            logs = list(self.logs)
+        for log in logs:
+            log.flush()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush_all()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _shared_writer():
+    """The process-wide writer thread, started on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = EventWriter()
+            _writer.start()
+            # write out whatever is left if the process exits without stop()
+            atexit.register(_writer.flush_all)
+        return _writer
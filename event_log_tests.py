@@ -0,0 +1,168 @@
+import os
+import csv
+import time
+import unittest
+import itertools
+import threading
+from event_log import (EventLog, read_binary_events, EVENT_TEXT, EVENT_RECEIVE, EVENT_RECEIVE_BATCH,
+                       EVENT_SEND, EVENT_BROADCAST, EVENT_INTERNAL, EVENT_DELIVER, EVENT_NAMES)
+from event_store import EventStore, EventStoreFile
+from harness import ScratchFolder
+
+# A fixed clock so the expected lines are known
+FIXED_TIME = 1740753058.25
+
+# event_log.py tests
+class TestEventLog(ScratchFolder, unittest.TestCase):
+    def record_events(self, log):
+        log.info("Machine initialized with clock rate: 5 ticks/second")
+        log.event(EVENT_SEND, 1, logical_clock=1)
+        log.event(EVENT_BROADCAST, logical_clock=2)
+        log.event(EVENT_INTERNAL, logical_clock=3)
+        log.event(EVENT_RECEIVE, 2, 0, 7)
+        log.event(EVENT_RECEIVE_BATCH, 2, 1, 9, "1, 2")
+
+    def test_text_format(self):
+        """Test that text logs keep the original line format"""
+        filename = os.path.join(self.log_dir, "machine_0.log")
+        log = EventLog(filename, clock=lambda: FIXED_TIME, converter=time.gmtime, background=False)
+        self.record_events(log)
+        log.close()
+
+        with open(filename) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines, [
+            "2025-02-28 14:30:58 - Machine initialized with clock rate: 5 ticks/second",
+            "2025-02-28 14:30:58 - Sent message to Machine 1, Logical clock: 1",
+            "2025-02-28 14:30:58 - Sent message to ALL other machines, Logical clock: 2",
+            "2025-02-28 14:30:58 - Internal event, Logical clock: 3",
+            "2025-02-28 14:30:58 - Received message from Machine 2, Queue length: 0, Logical clock: 7",
+            "2025-02-28 14:30:58 - Received 2 messages from Machines 1, 2, Queue length: 1, Logical clock: 9",
+        ])
+
+    def test_csv_format(self):
+        filename = os.path.join(self.log_dir, "machine_0.csv")
+        log = EventLog(filename, 'csv', clock=lambda: FIXED_TIME, background=False)
+        self.record_events(log)
+        log.close()
+
+        with open(filename, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[4]['event'], 'receive')
+        self.assertEqual(rows[4]['peer'], '2')
+        self.assertEqual(rows[4]['queue_length'], '0')
+        self.assertEqual(rows[4]['logical_clock'], '7')
+        self.assertEqual(float(rows[0]['timestamp']), FIXED_TIME)
+
+    def test_binary_format(self):
+        filename = os.path.join(self.log_dir, "machine_0.bin")
+        log = EventLog(filename, 'binary', clock=lambda: FIXED_TIME, background=False)
+        self.record_events(log)
+        log.close()
+
+        events = list(read_binary_events(filename))
+        self.assertEqual([event[1] for event in events], [
+            EVENT_TEXT, EVENT_SEND, EVENT_BROADCAST, EVENT_INTERNAL, EVENT_RECEIVE, EVENT_RECEIVE_BATCH
+        ])
+        self.assertEqual(events[0][5], "Machine initialized with clock rate: 5 ticks/second")
+        self.assertEqual(events[4], (FIXED_TIME, EVENT_RECEIVE, 2, 0, 7, None, -1, None))
+        self.assertEqual(events[5], (FIXED_TIME, EVENT_RECEIVE_BATCH, 2, 1, 9, "1, 2", -1, None))
+
+    def test_message_ids(self):
+        """Test that message ids are written after the peer in every format"""
+        def record(log):
+            log.event(EVENT_SEND, 1, logical_clock=1, message_id=0)
+            log.event(EVENT_BROADCAST, logical_clock=2, message_id=1)
+            log.event(EVENT_DELIVER, 2, logical_clock=4, message_id=6)
+            log.event(EVENT_RECEIVE, 2, 0, 5, message_id=6)
+            log.event(EVENT_RECEIVE_BATCH, 2, 0, 9, "1 (id 3), 2 (id 7)")
+
+        filename = os.path.join(self.log_dir, "machine_0.log")
+        log = EventLog(filename, clock=lambda: FIXED_TIME, converter=time.gmtime, background=False)
+        record(log)
+        log.close()
+        with open(filename) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines, [
+            "2025-02-28 14:30:58 - Sent message to Machine 1 (id 0), Logical clock: 1",
+            "2025-02-28 14:30:58 - Sent message to ALL other machines (id 1), Logical clock: 2",
+            "2025-02-28 14:30:58 - Delivered message from Machine 2 (id 6), Logical clock: 4",
+            "2025-02-28 14:30:58 - Received message from Machine 2 (id 6), Queue length: 0, Logical clock: 5",
+            "2025-02-28 14:30:58 - Received 2 messages from Machines 1 (id 3), 2 (id 7), Queue length: 0, Logical clock: 9",
+        ])
+
+        filename = os.path.join(self.log_dir, "machine_0.csv")
+        log = EventLog(filename, 'csv', clock=lambda: FIXED_TIME, background=False)
+        record(log)
+        log.close()
+        with open(filename, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['message_id'] for row in rows], ['0', '1', '6', '6', ''])
+        self.assertEqual(rows[2]['event'], 'deliver')
+
+        filename = os.path.join(self.log_dir, "machine_0.bin")
+        log = EventLog(filename, 'binary', clock=lambda: FIXED_TIME, background=False)
+        record(log)
+        log.close()
+        events = list(read_binary_events(filename))
+        self.assertEqual([event[6] for event in events], [0, 1, 6, 6, -1])
+        self.assertEqual(events[4], (FIXED_TIME, EVENT_RECEIVE_BATCH, 2, 0, 9, "1 (id 3), 2 (id 7)", -1, None))
+
+    def test_background_writer(self):
+        """Test that the background writer flushes without being asked"""
+        filename = os.path.join(self.log_dir, "machine_0.log")
+        log = EventLog(filename)
+        log.event(EVENT_INTERNAL, logical_clock=1)
+
+        deadline = time.time() + 2
+        while os.path.getsize(filename) == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertGreater(os.path.getsize(filename), 0)
+        log.close()
+
+        # nothing is recorded once the log is closed
+        log.event(EVENT_INTERNAL, logical_clock=2)
+        self.assertEqual(len(log.pending), 0)
+
+    def test_concurrent_events(self):
+        """Test that events from several threads are logged and stored in time order"""
+        ticks = itertools.count(1)
+
+        def clock():
+            # the sender thread is slow to return the time, so the other one records in between
+            value = next(ticks)
+            if threading.current_thread() is threads[0]:
+                time.sleep(0.0001)
+            return value
+
+        filename = os.path.join(self.log_dir, "machine_0.csv")
+        log = EventLog(filename, 'csv', clock=clock, background=False)
+        log.store = EventStore(os.path.join(self.log_dir, "machine_0.evt"), 0, 1, clock=clock, wall_offset_ns=0)
+
+        def record(kind):
+            for i in range(500):
+                log.event(kind, logical_clock=i)
+
+        threads = [threading.Thread(target=record, args=(kind,)) for kind in (EVENT_SEND, EVENT_INTERNAL)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        log.close()
+
+        with open(filename, newline='') as f:
+            rows = list(csv.DictReader(f))
+        times = [float(row['timestamp']) for row in rows]
+        self.assertEqual(times, sorted(times))
+        store = EventStoreFile(os.path.join(self.log_dir, "machine_0.evt"))
+        self.assertEqual(store.events['time_ns'].tolist(), sorted(store.events['time_ns'].tolist()))
+        self.assertEqual([EVENT_NAMES[kind] for kind in store.events['kind'].tolist()], [row['event'] for row in rows])
+
+    def test_unknown_format(self):
+        # ensure not able to make a log with an unknown format
+        with self.assertRaises(ValueError):
+            EventLog(os.path.join(self.log_dir, "machine_0.xml"), 'xml')
+
+if __name__ == "__main__":
+    unittest.main()
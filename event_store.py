@@ -0,0 +1,182 @@
+import os
+import re
+import time
+import struct
+import threading
+import numpy as np
+from event_log import (EVENT_TEXT, EVENT_RECEIVE, EVENT_RECEIVE_BATCH, EVENT_SEND, EVENT_BROADCAST,
+                       EVENT_INTERNAL)
+
+# An event store is a fixed-size header followed by fixed-width event
+# records, so it can be memory-mapped and read column by column without
+# parsing. Times are monotonic nanoseconds; the header holds the offset
+# that turns them into nanoseconds since the epoch. Fields an event does
+# not have are -1, and a batch receipt stores its message count as the peer
+STORE_FILE_NAME = re.compile(r"machine_(\d+)\.evt$")
+STORE_MAGIC = b'LCEVT001'
+HEADER_STRUCT = struct.Struct('<8siiq')
+HEADER_SIZE = 64
+EVENT_DTYPE = np.dtype([
+    ('time_ns', '<i8'),
+    ('kind', 'u1'),
+    ('peer', '<i4'),
+    ('logical_clock', '<i8'),
+    ('queue_length', '<i4'),
+    ('message_id', '<i8'),
+])
+
+# The index sidecar (machine_N.evt.idx) holds the time of every
+# INDEX_STRIDE-th event, so a time range is found by searching the index
+# and then one stride of the store
+INDEX_STRIDE = 1024
+
+# Event kinds as analyze_logs numbers them
+ANALYSIS_KINDS = {EVENT_RECEIVE: 0, EVENT_RECEIVE_BATCH: 0, EVENT_SEND: 1, EVENT_BROADCAST: 2, EVENT_INTERNAL: 3}
+
+class EventStore:
+    """Appends a machine's events to a memory-mappable columnar file.
+
+    Like EventLog, recording only appends a tuple; the records are packed
+    and written when the owning EventLog is flushed by its writer thread.
+    Events come from the clock cycle and every receive thread, so the
+    time is read under the same lock as the append: the file is then in
+    time order, which the index and between() rely on.
+    """
+    def __init__(self, filename, machine_id, clock_rate, clock=time.monotonic_ns, wall_offset_ns=None):
+        self.filename = filename
+        self.clock = clock
+        if wall_offset_ns is None:
+            wall_offset_ns = time.time_ns() - time.monotonic_ns()
+        self.pending = []
+        self.lock = threading.Lock()
+        self.count = 0
+        self.index = []
+        self.file = open(filename, 'wb')
+        self.file.write(HEADER_STRUCT.pack(STORE_MAGIC, machine_id, clock_rate, wall_offset_ns).ljust(HEADER_SIZE, b'\0'))
+
+    def append(self, kind, peer, queue_length, logical_clock, message_id):
+        """Record an event; this never touches the disk"""
+        with self.lock:
+            self.pending.append((self.clock(), kind, peer, queue_length, logical_clock, message_id))
+
+    def flush(self):
+        """Pack and write every pending event"""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if not pending or self.file.closed:
+            return
+        records = np.array([
+            (time_ns, kind,
+             -1 if peer is None else peer,
+             -1 if logical_clock is None else logical_clock,
+             -1 if queue_length is None else queue_length,
+             -1 if message_id is None else message_id)
+            for time_ns, kind, peer, queue_length, logical_clock, message_id in pending
+        ], dtype=EVENT_DTYPE)
+        # the first event of every stride goes into the index
+        first = -self.count % INDEX_STRIDE
+        self.index.extend(records['time_ns'][first::INDEX_STRIDE].tolist())
+        self.count += len(records)
+        self.file.write(records.tobytes())
+        self.file.flush()
+
+    def close(self):
+        """Write out the pending events and the index"""
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+        np.array([self.count] + self.index, dtype='<i8').tofile(self.filename + ".idx")
+
+class EventStoreFile:
+    """A memory-mapped event store, read as columns.
+
+    events is a structured array over the file, so events['logical_clock']
+    and the other columns are read straight from the page cache. A store
+    that is still being written is read up to its last complete event.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            magic, self.machine_id, self.clock_rate, self.wall_offset_ns = HEADER_STRUCT.unpack(
+                f.read(HEADER_SIZE)[:HEADER_STRUCT.size])
+        if magic != STORE_MAGIC:
+            raise ValueError(f"{filename} is not an event store")
+        count = (os.path.getsize(filename) - HEADER_SIZE) // EVENT_DTYPE.itemsize
+        if count:
+            self.events = np.memmap(filename, dtype=EVENT_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.events = np.empty(0, dtype=EVENT_DTYPE)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        """The index written on close, or one built from the times if it is missing or stale"""
+        try:
+            index = np.fromfile(self.filename + ".idx", dtype='<i8')
+            if len(index) and index[0] == len(self.events):
+                return index[1:]
+        except OSError:
+            pass
+        return np.array(self.events['time_ns'][::INDEX_STRIDE])
+
+    def __len__(self):
+        return len(self.events)
+
+    def between(self, start_ns=None, end_ns=None):
+        """The events with start_ns <= time < end_ns, in monotonic nanoseconds, as a view"""
+        times = self.events['time_ns']
+        low, high = 0, len(self.events)
+        if start_ns is not None:
+            stride = max(0, int(np.searchsorted(self.index, start_ns, side='right')) - 1) * INDEX_STRIDE
+            low = stride + int(np.searchsorted(times[stride:stride + INDEX_STRIDE + 1], start_ns))
+        if end_ns is not None:
+            stride = max(0, int(np.searchsorted(self.index, end_ns, side='right')) - 1) * INDEX_STRIDE
+            high = stride + int(np.searchsorted(times[stride:stride + INDEX_STRIDE + 1], end_ns))
+        return self.events[low:max(low, high)]
+
+    def wall_times(self, events=None):
+        """Seconds since the epoch of the events, or of every event"""
+        events = self.events if events is None else events
+        return (events['time_ns'] + self.wall_offset_ns) / 1e9
+
+    def parsed(self, events=None):
+        """The events as the columns analyze_logs.parse_log_file returns, with exact times"""
+        events = self.events if events is None else events
+        kinds = np.full(256, -1, dtype=np.int8)
+        for kind, analysis_kind in ANALYSIS_KINDS.items():
+            kinds[kind] = analysis_kind
+        event_kinds = kinds[events['kind']]
+        clock_events = events[event_kinds >= 0]
+        receipts = clock_events[kinds[clock_events['kind']] == 0]
+        return {
+            'tick_rate': self.clock_rate,
+            'clock_times': self.wall_times(clock_events),
+            'clock_values': clock_events['logical_clock'].astype(np.int64),
+            'event_kinds': event_kinds[event_kinds >= 0],
+            'queue_times': self.wall_times(receipts),
+            'queue_values': receipts['queue_length'].astype(np.int64),
+        }
+
+def find_event_stores(folder):
+    """The machine_N.evt files in a folder, ordered by machine id"""
+    stores = []
+    for name in os.listdir(folder):
+        match = STORE_FILE_NAME.match(name)
+        if match:
+            stores.append((int(match.group(1)), os.path.join(folder, name)))
+    return [store for _, store in sorted(stores)]
+
+def load_run(folder, machines=None, start=None, end=None):
+    """Memory-map a run's event stores, optionally only some machines and a time range.
+
+    start and end are seconds since the epoch. Returns a dict of machine
+    id to (store, events view).
+    """
+    run = {}
+    for filename in find_event_stores(folder):
+        store = EventStoreFile(filename)
+        if machines is not None and store.machine_id not in machines:
+            continue
+        to_ns = lambda seconds: None if seconds is None else int(seconds * 1e9) - store.wall_offset_ns
+        run[store.machine_id] = (store, store.between(to_ns(start), to_ns(end)))
+    return run
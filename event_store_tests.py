@@ -0,0 +1,144 @@
+import os
+import time
+import unittest
+import threading
+import itertools
+import numpy as np
+from event_log import EventLog, EVENT_RECEIVE, EVENT_RECEIVE_BATCH, EVENT_SEND, EVENT_BROADCAST, EVENT_INTERNAL
+from event_store import EventStore, EventStoreFile, INDEX_STRIDE, find_event_stores, load_run
+from analyze_logs import parse_log_file, analyze_run
+from simulation import Simulation, SIMULATION_EPOCH
+from harness import ScratchFolder
+
+# event_store.py tests
+class TestEventStore(ScratchFolder, unittest.TestCase):
+    def write_store(self, count, machine_id=0, step=1000):
+        """A closed store of count internal events, step nanoseconds apart"""
+        filename = os.path.join(self.log_dir, f"machine_{machine_id}.evt")
+        ticks = itertools.count(0, step)
+        store = EventStore(filename, machine_id, 7, clock=lambda: next(ticks), wall_offset_ns=0)
+        for i in range(count):
+            store.append(EVENT_INTERNAL, None, None, i + 1, None)
+            # flushes of uneven sizes cross the index strides at different points
+            if i % 700 == 0:
+                store.flush()
+        store.close()
+        return filename
+
+    def test_round_trip(self):
+        """Test that events recorded through an EventLog read back as columns"""
+        log = EventLog(os.path.join(self.log_dir, "machine_2.log"), background=False)
+        ticks = iter([5, 6, 7, 8, 9])
+        log.store = EventStore(os.path.join(self.log_dir, "machine_2.evt"), 2, 4, clock=lambda: next(ticks),
+                               wall_offset_ns=10 ** 18)
+        log.info("Machine initialized with clock rate: 4 ticks/second")
+        log.event(EVENT_SEND, 1, logical_clock=1, message_id=0)
+        log.event(EVENT_BROADCAST, logical_clock=2, message_id=1)
+        log.event(EVENT_RECEIVE, 0, 3, 7, message_id=4)
+        log.event(EVENT_RECEIVE_BATCH, 2, 1, 9, "0, 1")
+        log.event(EVENT_INTERNAL, logical_clock=10)
+        log.close()
+
+        store = EventStoreFile(os.path.join(self.log_dir, "machine_2.evt"))
+        self.assertEqual((store.machine_id, store.clock_rate, len(store)), (2, 4, 5))
+        self.assertIsInstance(store.events, np.memmap)
+        self.assertEqual(store.events['time_ns'].tolist(), [5, 6, 7, 8, 9])
+        self.assertEqual(store.events['kind'].tolist(),
+                         [EVENT_SEND, EVENT_BROADCAST, EVENT_RECEIVE, EVENT_RECEIVE_BATCH, EVENT_INTERNAL])
+        self.assertEqual(store.events['peer'].tolist(), [1, -1, 0, 2, -1])
+        self.assertEqual(store.events['logical_clock'].tolist(), [1, 2, 7, 9, 10])
+        self.assertEqual(store.events['queue_length'].tolist(), [-1, -1, 3, 1, -1])
+        self.assertEqual(store.events['message_id'].tolist(), [0, 1, 4, -1, -1])
+        self.assertEqual(store.wall_times()[0], 1e9 + 5e-9)
+
+        parsed = store.parsed()
+        self.assertEqual(parsed['tick_rate'], 4)
+        self.assertEqual(parsed['event_kinds'].tolist(), [1, 2, 0, 0, 3])
+        self.assertEqual(parsed['queue_values'].tolist(), [3, 1])
+
+    def test_time_range(self):
+        """Test that time ranges are sliced through the index, across strides"""
+        count = 3 * INDEX_STRIDE + 100
+        store = EventStoreFile(self.write_store(count))
+        self.assertEqual(store.index.tolist(), [i * INDEX_STRIDE * 1000 for i in range(4)])
+        times = store.events['time_ns']
+        for start, end in [(0, 5000), (1023_500, 1024_000), (1023_000, 2049_000), (5, 10 ** 9), (10 ** 9, None)]:
+            events = store.between(start, end)
+            expected = times[(times >= start) & (times < (np.inf if end is None else end))]
+            self.assertEqual(events['time_ns'].tolist(), expected.tolist(), (start, end))
+        self.assertEqual(len(store.between()), count)
+
+    def test_missing_index(self):
+        """Test that a store without its index, as during a run, is still sliced correctly"""
+        filename = self.write_store(2 * INDEX_STRIDE + 1)
+        expected = EventStoreFile(filename).index.tolist()
+        os.remove(filename + ".idx")
+        store = EventStoreFile(filename)
+        self.assertEqual(store.index.tolist(), expected)
+        self.assertEqual(store.between(2000_000, 2001_000)['logical_clock'].tolist(), [2001])
+
+    def test_concurrent_appends(self):
+        """Test that events appended from several threads while flushing are all kept, in time order"""
+        filename = os.path.join(self.log_dir, "machine_0.evt")
+        def clock():
+            # hand over to another thread between reading the time and recording it
+            now = time.monotonic_ns()
+            time.sleep(0)
+            return now
+        store = EventStore(filename, 0, 7, clock=clock)
+        threads, per_thread = 4, 1000
+        appenders = [
+            threading.Thread(target=lambda: [store.append(EVENT_INTERNAL, None, None, i, None)
+                                             for i in range(per_thread)])
+            for _ in range(threads)
+        ]
+        for thread in appenders:
+            thread.start()
+        while any(thread.is_alive() for thread in appenders):
+            store.flush()
+        for thread in appenders:
+            thread.join()
+        store.close()
+
+        store = EventStoreFile(filename)
+        times = store.events['time_ns']
+        self.assertEqual(len(store), threads * per_thread)
+        self.assertTrue(np.all(np.diff(times) >= 0))
+        self.assertEqual(store.index.tolist(), times[::INDEX_STRIDE].tolist())
+        self.assertEqual(len(store.between(int(times[0]), int(times[-1]) + 1)), len(store))
+
+    def test_load_run(self):
+        """Test that a run is sliced by machine and by wall-clock time"""
+        for machine_id in range(3):
+            self.write_store(100, machine_id)
+        self.assertEqual(len(find_event_stores(self.log_dir)), 3)
+        run = load_run(self.log_dir, machines={0, 2}, start=10e-6, end=20e-6)
+        self.assertEqual(sorted(run), [0, 2])
+        for store, events in run.values():
+            self.assertEqual(events['logical_clock'].tolist(), list(range(11, 21)))
+
+    def test_simulated_run(self):
+        """Test that a simulated run's stores match its logs, with exact times"""
+        Simulation(3, seed=5, log_dir=self.log_dir, event_store=True,
+                   clock_rate_range=(20, 40)).run(30)
+        for machine_id, filename in enumerate(find_event_stores(self.log_dir)):
+            store = EventStoreFile(filename)
+            parsed = store.parsed()
+            logged = parse_log_file(os.path.join(self.log_dir, f"machine_{machine_id}.log"))
+            self.assertEqual(parsed['tick_rate'], logged['tick_rate'])
+            for column in ('clock_values', 'event_kinds', 'queue_values'):
+                np.testing.assert_array_equal(parsed[column], logged[column])
+            # the logs only have whole seconds
+            np.testing.assert_array_equal(np.floor(parsed['clock_times'] + 1e-9), logged['clock_times'])
+            self.assertGreaterEqual(store.wall_times()[0], SIMULATION_EPOCH + 2.0)
+
+        # every event gets its own row rather than one per second
+        parsed_logs = [EventStoreFile(filename).parsed() for filename in find_event_stores(self.log_dir)]
+        analyze_run(self.log_dir, parsed_logs, plots=False)
+        with open(os.path.join(self.log_dir, "logical_clock.txt")) as f:
+            rows = f.read().splitlines()[2:]
+        self.assertEqual(rows[0][:15], "00:00:02.000000")
+        self.assertGreater(len(rows), 28 * 20)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,427 @@
+import os
+import re
+import csv
+import sys
+import json
+import argparse
+from array import array
+from collections import deque
+import numpy as np
+from analyze_logs import parse_timestamp, read_chunks
+from event_log import (read_binary_events, EVENT_NAMES, EVENT_RECEIVE, EVENT_RECEIVE_BATCH,
+                       EVENT_SEND, EVENT_BROADCAST, EVENT_INTERNAL, EVENT_DELIVER)
+
+# Machine logs in a run folder, in any of the event log formats. When a
+# machine has several, the most precise timestamps win
+LOG_FILE_NAME = re.compile(r"machine_(\d+)\.(log|csv|bin)$")
+FORMAT_PREFERENCE = {'csv': 0, 'bin': 1, 'log': 2}
+
+# One pattern for every event line of a text log. The message id after a
+# peer is missing in logs written before messages had ids, and the vector
+# clock is only logged in vector clock mode
+EVENT_LINE = re.compile(
+    r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) - (?:"
+    r"Sent message to (?:Machine (\d+)|(ALL) other machines)(?: \(id (\d+)\))?"
+    r"|Delivered message from Machine (\d+)(?: \(id (\d+)\))?"
+    r"|Received message from Machine (\d+)(?: \(id (\d+)\))?"
+    r"|Received \d+ messages from Machines ([^\n]*?)"
+    r"|(Internal) event"
+    r"), (?:Queue length: \d+, )?Logical clock: (\d+)(?:, Vector clock: \[([^\]\n]*)\])?$",
+    re.MULTILINE
+)
+
+# A "sender (id N)" entry in the list of a batch receipt
+BATCH_ENTRY = re.compile(r"(\d+) \(id (\d+)\)")
+
+# Percentiles reported for latency and queueing delay
+DELAY_PERCENTILES = (50, 90, 99)
+
+class MachineEvents:
+    """The causally relevant events of one machine's log, as columns.
+
+    Events (sends, receipts and internal events) are the nodes of the
+    happens-before graph, numbered in log order. Sends and receipts also
+    name their message; a batch receipt is one event receiving several
+    messages. Deliveries are when a message reached the machine's queue
+    and are not events of their own. Logs written in vector clock mode
+    also give every event its vector clock.
+    """
+    def __init__(self, machine_id):
+        self.machine_id = machine_id
+        self.times = array('d')
+        self.clocks = array('q')
+        self.kinds = array('b')
+        # the vector clock of each event, or None
+        self.vectors = []
+        # (event, message id, target machine or -1 for a broadcast)
+        self.sends = []
+        # (event, sender, message id)
+        self.receipts = []
+        # (sender, message id, time)
+        self.deliveries = []
+
+    def add_event(self, time, clock, kind, vector=None):
+        self.times.append(time)
+        self.clocks.append(clock)
+        self.kinds.append(kind)
+        self.vectors.append(vector)
+        return len(self.clocks) - 1
+
+def parse_text_log(filename, machine_id):
+    """Read the events of a text machine log"""
+    events = MachineEvents(machine_id)
+    timestamps = {}
+    for chunk in read_chunks(filename):
+        for (timestamp_str, target, broadcast, send_id, deliver_from, deliver_id,
+             receive_from, receive_id, batch, internal, clock, vector) in EVENT_LINE.findall(chunk):
+            time = timestamps.get(timestamp_str)
+            if time is None:
+                time = timestamps[timestamp_str] = parse_timestamp(timestamp_str)
+            clock = int(clock)
+            vector = tuple(map(int, vector.split(', '))) if vector else None
+            if deliver_from:
+                if deliver_id:
+                    events.deliveries.append((int(deliver_from), int(deliver_id), time))
+            elif target or broadcast:
+                event = events.add_event(time, clock, EVENT_BROADCAST if broadcast else EVENT_SEND, vector)
+                if send_id:
+                    events.sends.append((event, int(send_id), int(target) if target else -1))
+            elif receive_from:
+                event = events.add_event(time, clock, EVENT_RECEIVE, vector)
+                if receive_id:
+                    events.receipts.append((event, int(receive_from), int(receive_id)))
+            elif internal:
+                events.add_event(time, clock, EVENT_INTERNAL, vector)
+            else:
+                event = events.add_event(time, clock, EVENT_RECEIVE_BATCH, vector)
+                for sender, message_id in BATCH_ENTRY.findall(batch):
+                    events.receipts.append((event, int(sender), int(message_id)))
+    return events
+
+def add_record(events, time, kind, peer, clock, message_id, text, vector=None):
+    """Add one record of a csv or binary log; -1 or None mark missing fields"""
+    if kind == EVENT_DELIVER:
+        if message_id is not None:
+            events.deliveries.append((peer, message_id, time))
+    elif kind in (EVENT_SEND, EVENT_BROADCAST):
+        event = events.add_event(time, clock, kind, vector)
+        if message_id is not None:
+            events.sends.append((event, message_id, peer if kind == EVENT_SEND else -1))
+    elif kind == EVENT_RECEIVE:
+        event = events.add_event(time, clock, kind, vector)
+        if message_id is not None:
+            events.receipts.append((event, peer, message_id))
+    elif kind == EVENT_RECEIVE_BATCH:
+        event = events.add_event(time, clock, kind, vector)
+        for sender, batch_id in BATCH_ENTRY.findall(text or ''):
+            events.receipts.append((event, int(sender), int(batch_id)))
+    elif kind == EVENT_INTERNAL:
+        events.add_event(time, clock, kind, vector)
+
+def parse_csv_log(filename, machine_id):
+    """Read the events of a csv machine log"""
+    events = MachineEvents(machine_id)
+    kinds = {name: kind for kind, name in EVENT_NAMES.items()}
+    with open(filename, newline='') as f:
+        for row in csv.DictReader(f):
+            add_record(
+                events, float(row['timestamp']), kinds[row['event']],
+                int(row['peer']) if row['peer'] else -1,
+                int(row['logical_clock']) if row['logical_clock'] else -1,
+                int(row['message_id']) if row.get('message_id') else None,
+                row['message'],
+                tuple(map(int, row['vector_clock'].split())) if row.get('vector_clock') else None
+            )
+    return events
+
+def parse_binary_log(filename, machine_id):
+    """Read the events of a binary machine log"""
+    events = MachineEvents(machine_id)
+    for time, kind, peer, _, clock, text, message_id, vector in read_binary_events(filename):
+        add_record(events, time, kind, peer, clock, None if message_id < 0 else message_id, text, vector)
+    return events
+
+PARSERS = {'log': parse_text_log, 'csv': parse_csv_log, 'bin': parse_binary_log}
+
+def find_machine_logs(log_folder):
+    """The best log of each machine in a folder, ordered by machine id"""
+    best = {}
+    for name in os.listdir(log_folder):
+        match = LOG_FILE_NAME.match(name)
+        if match:
+            machine_id, extension = int(match.group(1)), match.group(2)
+            if machine_id not in best or FORMAT_PREFERENCE[extension] < FORMAT_PREFERENCE[best[machine_id][0]]:
+                best[machine_id] = (extension, os.path.join(log_folder, name))
+    return [(machine_id, extension, path) for machine_id, (extension, path) in sorted(best.items())]
+
+def message_key(sender, message_id):
+    """One integer naming a message across the whole run"""
+    return (sender << 40) | message_id
+
+class HappensBeforeGraph:
+    """Lamport's happens-before relation over the events of a run.
+
+    Nodes are every machine's events, numbered machine by machine in log
+    order, so program order is implicit: a node precedes the next node of
+    the same machine. Message edges join each send to each receipt of
+    that message, found through a hash index of sends keyed by sender and
+    message id, so building the graph is linear in the number of events.
+    """
+    def __init__(self, machines):
+        self.machines = machines
+        sizes = [len(machine.clocks) for machine in machines]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.machine_ids = np.repeat([machine.machine_id for machine in machines], sizes)
+        self.times = np.concatenate([np.frombuffer(machine.times, dtype=np.float64) for machine in machines] + [np.empty(0)])
+        self.clocks = np.concatenate([np.frombuffer(machine.clocks, dtype=np.int64) for machine in machines] + [np.empty(0, np.int64)])
+        index_of = {machine.machine_id: i for i, machine in enumerate(machines)}
+
+        # vector clocks as one row per node, when every event has one;
+        # shorter vectors are padded with zeros
+        self.vectors = None
+        vectors = [vector for machine in machines for vector in machine.vectors]
+        if vectors and all(vector is not None for vector in vectors):
+            width = max(len(vector) for vector in vectors)
+            self.vectors = np.zeros((len(vectors), width), dtype=np.int64)
+            for node, vector in enumerate(vectors):
+                self.vectors[node, :len(vector)] = vector
+
+        # hash index of sends, then one lookup per receipt
+        sends = {}
+        self.expected_receipts = 0
+        for i, machine in enumerate(machines):
+            offset = int(self.offsets[i])
+            for event, message_id, target in machine.sends:
+                sends[message_key(machine.machine_id, message_id)] = offset + event
+                self.expected_receipts += 1 if target >= 0 else len(machines) - 1
+
+        sources, targets, keys, receivers = [], [], [], []
+        self.unmatched_receipts = 0
+        for i, machine in enumerate(machines):
+            offset = int(self.offsets[i])
+            for event, sender, message_id in machine.receipts:
+                key = message_key(sender, message_id)
+                send = sends.get(key)
+                if send is None or sender not in index_of:
+                    self.unmatched_receipts += 1
+                    continue
+                sources.append(send)
+                targets.append(offset + event)
+                keys.append(key)
+                receivers.append(machine.machine_id)
+        self.edge_sources = np.array(sources, dtype=np.int64)
+        self.edge_targets = np.array(targets, dtype=np.int64)
+        self.edge_keys = np.array(keys, dtype=np.int64)
+        self.edge_receivers = np.array(receivers, dtype=np.int64)
+
+        # successors along message edges, and the last node of each
+        # machine, for reachability queries
+        self.last_nodes = set((self.offsets[1:] - 1).tolist())
+        self.message_successors = {}
+        for source, target in zip(sources, targets):
+            self.message_successors.setdefault(source, []).append(target)
+
+    def __len__(self):
+        return len(self.clocks)
+
+    def node(self, machine_id, event):
+        """Node number of a machine's event-th event"""
+        index = next(i for i, machine in enumerate(self.machines) if machine.machine_id == machine_id)
+        return int(self.offsets[index]) + event
+
+    def happens_before(self, a, b):
+        """Whether node a happens before node b.
+
+        A search from a along program order and message edges. Only nodes
+        with a clock below b's can lead to b when the clock condition
+        holds, which keeps the search small.
+        """
+        if a == b:
+            return False
+        limit = self.clocks[b]
+        seen = {a}
+        pending = deque([a])
+        while pending:
+            node = pending.popleft()
+            following = list(self.message_successors.get(node, ()))
+            if node not in self.last_nodes:
+                following.append(node + 1)
+            for successor in following:
+                if successor == b:
+                    return True
+                if successor not in seen and self.clocks[successor] < limit:
+                    seen.add(successor)
+                    pending.append(successor)
+        return False
+
+    def concurrent(self, a, b):
+        """Whether neither of nodes a and b happens before the other.
+
+        With vector clocks this is a comparison of two rows: a and b are
+        concurrent when each has an entry larger than the other's.
+        """
+        if self.vectors is None:
+            return a != b and not self.happens_before(a, b) and not self.happens_before(b, a)
+        va, vb = self.vectors[a], self.vectors[b]
+        return bool((va > vb).any() and (vb > va).any())
+
+    def _following(self):
+        """Mask of the nodes that follow another node of the same machine"""
+        following = np.ones(len(self.clocks), dtype=bool)
+        following[self.offsets[:-1][self.offsets[:-1] < len(self.clocks)]] = False
+        return following
+
+    def check_clock_condition(self):
+        """Edges of the graph along which the logical clock does not increase.
+
+        If a happens before b then C(a) < C(b). Happens-before is the
+        transitive closure of program order and message edges, so it is
+        enough to check every edge. Returns arrays of (from, to) nodes for
+        program order and for message edges.
+        """
+        program = np.flatnonzero(self._following() & (np.diff(self.clocks, prepend=0) <= 0))
+        message = np.flatnonzero(self.clocks[self.edge_sources] >= self.clocks[self.edge_targets])
+        return (
+            np.stack([program - 1, program], axis=1),
+            np.stack([self.edge_sources[message], self.edge_targets[message]], axis=1),
+        )
+
+    def check_vector_clocks(self):
+        """Edges of the graph along which the vector clock does not increase.
+
+        Along every edge V(from) < V(to): no entry decreases and at least
+        one grows. Returns arrays of (from, to) nodes like
+        check_clock_condition, or None when the logs have no vector clocks.
+        """
+        if self.vectors is None:
+            return None
+        def increases(before, after):
+            return (after >= before).all(axis=1) & (after > before).any(axis=1)
+        following = np.flatnonzero(self._following())
+        program = following[~increases(self.vectors[following - 1], self.vectors[following])]
+        message = np.flatnonzero(~increases(self.vectors[self.edge_sources], self.vectors[self.edge_targets]))
+        return (
+            np.stack([program - 1, program], axis=1),
+            np.stack([self.edge_sources[message], self.edge_targets[message]], axis=1),
+        )
+
+    def concurrent_receipts(self):
+        """Message edges whose send is concurrent with the receiver's event before the receipt.
+
+        These are the messages that bring the receiver news it could not
+        have caused; Lamport clocks alone order them all the same way. None
+        when the logs have no vector clocks.
+        """
+        if self.vectors is None:
+            return None
+        following = self._following()[self.edge_targets]
+        sources, previous = self.edge_sources[following], self.edge_targets[following] - 1
+        before, after = self.vectors[sources], self.vectors[previous]
+        concurrent = (before > after).any(axis=1) & (after > before).any(axis=1)
+        return np.stack([sources[concurrent], previous[concurrent] + 1], axis=1)
+
+    def delays(self):
+        """Latency (send to delivery) and queueing delay (delivery to receipt) of every matched receipt"""
+        delivered = {}
+        for machine in self.machines:
+            for sender, message_id, time in machine.deliveries:
+                delivered[(message_key(sender, message_id), machine.machine_id)] = time
+        latencies, queueing = [], []
+        for source, target, key, receiver in zip(
+                self.edge_sources.tolist(), self.edge_targets.tolist(),
+                self.edge_keys.tolist(), self.edge_receivers.tolist()):
+            time = delivered.get((key, receiver))
+            if time is not None:
+                latencies.append(time - self.times[source])
+                queueing.append(self.times[target] - time)
+        return np.array(latencies), np.array(queueing)
+
+def delay_stats(values):
+    """Mean, percentiles and max of a series of delays, in milliseconds"""
+    if not len(values):
+        return None
+    values = values * 1000
+    stats = {'mean': float(values.mean())}
+    for percentile in DELAY_PERCENTILES:
+        stats[f'p{percentile}'] = float(np.percentile(values, percentile))
+    stats['max'] = float(values.max())
+    return stats
+
+def analyze_causality(log_folder):
+    """Build the happens-before graph of a run and summarise it"""
+    logs = find_machine_logs(log_folder)
+    machines = [PARSERS[extension](path, machine_id) for machine_id, extension, path in logs]
+    graph = HappensBeforeGraph(machines)
+    program_violations, message_violations = graph.check_clock_condition()
+    latencies, queueing = graph.delays()
+    summary = {
+        'machines': len(machines),
+        'formats': sorted({extension for _, extension, _ in logs}),
+        'events': len(graph),
+        'messages_sent': sum(len(machine.sends) for machine in machines),
+        'expected_receipts': graph.expected_receipts,
+        'matched_receipts': len(graph.edge_sources),
+        'unmatched_receipts': graph.unmatched_receipts,
+        'clock_condition': {
+            'holds': not len(program_violations) and not len(message_violations),
+            'program_order_violations': len(program_violations),
+            'message_violations': len(message_violations),
+        },
+        'vector_clocks': None,
+        'latency_ms': delay_stats(latencies),
+        'queueing_delay_ms': delay_stats(queueing),
+    }
+    vector_violations = graph.check_vector_clocks()
+    if vector_violations is not None:
+        summary['vector_clocks'] = {
+            'holds': not len(vector_violations[0]) and not len(vector_violations[1]),
+            'program_order_violations': len(vector_violations[0]),
+            'message_violations': len(vector_violations[1]),
+            'concurrent_receipts': len(graph.concurrent_receipts()),
+        }
+    return graph, summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a run's logs against Lamport's clock condition")
+    parser.add_argument('log_folder', help="folder with the machine_N.log, .csv or .bin files")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.log_folder):
+        print(f"Error: Folder '{args.log_folder}' does not exist")
+        sys.exit(1)
+    if not find_machine_logs(args.log_folder):
+        print(f"Error: No machine logs in '{args.log_folder}'")
+        sys.exit(1)
+
+    graph, summary = analyze_causality(args.log_folder)
+    output_file = os.path.join(args.log_folder, "causality.json")
+    with open(output_file, 'w') as f:
+        json.dump(summary, f, indent=2)
+        f.write("\n")
+
+    condition = summary['clock_condition']
+    print(f"{summary['events']} events, {summary['messages_sent']} messages sent, " +
+          f"{summary['matched_receipts']} of {summary['expected_receipts']} receipts matched " +
+          f"({summary['unmatched_receipts']} receipts without a send)")
+    if condition['holds']:
+        print("Clock condition holds on every edge")
+    else:
+        print(f"Clock condition violated: {condition['program_order_violations']} program order edges, " +
+              f"{condition['message_violations']} message edges")
+    vectors = summary['vector_clocks']
+    if vectors:
+        print(("Vector clocks increase along every edge" if vectors['holds'] else
+               f"Vector clocks violated: {vectors['program_order_violations']} program order edges, " +
+               f"{vectors['message_violations']} message edges") +
+              f"; {vectors['concurrent_receipts']} receipts concurrent with the receiver's previous event")
+    for label, key in (("Latency", 'latency_ms'), ("Queueing delay", 'queueing_delay_ms')):
+        stats = summary[key]
+        if stats:
+            print(f"{label}: mean {stats['mean']:.3f} ms, p50 {stats['p50']:.3f} ms, " +
+                  f"p99 {stats['p99']:.3f} ms, max {stats['max']:.3f} ms")
+    if 'log' in summary['formats']:
+        print("Text logs have one-second timestamps; use log_format 'csv' or 'binary' for precise delays")
+    print(f"Summary written to {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import time
+import unittest
+from simulation import Simulation
+from event_log import (EventLog, EVENT_SEND, EVENT_BROADCAST, EVENT_DELIVER, EVENT_RECEIVE, EVENT_RECEIVE_BATCH,
+                       EVENT_INTERNAL)
+from happens_before import analyze_causality, find_machine_logs
+from harness import ScratchFolder
+
+# happens_before.py tests
+class TestHappensBefore(ScratchFolder, unittest.TestCase):
+    def write_log(self, machine_id, events, log_format='csv', vectors=None):
+        """Write (time, kind, peer, queue length, clock, message id[, text]) events, with optional vector clocks"""
+        extension = {'csv': 'csv', 'text': 'log', 'binary': 'bin'}[log_format]
+        now = [0.0]
+        log = EventLog(os.path.join(self.log_dir, f"machine_{machine_id}.{extension}"), log_format,
+                       clock=lambda: now[0], converter=time.gmtime, background=False)
+        for i, (timestamp, kind, peer, queue_length, clock, message_id, *text) in enumerate(events):
+            now[0] = timestamp
+            log.event(kind, peer, queue_length, clock, text[0] if text else None, message_id,
+                      vectors[i] if vectors else None)
+        log.close()
+
+    def write_exchange(self, log_format='csv', receive_clock=4, vectors=False):
+        """Machine 0 sends to 1 and broadcasts; machine 1 receives both"""
+        self.write_log(0, [
+            (100.0, EVENT_SEND, 1, None, 1, 0),
+            (100.5, EVENT_BROADCAST, None, None, 2, 1),
+            (101.0, EVENT_INTERNAL, None, None, 3, None),
+        ], log_format, [(1, 0), (2, 0), (3, 0)] if vectors else None)
+        self.write_log(1, [
+            (100.0, EVENT_INTERNAL, None, None, 1, None),
+            (100.01, EVENT_DELIVER, 0, None, 1, 0),
+            (100.2, EVENT_RECEIVE, 0, 0, 2, 0),
+            (100.51, EVENT_DELIVER, 0, None, 2, 1),
+            (100.8, EVENT_RECEIVE, 0, 0, receive_clock, 1),
+        ], log_format, [(0, 1), (1, 1), (1, 2), (1, 2), (2, 3)] if vectors else None)
+
+    def test_join_and_delays(self):
+        """Test that sends are joined to receipts and delays measured"""
+        self.write_exchange()
+        graph, summary = analyze_causality(self.log_dir)
+
+        self.assertEqual(summary['events'], 6)
+        self.assertEqual(summary['messages_sent'], 2)
+        self.assertEqual(summary['expected_receipts'], 2)
+        self.assertEqual(summary['matched_receipts'], 2)
+        self.assertEqual(summary['unmatched_receipts'], 0)
+        self.assertTrue(summary['clock_condition']['holds'])
+        self.assertAlmostEqual(summary['latency_ms']['max'], 10.0, places=3)
+        self.assertAlmostEqual(summary['queueing_delay_ms']['max'], 290.0, places=3)
+
+        # send 0 -> receipt on machine 1 -> its next event
+        self.assertTrue(graph.happens_before(graph.node(0, 0), graph.node(1, 2)))
+        self.assertTrue(graph.happens_before(graph.node(0, 1), graph.node(1, 2)))
+        self.assertFalse(graph.happens_before(graph.node(1, 2), graph.node(0, 1)))
+        # concurrent events
+        self.assertFalse(graph.happens_before(graph.node(0, 2), graph.node(1, 2)))
+        self.assertFalse(graph.happens_before(graph.node(1, 0), graph.node(0, 0)))
+
+    def test_violation(self):
+        """Test that a receipt not above its send's clock is reported"""
+        self.write_exchange(receive_clock=2)
+        graph, summary = analyze_causality(self.log_dir)
+        program, message = graph.check_clock_condition()
+        self.assertFalse(summary['clock_condition']['holds'])
+        self.assertEqual(program.tolist(), [[4, 5]])
+        self.assertEqual(message.tolist(), [[1, 5]])
+
+    def test_formats(self):
+        """Test that text and binary logs give the same graph as csv"""
+        for log_format in ('text', 'binary'):
+            for name in os.listdir(self.log_dir):
+                os.remove(os.path.join(self.log_dir, name))
+            self.write_exchange(log_format)
+            _, summary = analyze_causality(self.log_dir)
+            self.assertEqual(summary['matched_receipts'], 2)
+            self.assertTrue(summary['clock_condition']['holds'])
+
+    def test_batch_receipts(self):
+        """Test that a batch receipt is joined to each of its sends in every format"""
+        for log_format in ('csv', 'text', 'binary'):
+            for name in os.listdir(self.log_dir):
+                os.remove(os.path.join(self.log_dir, name))
+            self.write_log(0, [
+                (100.0, EVENT_SEND, 1, None, 1, 0),
+                (100.5, EVENT_SEND, 1, None, 2, 1),
+            ], log_format)
+            self.write_log(1, [
+                (100.0, EVENT_INTERNAL, None, None, 1, None),
+                (101.0, EVENT_RECEIVE_BATCH, 2, 0, 3, None, "0 (id 0), 0 (id 1)"),
+            ], log_format)
+            graph, summary = analyze_causality(self.log_dir)
+            self.assertEqual(summary['matched_receipts'], 2, log_format)
+            self.assertTrue(graph.happens_before(graph.node(0, 1), graph.node(1, 1)))
+
+    def test_vector_clocks(self):
+        """Test that logged vector clocks are checked and expose concurrency in every format"""
+        for log_format in ('csv', 'text', 'binary'):
+            for name in os.listdir(self.log_dir):
+                os.remove(os.path.join(self.log_dir, name))
+            self.write_exchange(log_format, vectors=True)
+            graph, summary = analyze_causality(self.log_dir)
+            self.assertEqual(summary['vector_clocks'], {
+                'holds': True, 'program_order_violations': 0, 'message_violations': 0,
+                # both sends are concurrent with machine 1's events before their receipts
+                'concurrent_receipts': 2,
+            })
+            self.assertTrue(graph.concurrent(graph.node(0, 2), graph.node(1, 2)))
+            self.assertFalse(graph.concurrent(graph.node(0, 0), graph.node(1, 2)))
+
+    def test_vector_violation(self):
+        """Test that a receipt whose vector does not cover its send's is reported"""
+        self.write_exchange(vectors=True)
+        self.write_log(1, [
+            (100.0, EVENT_INTERNAL, None, None, 1, None),
+            (100.2, EVENT_RECEIVE, 0, 0, 2, 0),
+        ], vectors=[(0, 1), (0, 2)])
+        graph, summary = analyze_causality(self.log_dir)
+        self.assertFalse(summary['vector_clocks']['holds'])
+        self.assertEqual(graph.check_vector_clocks()[1].tolist(), [[0, 4]])
+
+    def test_prefers_precise_logs(self):
+        """Test that a csv log is used over a text log of the same machine"""
+        self.write_exchange('csv')
+        self.write_exchange('text')
+        self.assertEqual([extension for _, extension, _ in find_machine_logs(self.log_dir)], ['csv', 'csv'])
+
+    def test_simulated_run(self):
+        """Test that a simulated run satisfies the clock condition"""
+        Simulation(4, seed=5, log_dir=self.log_dir).run(300)
+        graph, summary = analyze_causality(self.log_dir)
+        self.assertGreater(summary['matched_receipts'], 0)
+        self.assertEqual(summary['unmatched_receipts'], 0)
+        self.assertTrue(summary['clock_condition']['holds'])
+        self.assertLessEqual(summary['matched_receipts'], summary['expected_receipts'])
+        self.assertIsNone(summary['vector_clocks'])
+
+    def test_simulated_vector_run(self):
+        """Test that a simulated run in vector clock mode keeps consistent vector clocks"""
+        Simulation(5, seed=5, log_dir=self.log_dir, clock_mode='vector').run(300)
+        graph, summary = analyze_causality(self.log_dir)
+        self.assertEqual(summary['unmatched_receipts'], 0)
+        self.assertTrue(summary['clock_condition']['holds'])
+        self.assertTrue(summary['vector_clocks']['holds'])
+        self.assertGreater(summary['vector_clocks']['concurrent_receipts'], 0)
+        self.assertEqual(graph.vectors.shape, (len(graph), 5))
+
+if __name__ == '__main__':
+    unittest.main()
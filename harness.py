@@ -0,0 +1,123 @@
+import random
+import shutil
+import tempfile
+from virtual_machine import VirtualMachine
+from transport import InMemoryNetwork
+
+# Test harness that runs real VirtualMachines without sockets, threads or
+# sleeps: messages travel through an InMemoryNetwork, time is a
+# ManualClock, and the test decides which machine ticks and which message
+# arrives next. Every step checks the logical clock rules, so random
+# schedules can be fuzzed against them. The logs are stamped with the
+# same clock and written when the machines are closed, so a seed always
+# gives the same logs.
+
+class ScratchFolder:
+    """Test case mixin that gives every test an empty log_dir and removes it afterwards"""
+    def setUp(self):
+        super().setUp()
+        self.log_dir = tempfile.mkdtemp()
+        # cleanups run after tearDown, so machines are stopped before their logs go
+        self.addCleanup(shutil.rmtree, self.log_dir)
+
+class ManualClock:
+    """A clock that only moves when slept on or advanced"""
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    advance = sleep
+
+class Cluster:
+    """Virtual machines on an in-memory network in fake time, driven one step at a time.
+
+    Violations of the clock rules are collected in violations as strings
+    rather than raised, so a fuzzer can report the schedule that caused
+    them. options are passed on to every VirtualMachine, except a queue
+    limit with blocking backpressure, which needs a second thread.
+    """
+    def __init__(self, num_machines=3, seed=0, log_dir='.', **options):
+        if options.get('queue_limit') and options.get('backpressure', 'block') == 'block':
+            raise ValueError("A blocking queue would block the only thread; use drop or coalesce")
+        self.clock = ManualClock()
+        self.network = InMemoryNetwork()
+        self.violations = []
+        rng = random.Random(seed)
+        self.machines = [
+            VirtualMachine(i, num_machines, 'memory', 0, rng=random.Random(rng.getrandbits(64)), log_dir=log_dir,
+                           transport=self.network.connect, clock=self.clock, sleep=self.clock.sleep,
+                           log_clock=self.clock, log_background=False, **options)
+            for i in range(num_machines)
+        ]
+        for machine in self.machines:
+            machine.running = True
+            machine.transport.start()
+        # the last clock seen on each channel, which must keep increasing
+        self.channel_clocks = {}
+
+    def step(self, machine_id):
+        """Run one clock cycle of a machine at its next deadline, and check it"""
+        machine = self.machines[machine_id]
+        before = machine.logical_clock
+        vector_before = list(machine.vector_clock) if machine.vector_clock is not None else None
+        queued = list(machine.message_queue.queue)
+
+        machine.scheduler.wait()
+        machine.step()
+
+        taken = queued[:len(queued) - machine.message_queue.qsize()]
+        after = machine.logical_clock
+        if after <= before:
+            self._violation(f"Machine {machine_id}: clock went from {before} to {after} in one tick")
+        for message in taken:
+            if after <= message.logical_clock:
+                self._violation(f"Machine {machine_id}: clock {after} after receiving "
+                                f"clock {message.logical_clock} from Machine {message.sender_id}")
+        if vector_before is not None:
+            vector = machine.vector_clock
+            if vector[machine_id] != vector_before[machine_id] + 1:
+                self._violation(f"Machine {machine_id}: own vector entry went from "
+                                f"{vector_before[machine_id]} to {vector[machine_id]}")
+            if any(now < then for now, then in zip(vector, vector_before)):
+                self._violation(f"Machine {machine_id}: vector clock went back from {vector_before} to {vector}")
+            for message in taken:
+                if any(now < sent for now, sent in zip(vector, message.vector_clock)):
+                    self._violation(f"Machine {machine_id}: vector clock {vector} behind received "
+                                    f"{list(message.vector_clock)} from Machine {message.sender_id}")
+
+    def deliver(self, sender_id, receiver_id):
+        """Deliver the oldest message in flight from one machine to another, and check it"""
+        sender = self.machines[sender_id]
+        for message in self.network.deliver(sender_id, receiver_id):
+            last = self.channel_clocks.get((sender_id, receiver_id), 0)
+            if not last < message.logical_clock <= sender.logical_clock:
+                self._violation(f"Message from Machine {sender_id} to {receiver_id}: clock "
+                                f"{message.logical_clock} after {last}, sender at {sender.logical_clock}")
+            self.channel_clocks[(sender_id, receiver_id)] = message.logical_clock
+
+    def run_random(self, steps, rng, deliver_probability=0.5):
+        """Interleave steps and deliveries at random; returns the schedule that was run"""
+        schedule = []
+        for _ in range(steps):
+            pending = self.network.pending()
+            if pending and rng.random() < deliver_probability:
+                action = ('deliver',) + rng.choice(pending)
+                self.deliver(*action[1:])
+            else:
+                action = ('step', rng.randrange(len(self.machines)))
+                self.step(action[1])
+            schedule.append(action)
+        return schedule
+
+    def close(self):
+        """Stop every machine and write out its log"""
+        for machine in self.machines:
+            machine.stop()
+
+    def _violation(self, text):
+        self.violations.append(text)
@@ -0,0 +1,128 @@
+import io
+import os
+import random
+import unittest
+import contextlib
+from message import Message
+from harness import Cluster, ManualClock, ScratchFolder
+
+# Random schedules fuzzed against the clock rules; each one gets its own
+# seed, so a failure names the seed that reproduces it
+FUZZ_SCHEDULES = 1000
+FUZZ_STEPS = 100
+
+# harness.py tests
+class TestCluster(ScratchFolder, unittest.TestCase):
+    def setUp(self):
+        """Silence the machines' output"""
+        super().setUp()
+        # every machine prints a line when it is created
+        self.quiet = contextlib.redirect_stdout(io.StringIO())
+        self.quiet.__enter__()
+
+    def tearDown(self):
+        """Restore the output"""
+        self.quiet.__exit__(None, None, None)
+
+    def cluster(self, num_machines=3, seed=0, **options):
+        cluster = Cluster(num_machines, seed, self.log_dir, **options)
+        self.addCleanup(cluster.close)
+        return cluster
+
+    def test_manual_clock(self):
+        """Test that each step runs at the machine's next deadline in fake time"""
+        cluster = self.cluster(1)
+        machine = cluster.machines[0]
+        for _ in range(4):
+            cluster.step(0)
+
+        self.assertAlmostEqual(cluster.clock(), 3 * machine.cycle_time)
+        self.assertEqual(machine.scheduler.stats['ticks'], 4)
+        self.assertEqual(machine.logical_clock, 4)
+
+    def test_reproducible(self):
+        """Test that a seed always gives the same schedule and the same clocks"""
+        runs = []
+        for _ in range(2):
+            cluster = self.cluster(4, seed=7)
+            schedule = cluster.run_random(200, random.Random(3))
+            runs.append((schedule, [machine.logical_clock for machine in cluster.machines]))
+        self.assertEqual(runs[0], runs[1])
+
+    def test_reproducible_logs(self):
+        """Test that a seed always gives the same logs and event stores, timestamps included"""
+        logs = []
+        for run in range(2):
+            log_dir = os.path.join(self.log_dir, str(run))
+            os.mkdir(log_dir)
+            cluster = Cluster(3, 7, log_dir, log_format='csv', event_store=True)
+            cluster.run_random(200, random.Random(3))
+            cluster.close()
+            files = {}
+            for name in sorted(os.listdir(log_dir)):
+                with open(os.path.join(log_dir, name), 'rb') as f:
+                    files[name] = f.read()
+            logs.append(files)
+        self.assertIn('machine_0.evt', logs[0])
+        self.assertEqual(logs[0], logs[1])
+        with open(os.path.join(self.log_dir, "0", "machine_0.csv")) as f:
+            self.assertEqual(f.read().splitlines()[1].split(',')[0], "0.000000")
+
+    def test_channel_order(self):
+        """Test that each channel delivers in the order sent, whatever the order across channels"""
+        cluster = self.cluster(3)
+        first, second, receiver = cluster.machines
+        for clock in (1, 2):
+            first._send_message(receiver.port, Message(0, clock))
+            second._send_message(receiver.port, Message(1, clock + 10))
+        cluster.deliver(1, 2)
+        cluster.deliver(0, 2)
+        cluster.deliver(0, 2)
+        cluster.deliver(1, 2)
+
+        self.assertEqual([message.logical_clock for message in receiver.message_queue.queue], [11, 1, 2, 12])
+
+    def test_fuzz_lamport(self):
+        """Test the clock rules over many random schedules and settings"""
+        for seed in range(FUZZ_SCHEDULES):
+            rng = random.Random(seed)
+            cluster = Cluster(
+                rng.randint(2, 6), seed, self.log_dir,
+                clock_mode=rng.choice(('lamport', 'vector')),
+                drain_limit=rng.choice((1, 2, None)),
+                queue_limit=rng.choice((None, 3)), backpressure=rng.choice(('drop', 'coalesce')),
+                internal_event_probability=rng.random(),
+            )
+            cluster.run_random(FUZZ_STEPS, rng, deliver_probability=rng.random())
+            cluster.close()
+            self.assertEqual(cluster.violations, [], f"seed {seed}")
+
+    def test_fuzz_finds_violation(self):
+        """Test that a machine that ignores received clocks is caught"""
+        cluster = self.cluster(3)
+        machine = cluster.machines[2]
+
+        def broken_tick():
+            machine._take_messages()
+            machine.logical_clock += 1
+        machine._tick = broken_tick
+
+        cluster.run_random(300, random.Random(1))
+        self.assertTrue(any("after receiving" in violation for violation in cluster.violations))
+
+    def test_blocking_queue(self):
+        """Test that a blocking bounded queue, which needs a second thread, is refused"""
+        with self.assertRaises(ValueError):
+            Cluster(3, log_dir=self.log_dir, queue_limit=2)
+
+class TestManualClock(unittest.TestCase):
+    def test_sleep(self):
+        """Test that only sleeping moves the clock, and never backwards"""
+        clock = ManualClock(5.0)
+        clock.sleep(0.5)
+        clock.sleep(-1.0)
+        clock.advance(1.5)
+        self.assertEqual(clock(), 7.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+from collections import deque
+from analyze_logs import LOG_LINE, LOG_FILE_NAME, find_log_files, parse_timestamp
+
+class LogTail:
+    """Reads the lines appended to a log file since the last read.
+
+    Keeps the file open at its current offset. When the file is replaced
+    (rotated) or truncated, the rest of the old file is read first and
+    then the new file is read from the start.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+        self.remainder = ''
+        self.rotations = 0
+
+    def _open(self):
+        try:
+            self.file = open(self.filename, 'r')
+        except FileNotFoundError:
+            self.file = None
+
+    def read(self):
+        """Return the complete lines added since the last call as one string"""
+        if self.file is None:
+            self._open()
+            if self.file is None:
+                return ''
+        data = self.file.read()
+
+        # a different file at the path, or a shorter one, means a new log
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and (stat.st_ino != os.fstat(self.file.fileno()).st_ino or
+                                 stat.st_size < self.file.tell()):
+            self.file.close()
+            self.rotations += 1
+            # a partial last line of the old file is still a line
+            if self.remainder or (data and not data.endswith('\n')):
+                data += '\n'
+            self._open()
+            if self.file is not None:
+                data += self.file.read()
+
+        data = self.remainder + data
+        cut = data.rfind('\n') + 1
+        self.remainder = data[cut:]
+        return data[:cut]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class RollingWindow:
+    """Per-second statistics for the last window seconds of one machine's log.
+
+    Each second is one bucket of running totals, and only window buckets
+    are kept, so memory stays constant however long the log grows.
+    """
+    # bucket fields
+    SECOND, EVENTS, JUMP_SUM, JUMPS, JUMP_MAX, QUEUE_SUM, QUEUES, QUEUE_MAX = range(8)
+
+    def __init__(self, window=30):
+        self.window = window
+        self.buckets = deque(maxlen=window)
+        self.tick_rate = None
+        self.clock = None
+        self.queue_length = None
+        self.first_second = None
+
+    def _bucket(self, second):
+        if not self.buckets or second > self.buckets[-1][self.SECOND]:
+            self.buckets.append([second, 0, 0, 0, 0, 0, 0, 0])
+            if self.first_second is None:
+                self.first_second = second
+        # a line stamped earlier than the newest second counts towards it
+        return self.buckets[-1]
+
+    def add_rows(self, rows, timestamps):
+        """Fold in rows matched by LOG_LINE"""
+        for timestamp_str, tick_rate, _, queue_str, clock_str in rows:
+            if tick_rate:
+                self.tick_rate = int(tick_rate)
+                continue
+            second = timestamps.get(timestamp_str)
+            if second is None:
+                second = timestamps[timestamp_str] = int(parse_timestamp(timestamp_str))
+            bucket = self._bucket(second)
+            bucket[self.EVENTS] += 1
+
+            clock = int(clock_str)
+            if self.clock is not None and clock > self.clock:
+                jump = clock - self.clock
+                bucket[self.JUMP_SUM] += jump
+                bucket[self.JUMPS] += 1
+                bucket[self.JUMP_MAX] = max(bucket[self.JUMP_MAX], jump)
+            self.clock = clock
+
+            if queue_str:
+                queue_length = self.queue_length = int(queue_str)
+                bucket[self.QUEUE_SUM] += queue_length
+                bucket[self.QUEUES] += 1
+                bucket[self.QUEUE_MAX] = max(bucket[self.QUEUE_MAX], queue_length)
+
+    def stats(self):
+        """Rolling statistics over the buckets in the window"""
+        buckets = self.buckets
+        if not buckets:
+            return None
+        newest = buckets[-1][self.SECOND]
+        buckets = [bucket for bucket in buckets if bucket[self.SECOND] > newest - self.window]
+        span = min(self.window, newest - self.first_second + 1)
+        jumps = sum(bucket[self.JUMPS] for bucket in buckets)
+        queues = sum(bucket[self.QUEUES] for bucket in buckets)
+        return {
+            'events_per_second': sum(bucket[self.EVENTS] for bucket in buckets) / span,
+            'jump_mean': sum(bucket[self.JUMP_SUM] for bucket in buckets) / jumps if jumps else None,
+            'jump_max': max(bucket[self.JUMP_MAX] for bucket in buckets),
+            'queue_mean': sum(bucket[self.QUEUE_SUM] for bucket in buckets) / queues if queues else None,
+            'queue_max': max(bucket[self.QUEUE_MAX] for bucket in buckets),
+        }
+
+class LiveAnalysis:
+    """Follows every machine log in a run folder as it is written"""
+    def __init__(self, log_folder, window=30):
+        self.log_folder = log_folder
+        self.window = window
+        self.tails = {}
+        self.windows = {}
+        # seconds since the epoch for each distinct timestamp string, kept
+        # for the current window only
+        self.timestamps = {}
+
+    def poll(self):
+        """Read and fold in everything appended to the logs since the last poll"""
+        # machines may start logging after the analysis does
+        log_files = find_log_files(self.log_folder)
+        if any(log_file not in self.tails for log_file in log_files):
+            for log_file in log_files:
+                if log_file not in self.tails:
+                    self.tails[log_file] = LogTail(log_file)
+                    self.windows[log_file] = RollingWindow(self.window)
+            # keep the summary in machine order
+            self.windows = {log_file: self.windows[log_file] for log_file in log_files}
+        if len(self.timestamps) > 4 * self.window * max(1, len(self.tails)):
+            self.timestamps.clear()
+
+        for log_file, tail in self.tails.items():
+            data = tail.read()
+            if data:
+                self.windows[log_file].add_rows(LOG_LINE.findall(data), self.timestamps)
+
+    def summary(self):
+        """Text summary of the rolling statistics of every machine"""
+        def fmt(value, digits=2):
+            return "-" if value is None else f"{value:.{digits}f}"
+
+        lines = [f"{time.strftime('%H:%M:%S')} - last {self.window} seconds of {self.log_folder}"]
+        clocks = []
+        for log_file, window in self.windows.items():
+            machine_id = LOG_FILE_NAME.search(log_file).group(1)
+            stats = window.stats()
+            if stats is None:
+                lines.append(f"Machine {machine_id}: no events yet")
+                continue
+            clocks.append(window.clock)
+            lines.append(
+                f"Machine {machine_id} ({window.tick_rate} ticks/s): " +
+                f"clock {window.clock}, " +
+                f"events/s {fmt(stats['events_per_second'])}, " +
+                f"jump mean {fmt(stats['jump_mean'])} max {stats['jump_max']}, " +
+                f"queue mean {fmt(stats['queue_mean'])} max {stats['queue_max']} " +
+                f"now {'-' if window.queue_length is None else window.queue_length}"
+            )
+        if len(clocks) > 1:
+            lines.append(f"Clock drift: {max(clocks) - min(clocks)}")
+        return "\n".join(lines)
+
+    def close(self):
+        for tail in self.tails.values():
+            tail.close()
+
+def follow(log_folder, interval=2.0, window=30):
+    """Print a refreshed summary of a run folder every interval seconds until interrupted"""
+    analysis = LiveAnalysis(log_folder, window)
+    # redraw in place on a terminal, append otherwise
+    clear = "\033[H\033[J" if sys.stdout.isatty() else ""
+    try:
+        while True:
+            analysis.poll()
+            print(clear + analysis.summary() + "\n", flush=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        analysis.close()
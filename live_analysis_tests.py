@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+from analyze_logs import LOG_LINE
+from live_analysis import LogTail, RollingWindow, LiveAnalysis
+from harness import ScratchFolder
+
+def log_line(second, text):
+    return f"2025-01-01 00:{second // 60:02d}:{second % 60:02d} - {text}\n"
+
+# live_analysis.py tests
+class TestLogTail(ScratchFolder, unittest.TestCase):
+    def setUp(self):
+        """Name the log file in the scratch folder"""
+        super().setUp()
+        self.log_file = os.path.join(self.log_dir, "machine_0.log")
+
+    def append(self, text, filename=None):
+        with open(filename or self.log_file, 'a') as f:
+            f.write(text)
+
+    def test_incremental(self):
+        """Test that only new complete lines are returned"""
+        tail = LogTail(self.log_file)
+        self.assertEqual(tail.read(), '')
+        self.append("one\ntw")
+        self.assertEqual(tail.read(), "one\n")
+        self.assertEqual(tail.read(), '')
+        self.append("o\nthree\n")
+        self.assertEqual(tail.read(), "two\nthree\n")
+        tail.close()
+
+    def test_rotation(self):
+        """Test that a rotated log is finished before the new one is read"""
+        tail = LogTail(self.log_file)
+        self.append("one\n")
+        self.assertEqual(tail.read(), "one\n")
+        self.append("two\n")
+        os.rename(self.log_file, self.log_file + ".1")
+        self.append("three\n")
+        self.assertEqual(tail.read(), "two\nthree\n")
+        self.assertEqual(tail.rotations, 1)
+        self.append("four\n")
+        self.assertEqual(tail.read(), "four\n")
+        tail.close()
+
+    def test_truncation(self):
+        """Test that a truncated log is read again from the start"""
+        tail = LogTail(self.log_file)
+        self.append("one\ntwo\n")
+        tail.read()
+        with open(self.log_file, 'w') as f:
+            f.write("new\n")
+        self.assertEqual(tail.read(), "new\n")
+        tail.close()
+
+class TestRollingWindow(unittest.TestCase):
+    def add(self, window, text):
+        window.add_rows(LOG_LINE.findall(text), {})
+
+    def test_stats(self):
+        """Test jump, queue and rate statistics within the window"""
+        window = RollingWindow(10)
+        self.add(window,
+            log_line(0, "Machine initialized with clock rate: 2 ticks/second") +
+            log_line(0, "Internal event, Logical clock: 1") +
+            log_line(0, "Received message from Machine 1, Queue length: 3, Logical clock: 5") +
+            log_line(1, "Received message from Machine 1, Queue length: 1, Logical clock: 6"))
+        stats = window.stats()
+        self.assertEqual(window.tick_rate, 2)
+        self.assertEqual(window.clock, 6)
+        self.assertEqual(window.queue_length, 1)
+        self.assertEqual(stats['events_per_second'], 1.5)
+        self.assertEqual(stats['jump_mean'], 2.5)
+        self.assertEqual(stats['jump_max'], 4)
+        self.assertEqual(stats['queue_mean'], 2.0)
+        self.assertEqual(stats['queue_max'], 3)
+
+    def test_window(self):
+        """Test that old seconds leave the window and memory stays bounded"""
+        window = RollingWindow(5)
+        self.add(window, log_line(0, "Received message from Machine 1, Queue length: 50, Logical clock: 100"))
+        self.add(window, "".join(log_line(second, f"Internal event, Logical clock: {100 + second}")
+                                 for second in range(1, 100)))
+        stats = window.stats()
+        self.assertEqual(len(window.buckets), 5)
+        self.assertEqual(stats['events_per_second'], 1.0)
+        self.assertEqual(stats['jump_max'], 1)
+        self.assertIsNone(stats['queue_mean'])
+
+class TestLiveAnalysis(unittest.TestCase):
+    def test_poll(self):
+        """Test that logs appearing and growing are followed"""
+        log_dir = tempfile.mkdtemp()
+        try:
+            analysis = LiveAnalysis(log_dir, window=10)
+            analysis.poll()
+            for machine_id, clock in ((1, 9), (0, 4)):
+                with open(os.path.join(log_dir, f"machine_{machine_id}.log"), 'w') as f:
+                    f.write(log_line(0, "Machine initialized with clock rate: 1 ticks/second"))
+                    f.write(log_line(1, f"Internal event, Logical clock: {clock}"))
+            analysis.poll()
+            lines = analysis.summary().splitlines()
+            self.assertTrue(lines[1].startswith("Machine 0 (1 ticks/s): clock 4"))
+            self.assertTrue(lines[2].startswith("Machine 1 (1 ticks/s): clock 9"))
+            self.assertEqual(lines[3], "Clock drift: 5")
+            analysis.close()
+        finally:
+            shutil.rmtree(log_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,38 +1,62 @@
 import time
 import json
+import queue
+import random
+import signal
 import multiprocessing
 from virtual_machine import VirtualMachine
 
-def start_virtual_machine(machine_id, num_machines, host, port_base):
-    vm = VirtualMachine(machine_id, num_machines, host, port_base)
-    vm.start()
+# Optional VirtualMachine settings that are passed through from config.json
+VM_OPTIONS = ('wire_format', 'transport', 'tick_policy', 'drain_limit', 'queue_limit', 'backpressure',
+              'log_format', 'startup_timeout', 'clock_mode', 'clock_rate_range', 'internal_event_probability',
+              'metrics', 'metrics_port', 'event_store', 'send_dispatch', 'send_queue_limit', 'send_timeout')
 
-def main():
-    # Number of virtual machines to create
-    num_machines = 3
-    
-    # Create and start the virtual machines
+def start_virtual_machine(machine_id, num_machines, host, port_base, options, ready_queue, seed=None, log_dir='.'):
+    rng = random.Random(seed) if seed is not None else None
+    vm = VirtualMachine(machine_id, num_machines, host, port_base, rng=rng, log_dir=log_dir, **options)
+    # stop cleanly on terminate so the machine can log its connection stats
+    signal.signal(signal.SIGTERM, lambda signum, frame: vm.stop())
+    vm.start(on_ready=lambda startup_time: ready_queue.put((machine_id, startup_time)))
+
+def run_machines(num_machines, host, port_base, options, duration=60, seed=None, log_dir='.'):
+    """Run num_machines machine processes for duration seconds.
+
+    Machines use the ports from port_base to port_base + num_machines - 1
+    and write their logs to log_dir. A seed makes every machine's random
+    choices reproducible, though message timing still is not.
+    """
     processes = []
 
-    # parse config.json
-    with open('config.json', 'r') as f:
-        config = json.load(f)
-    host = config['host']
-    port_base = config['port_base']
+    # Machines report here once they have passed the startup barrier
+    ready_queue = multiprocessing.Queue()
 
+    rng = random.Random(seed)
     for i in range(num_machines):
-        process = multiprocessing.Process(target=start_virtual_machine, args=(i, num_machines, host, port_base))
+        machine_seed = rng.getrandbits(64) if seed is not None else None
+        process = multiprocessing.Process(target=start_virtual_machine, args=(
+            i, num_machines, host, port_base, options, ready_queue, machine_seed, log_dir))
         processes.append(process)
     
     # Start all machine processes
+    launch_time = time.monotonic()
     for process in processes:
         process.start()
     
     try:
+        # Wait for every machine to start ticking
+        ready_timeout = options.get('startup_timeout', 10.0) + 5
+        for _ in range(num_machines):
+            try:
+                machine_id, startup_time = ready_queue.get(timeout=ready_timeout)
+            except queue.Empty:
+                print("Not every machine reported ready; continuing anyway")
+                break
+            print(f"Machine {machine_id} ready: startup barrier took {startup_time * 1000:.1f} ms")
+        print(f"All machines ready {(time.monotonic() - launch_time) * 1000:.1f} ms after launch")
+        
         # Let the simulation run for a specified time
-        simulation_time = 60  # seconds
-        print(f"Simulation running for {simulation_time} seconds...")
-        time.sleep(simulation_time)
+        print(f"Simulation running for {duration} seconds...")
+        time.sleep(duration)
     except KeyboardInterrupt:
         print("Simulation interrupted by user")
     finally:
@@ -46,5 +70,17 @@ def main():
         
         print("Simulation completed")
 
+def main():
+    # parse config.json
+    with open('config.json', 'r') as f:
+        config = json.load(f)
+    # Number of virtual machines to create
+    num_machines = config.get('num_machines', 3)
+    host = config['host']
+    port_base = config['port_base']
+    options = {key: config[key] for key in VM_OPTIONS if key in config}
+
+    run_machines(num_machines, host, port_base, options, config.get('duration', 60), config.get('seed'))
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,22 +1,209 @@
 import json
+import struct
 import time
 
+# Each frame on the wire is a 4-byte big-endian payload length followed by
+# the payload itself, so messages can be streamed over one connection
+FRAME_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 1 << 20
+
+# Fixed binary layout of one message: sender_id (int32), logical_clock (int64),
+# timestamp (float64) and message_id (int64), big-endian, 28 bytes in total
+MESSAGE_STRUCT = struct.Struct('!iqdq')
+
+# Every encoded batch starts with one byte naming its wire format, so a
+# receiver can decode either; JSON is kept around for debugging
+WIRE_FORMATS = {'binary': 0, 'json': 1}
+
+# Tag of the control frame a machine sends each peer once it is listening,
+# carrying the sender's machine id
+READY_TAG = 2
+READY_STRUCT = struct.Struct('!Bi')
+
+# Binary batches of messages carrying vector clock deltas use their own tag.
+# Each message is the fixed struct, an entry count (uint16) and that many
+# (machine index uint16, clock int64) entries
+VECTOR_TAG = 3
+DELTA_COUNT = struct.Struct('!H')
+DELTA_ENTRY = struct.Struct('!Hq')
+
+def encode_ready(machine_id):
+    """Build the readiness announcement sent to peers at startup"""
+    return READY_STRUCT.pack(READY_TAG, machine_id)
+
+def decode_ready(data):
+    """Return the machine id of a readiness announcement, or None for other frames"""
+    if len(data) != READY_STRUCT.size or data[0] != READY_TAG:
+        return None
+    return READY_STRUCT.unpack(data)[1]
+
+def encode_frame(payload):
+    """Prefix a payload with its length so it can be split back out of a stream"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {len(payload)} bytes exceeds maximum of {MAX_FRAME_SIZE}")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+class FrameReader:
+    """Buffers stream data and yields every complete frame it contains"""
+    def __init__(self):
+        self.buffer = bytearray()
+    
+    def feed(self, data):
+        """Add received bytes and return the payloads of all complete frames"""
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError(f"Frame of {length} bytes exceeds maximum of {MAX_FRAME_SIZE}")
+            end = offset + FRAME_HEADER.size + length
+            if end > len(self.buffer):
+                break
+            frames.append(bytes(self.buffer[offset + FRAME_HEADER.size:end]))
+            offset = end
+        # drop consumed bytes, keeping any partial frame for the next read
+        del self.buffer[:offset]
+        return frames
+
 class Message:
-    def __init__(self, sender_id, logical_clock):
+    """A timestamped message between machines.
+
+    message_id numbers the messages a sender creates, so sender_id and
+    message_id together identify a message across the logs of a run.
+
+    In vector clock mode vector_delta holds the (machine index, clock)
+    entries of the sender's vector clock that changed since its last
+    message to the same peer; the receiver rebuilds the full vector into
+    vector_clock, which is never sent. The sender keeps it there too, so a
+    transport that may have lost earlier messages can send the whole
+    vector instead. delivered_at, the receiver's performance counter when
+    the message reached its queue, is never sent either, nor is coalesced,
+    the messages a full receiver queue merged into this one.
+    """
+    __slots__ = ('sender_id', 'logical_clock', 'timestamp', 'message_id', 'vector_delta', 'vector_clock',
+                 'delivered_at', 'coalesced')
+    
+    def __init__(self, sender_id, logical_clock, message_id=0, vector_delta=None):
         self.sender_id = sender_id
         self.logical_clock = logical_clock
         self.timestamp = time.time()
+        self.message_id = message_id
+        self.vector_delta = vector_delta
+        self.vector_clock = None
+        self.delivered_at = None
+        self.coalesced = None
     
-    def to_json(self):
-        return json.dumps({
+    def send_full_vector(self):
+        """Replace the vector delta with every entry, which the receiver can apply whatever it missed"""
+        if self.vector_delta is not None:
+            self.vector_delta = list(enumerate(self.vector_clock))
+    
+    def to_dict(self):
+        data = {
             'sender_id': self.sender_id,
             'logical_clock': self.logical_clock,
-            'timestamp': self.timestamp
-        })
+            'timestamp': self.timestamp,
+            'message_id': self.message_id
+        }
+        if self.vector_delta is not None:
+            data['vector_delta'] = [list(entry) for entry in self.vector_delta]
+        return data
+    
+    def to_json(self):
+        return json.dumps(self.to_dict())
+    
+    def to_bytes(self):
+        return MESSAGE_STRUCT.pack(self.sender_id, self.logical_clock, self.timestamp, self.message_id)
+    
+    def to_frame(self, wire_format='binary'):
+        return encode_frame(encode_batch([self], wire_format))
     
     @classmethod
-    def from_json(cls, json_str):
-        data = json.loads(json_str)
-        msg = cls(data['sender_id'], data['logical_clock'])
+    def from_dict(cls, data):
+        vector_delta = data.get('vector_delta')
+        if vector_delta is not None:
+            vector_delta = [tuple(entry) for entry in vector_delta]
+        msg = cls(data['sender_id'], data['logical_clock'], data.get('message_id', 0), vector_delta)
         msg.timestamp = data['timestamp']
-        return msg 
\ No newline at end of file
+        return msg
+    
+    @classmethod
+    def from_json(cls, json_str):
+        return cls.from_dict(json.loads(json_str))
+    
+    @classmethod
+    def from_fields(cls, sender_id, logical_clock, timestamp, message_id=0):
+        """Build a message from decoded fields without reading the clock"""
+        msg = cls.__new__(cls)
+        msg.sender_id = sender_id
+        msg.logical_clock = logical_clock
+        msg.timestamp = timestamp
+        msg.message_id = message_id
+        msg.vector_delta = None
+        msg.vector_clock = None
+        msg.delivered_at = None
+        msg.coalesced = None
+        return msg
+    
+    @classmethod
+    def from_bytes(cls, data):
+        return cls.from_fields(*MESSAGE_STRUCT.unpack(data))
+
+def encode_batch(messages, wire_format='binary'):
+    """Encode a list of messages into a single buffer"""
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError(f"Unknown wire format: {wire_format}")
+    if wire_format == 'json':
+        body = json.dumps([message.to_dict() for message in messages]).encode()
+        return bytes([WIRE_FORMATS['json']]) + body
+    
+    pack = MESSAGE_STRUCT.pack
+    if any(m.vector_delta is not None for m in messages):
+        records = [bytes([VECTOR_TAG])]
+        for m in messages:
+            delta = m.vector_delta or ()
+            records.append(pack(m.sender_id, m.logical_clock, m.timestamp, m.message_id))
+            records.append(DELTA_COUNT.pack(len(delta)))
+            records.extend(DELTA_ENTRY.pack(index, clock) for index, clock in delta)
+        return b''.join(records)
+    
+    records = [pack(m.sender_id, m.logical_clock, m.timestamp, m.message_id) for m in messages]
+    records.insert(0, bytes([WIRE_FORMATS['binary']]))
+    return b''.join(records)
+
+def _decode_vector_batch(body):
+    """Decode the messages of a binary batch carrying vector clock deltas"""
+    messages = []
+    offset = 0
+    try:
+        while offset < len(body):
+            message = Message.from_fields(*MESSAGE_STRUCT.unpack_from(body, offset))
+            offset += MESSAGE_STRUCT.size
+            (count,) = DELTA_COUNT.unpack_from(body, offset)
+            offset += DELTA_COUNT.size
+            message.vector_delta = [DELTA_ENTRY.unpack_from(body, offset + i * DELTA_ENTRY.size) for i in range(count)]
+            offset += count * DELTA_ENTRY.size
+            messages.append(message)
+    except struct.error:
+        raise ValueError(f"Vector batch of {len(body)} bytes is truncated")
+    if offset != len(body):
+        raise ValueError(f"Vector batch of {len(body)} bytes is truncated")
+    return messages
+
+def decode_batch(data):
+    """Decode a buffer produced by encode_batch back into a list of messages"""
+    if not data:
+        raise ValueError("Empty message batch")
+    if data[0] == WIRE_FORMATS['json']:
+        return [Message.from_dict(item) for item in json.loads(data[1:])]
+    if data[0] == VECTOR_TAG:
+        return _decode_vector_batch(memoryview(data)[1:])
+    if data[0] != WIRE_FORMATS['binary']:
+        raise ValueError(f"Unknown wire format tag: {data[0]}")
+    
+    body = memoryview(data)[1:]
+    if len(body) % MESSAGE_STRUCT.size:
+        raise ValueError(f"Binary batch of {len(body)} bytes is not a whole number of messages")
+    from_fields = Message.from_fields
+    return [from_fields(*fields) for fields in MESSAGE_STRUCT.iter_unpack(body)]
@@ -0,0 +1,42 @@
+import timeit
+from message import Message, encode_batch, decode_batch
+
+# Micro-benchmark comparing the JSON and binary message encodings.
+# Run with: python message_benchmark.py
+
+NUM_MESSAGES = 10000
+BATCH_SIZE = 100
+
+def bench(label, func, count):
+    """Time func over several repeats and report the best ops/second"""
+    best = min(timeit.repeat(func, number=1, repeat=5))
+    print(f"{label:<32} {count / best:>14,.0f} msgs/s")
+    return best
+
+def main():
+    messages = [Message(i % 3, i) for i in range(NUM_MESSAGES)]
+    batches = [messages[i:i + BATCH_SIZE] for i in range(0, NUM_MESSAGES, BATCH_SIZE)]
+
+    json_payloads = [m.to_json().encode() for m in messages]
+    binary_payloads = [m.to_bytes() for m in messages]
+    binary_batches = [encode_batch(batch) for batch in batches]
+
+    print(f"Bytes per message: json {len(json_payloads[0])}, binary {len(binary_payloads[0])}, "
+          f"binary batched {len(binary_batches[0]) / BATCH_SIZE:.1f}")
+    print()
+
+    json_enc = bench("json encode", lambda: [m.to_json().encode() for m in messages], NUM_MESSAGES)
+    bin_enc = bench("binary encode", lambda: [m.to_bytes() for m in messages], NUM_MESSAGES)
+    batch_enc = bench(f"binary batch encode ({BATCH_SIZE})", lambda: [encode_batch(b) for b in batches], NUM_MESSAGES)
+    print()
+
+    json_dec = bench("json decode", lambda: [Message.from_json(p.decode()) for p in json_payloads], NUM_MESSAGES)
+    bin_dec = bench("binary decode", lambda: [Message.from_bytes(p) for p in binary_payloads], NUM_MESSAGES)
+    batch_dec = bench(f"binary batch decode ({BATCH_SIZE})", lambda: [decode_batch(b) for b in binary_batches], NUM_MESSAGES)
+    print()
+
+    print(f"Speedup encode: binary {json_enc / bin_enc:.1f}x, batched {json_enc / batch_enc:.1f}x")
+    print(f"Speedup decode: binary {json_dec / bin_dec:.1f}x, batched {json_dec / batch_dec:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import unittest
 import json
-from message import Message
+from message import (Message, FrameReader, encode_frame, encode_batch, decode_batch,
+                     FRAME_HEADER, MAX_FRAME_SIZE, MESSAGE_STRUCT, DELTA_COUNT, DELTA_ENTRY)
 
 # message.py tests
 class TestMessage(unittest.TestCase):
@@ -34,6 +35,94 @@ class TestMessage(unittest.TestCase):
         with self.assertRaises(KeyError):
             _ = Message.from_json(faulty_json_str)
 
+    def test_binary_message(self):
+        # Round trip through the fixed-size binary encoding
+        message = Message(1, 2, 42)
+        data = message.to_bytes()
+        new_message = Message.from_bytes(data)
+
+        self.assertEqual(len(data), MESSAGE_STRUCT.size)
+        self.assertEqual(new_message.sender_id, 1)
+        self.assertEqual(new_message.logical_clock, 2)
+        self.assertEqual(new_message.timestamp, message.timestamp)
+        self.assertEqual(new_message.message_id, 42)
+
+    def test_slots(self):
+        # messages carry no per-instance dict
+        with self.assertRaises(AttributeError):
+            Message(1, 2).extra = True
+
+# batch codec tests
+class TestBatch(unittest.TestCase):
+    def test_batch_round_trip(self):
+        messages = [Message(i, i * 10, i + 1000) for i in range(100)]
+        for wire_format in ('binary', 'json'):
+            decoded = decode_batch(encode_batch(messages, wire_format))
+            self.assertEqual(
+                [(m.sender_id, m.logical_clock, m.timestamp, m.message_id) for m in decoded],
+                [(m.sender_id, m.logical_clock, m.timestamp, m.message_id) for m in messages]
+            )
+
+    def test_binary_batch_size(self):
+        data = encode_batch([Message(0, 1), Message(1, 2)])
+        self.assertEqual(len(data), 1 + 2 * MESSAGE_STRUCT.size)
+
+    def test_faulty_batch(self):
+        # ensure not able to decode truncated or unknown batches
+        data = encode_batch([Message(0, 1)])
+        with self.assertRaises(ValueError):
+            decode_batch(data[:-1])
+        with self.assertRaises(ValueError):
+            decode_batch(bytes([255]) + data[1:])
+        with self.assertRaises(ValueError):
+            encode_batch([Message(0, 1)], 'xml')
+
+    def test_vector_batch_round_trip(self):
+        # vector clock deltas survive both wire formats
+        messages = [Message(0, 5, 1, [(0, 5), (3, 2)]), Message(1, 6, 2, [])]
+        for wire_format in ('binary', 'json'):
+            decoded = decode_batch(encode_batch(messages, wire_format))
+            self.assertEqual([list(m.vector_delta) for m in decoded], [[(0, 5), (3, 2)], []])
+            self.assertEqual([m.message_id for m in decoded], [1, 2])
+
+    def test_vector_batch_size(self):
+        # only the changed entries are sent
+        data = encode_batch([Message(0, 1, 0, [(0, 1)])])
+        self.assertEqual(len(data), 1 + MESSAGE_STRUCT.size + DELTA_COUNT.size + DELTA_ENTRY.size)
+        with self.assertRaises(ValueError):
+            decode_batch(data[:-1])
+
+# framing tests
+class TestFrameReader(unittest.TestCase):
+    def test_back_to_back_frames(self):
+        # Two frames arriving in one read should both be returned
+        reader = FrameReader()
+        data = Message(1, 2).to_frame() + Message(2, 5).to_frame()
+        frames = reader.feed(data)
+
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(decode_batch(frames[0])[0].logical_clock, 2)
+        self.assertEqual(decode_batch(frames[1])[0].sender_id, 2)
+        self.assertEqual(len(reader.buffer), 0)
+
+    def test_split_frame(self):
+        # A frame split across reads is only returned once it is complete
+        reader = FrameReader()
+        data = Message(1, 2).to_frame()
+
+        self.assertEqual(reader.feed(data[:3]), [])
+        self.assertEqual(reader.feed(data[3:10]), [])
+        frames = reader.feed(data[10:])
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(decode_batch(frames[0])[0].sender_id, 1)
+
+    def test_oversized_frame(self):
+        # ensure not able to send or accept frames over the size limit
+        with self.assertRaises(ValueError):
+            encode_frame(b"x" * (MAX_FRAME_SIZE + 1))
+        with self.assertRaises(ValueError):
+            FrameReader().feed(FRAME_HEADER.pack(MAX_FRAME_SIZE + 1))
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
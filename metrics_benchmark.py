@@ -0,0 +1,55 @@
+import sys
+import time
+import random
+import shutil
+import tempfile
+from message import Message
+from transport import NullTransport
+from virtual_machine import VirtualMachine
+
+# Benchmark of the cost of the hot-path metrics on the clock-cycle thread.
+# Run with: python metrics_benchmark.py [ticks]
+
+TICKS = 20000
+TICK_RATE = 100
+
+class BenchmarkMachine(VirtualMachine):
+    def _setup_network(self):
+        # a transport that only counts, so the benchmark measures the machine itself
+        self.transport = NullTransport()
+
+def run_ticks(machine, ticks):
+    """The work of _run_clock_cycle without the waits, with one delivery per tick"""
+    for i in range(ticks):
+        machine._receive(Message(1, i, i))
+        machine.step()
+
+def seconds_per_tick(metrics, ticks, log_dir):
+    """Best time per tick over several repeats"""
+    best = float('inf')
+    for repeat in range(5):
+        machine = BenchmarkMachine(0, 3, 'localhost', 0, rng=random.Random(repeat), log_dir=log_dir, metrics=metrics)
+        started = time.perf_counter()
+        run_ticks(machine, ticks)
+        best = min(best, (time.perf_counter() - started) / ticks)
+        machine.stop()
+    return best
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else TICKS
+    log_dir = tempfile.mkdtemp()
+    try:
+        plain = seconds_per_tick(False, ticks, log_dir)
+        instrumented = seconds_per_tick(True, ticks, log_dir)
+    finally:
+        shutil.rmtree(log_dir)
+
+    overhead = instrumented - plain
+    budget = 1.0 / TICK_RATE
+    print(f"Tick without metrics: {plain * 1e6:8.2f} us")
+    print(f"Tick with metrics:    {instrumented * 1e6:8.2f} us")
+    print(f"Overhead per tick:    {overhead * 1e6:8.2f} us ({overhead / plain * 100:.1f}% of the tick's own work)")
+    print(f"At {TICK_RATE} ticks/s the overhead is {overhead / budget * 100:.3f}% of the {budget * 1000:.0f} ms tick budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import random
+import unittest
+import urllib.request
+import urllib.error
+from message import Message
+from virtual_machine import VirtualMachine
+from transport import NullTransport
+from metrics import Histogram, MachineMetrics, MetricsServer, DEPTH_BUCKETS
+from harness import ScratchFolder
+
+class InstrumentedMachine(VirtualMachine):
+    def _setup_network(self):
+        self.transport = NullTransport()
+
+# metrics.py tests
+class TestHistogram(unittest.TestCase):
+    def test_buckets(self):
+        """Test that values land in the first bucket whose bound is not below them"""
+        histogram = Histogram((1, 5, 10))
+        for value in (0, 1, 2, 5, 11, 100):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 2, 0, 2])
+        self.assertEqual(histogram.count, 6)
+        self.assertEqual(histogram.sum, 119)
+
+    def test_render(self):
+        """Test the Prometheus text exposition of gauges, counters and cumulative buckets"""
+        metrics = MachineMetrics()
+        metrics.queue_depth.observe(0)
+        metrics.queue_depth.observe(3)
+        text = metrics.render({'machine': 2}, gauges=[('logical_clock', "Clock", 7)],
+                              counters=[('ticks', "Ticks", 9)])
+        lines = text.splitlines()
+        self.assertIn("# TYPE lc_logical_clock gauge", lines)
+        self.assertIn('lc_logical_clock{machine="2"} 7', lines)
+        self.assertIn('lc_ticks_total{machine="2"} 9', lines)
+        self.assertIn("# TYPE lc_queue_depth histogram", lines)
+        self.assertIn('lc_queue_depth_bucket{machine="2",le="0"} 1', lines)
+        self.assertIn('lc_queue_depth_bucket{machine="2",le="5"} 2', lines)
+        self.assertIn('lc_queue_depth_bucket{machine="2",le="+Inf"} 2', lines)
+        self.assertIn('lc_queue_depth_count{machine="2"} 2', lines)
+        buckets = [line for line in lines if line.startswith('lc_queue_depth_bucket')]
+        self.assertEqual(len(buckets), len(DEPTH_BUCKETS) + 1)
+
+class TestMachineMetrics(ScratchFolder, unittest.TestCase):
+    def test_disabled_by_default(self):
+        """Test that machines without metrics keep no histograms"""
+        machine = InstrumentedMachine(0, 3, 'localhost', 0, rng=random.Random(1), log_dir=self.log_dir)
+        machine._tick()
+        machine.stop()
+        self.assertIsNone(machine.metrics)
+        self.assertFalse(os.path.exists(machine.metrics_file))
+
+    def test_hot_path(self):
+        """Test that ticks, sends and receipts are measured and written out on stop"""
+        machine = InstrumentedMachine(0, 3, 'localhost', 0, rng=random.Random(1), log_dir=self.log_dir, metrics=True)
+        for i in range(50):
+            machine._receive(Message(1, i, i))
+            machine._tick()
+            machine._tick()
+        machine.stop()
+
+        self.assertEqual(machine.metrics.queue_depth.count, 100)
+        self.assertEqual(machine.metrics.receive_to_process_seconds.count, 50)
+        self.assertEqual(machine.metrics.send_seconds.count, machine.transport.stats['messages_sent'])
+        self.assertGreater(machine.metrics.send_seconds.count, 0)
+        with open(machine.metrics_file) as f:
+            text = f.read()
+        self.assertIn(f'lc_logical_clock{{machine="0"}} {machine.logical_clock}', text)
+        self.assertIn('lc_receive_to_process_seconds_count{machine="0"} 50', text)
+
+    def test_server(self):
+        """Test that the metrics are served at /metrics and nothing else"""
+        server = MetricsServer('localhost', 0, lambda: "lc_up 1\n")
+        server.start()
+        try:
+            url = f"http://localhost:{server.port}"
+            with urllib.request.urlopen(url + "/metrics") as response:
+                self.assertEqual(response.read(), b"lc_up 1\n")
+                self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + "/other")
+        finally:
+            server.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import time
+
+TICK_POLICIES = ('skip', 'catch_up', 'stretch')
+
+class TickScheduler:
+    """Paces clock cycles against absolute deadlines on a monotonic clock.
+
+    Tick n is due at start + n * cycle_time, so sleep overshoot and slow
+    cycles do not accumulate into drift. When a cycle overruns by whole
+    ticks, the policy decides what happens to the missed ticks:
+      skip      drop them and stay aligned to the original schedule
+      catch_up  run them back-to-back until the schedule is met again;
+                these late ticks count as caught up, not as more overruns
+      stretch   start a new schedule from now, stretching the late cycle
+    """
+    def __init__(self, cycle_time, policy='skip', clock=time.monotonic, sleep=time.sleep):
+        if policy not in TICK_POLICIES:
+            raise ValueError(f"Unknown tick policy: {policy}")
+        self.cycle_time = cycle_time
+        self.policy = policy
+        self.clock = clock
+        self.sleep = sleep
+        self.started = None
+        self.next_deadline = None
+        # when the last overrun was noticed; ticks due before then are owed to it
+        self.overrun_at = None
+        self.stats = {
+            'ticks': 0,
+            'overruns': 0,
+            'skipped': 0,
+            'caught_up': 0,
+            'jitter_total': 0.0,
+            'jitter_max': 0.0,
+        }
+
+    def wait(self):
+        """Block until the next tick is due; the first call returns at once"""
+        delay = self.delay()
+        if delay > 0:
+            self.sleep(delay)
+        self.start_tick(slept=delay > 0)
+
+    def delay(self):
+        """Seconds until the next tick is due, for callers that wait elsewhere, such as on an event loop"""
+        if self.next_deadline is None:
+            return 0.0
+        return max(0.0, self.next_deadline - self.clock())
+
+    def start_tick(self, slept=False):
+        """Account for a tick starting now; slept is whether the caller waited delay() seconds for it"""
+        now = self.clock()
+        if self.next_deadline is None:
+            self.started = now
+            self.next_deadline = now
+        elif not slept and now > self.next_deadline:
+            if self.overrun_at is not None and self.next_deadline <= self.overrun_at:
+                # a tick missed by an overrun already counted, run late to catch up
+                self.stats['caught_up'] += 1
+            else:
+                # the previous cycle finished after this tick was due
+                self.stats['overruns'] += 1
+                self.overrun_at = now
+                missed = int((now - self.next_deadline) // self.cycle_time)
+                if missed and self.policy == 'skip':
+                    self.stats['skipped'] += missed
+                    self.next_deadline += missed * self.cycle_time
+                elif self.policy == 'stretch':
+                    self.next_deadline = now
+
+        # jitter is how late this tick starts against its deadline
+        jitter = max(0.0, now - self.next_deadline)
+        self.stats['jitter_total'] += jitter
+        self.stats['jitter_max'] = max(self.stats['jitter_max'], jitter)
+        self.stats['ticks'] += 1
+        self.next_deadline += self.cycle_time
+
+    def achieved_rate(self):
+        """Ticks per second actually run since the first tick"""
+        if self.started is None:
+            return 0.0
+        elapsed = self.clock() - self.started
+        return self.stats['ticks'] / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        """One-line description of the scheduler's accuracy for the log"""
+        ticks = self.stats['ticks']
+        mean_jitter = self.stats['jitter_total'] / ticks if ticks else 0.0
+        return (
+            f"Scheduler stats: ticks: {ticks}, " +
+            f"achieved rate: {self.achieved_rate():.3f} ticks/second, " +
+            f"jitter mean: {mean_jitter * 1000:.3f} ms, " +
+            f"jitter max: {self.stats['jitter_max'] * 1000:.3f} ms, " +
+            f"overruns: {self.stats['overruns']}, " +
+            f"skipped: {self.stats['skipped']}, " +
+            f"caught up: {self.stats['caught_up']}"
+        )
@@ -0,0 +1,95 @@
+import unittest
+from scheduler import TickScheduler
+
+class FakeClock:
+    """A monotonic clock that only moves when told to"""
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+# scheduler.py tests
+class TestTickScheduler(unittest.TestCase):
+    def make_scheduler(self, policy):
+        self.clock = FakeClock()
+        return TickScheduler(0.1, policy, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_no_drift(self):
+        """Test that deadlines stay absolute when cycles take varying time"""
+        scheduler = self.make_scheduler('skip')
+        for i in range(50):
+            scheduler.wait()
+            self.assertAlmostEqual(self.clock.now, 100.0 + i * 0.1)
+            # each cycle does a different amount of work within its budget
+            self.clock.now += 0.01 * (i % 5)
+
+        self.assertEqual(scheduler.stats['ticks'], 50)
+        self.assertEqual(scheduler.stats['overruns'], 0)
+        self.assertAlmostEqual(scheduler.achieved_rate(), 50 / 4.94)
+
+    def test_skip(self):
+        """Test that missed ticks are dropped and the schedule stays aligned"""
+        scheduler = self.make_scheduler('skip')
+        scheduler.wait()
+        self.clock.now += 0.35
+        scheduler.wait()
+
+        self.assertEqual(scheduler.stats['overruns'], 1)
+        self.assertEqual(scheduler.stats['skipped'], 2)
+        scheduler.wait()
+        self.assertAlmostEqual(self.clock.now, 100.4)
+
+    def test_catch_up(self):
+        """Test that missed ticks run back-to-back"""
+        scheduler = self.make_scheduler('catch_up')
+        scheduler.wait()
+        self.clock.now += 0.35
+        for _ in range(3):
+            scheduler.wait()
+            self.assertAlmostEqual(self.clock.now, 100.35)
+
+        # one overrun, whose two missed ticks are caught up
+        self.assertEqual(scheduler.stats['overruns'], 1)
+        self.assertEqual(scheduler.stats['caught_up'], 2)
+        self.assertEqual(scheduler.stats['skipped'], 0)
+        scheduler.wait()
+        self.assertAlmostEqual(self.clock.now, 100.4)
+
+        # a tick late again once the schedule is met is a new overrun
+        self.clock.now += 0.15
+        scheduler.wait()
+        self.assertEqual(scheduler.stats['overruns'], 2)
+        self.assertEqual(scheduler.stats['caught_up'], 2)
+
+    def test_stretch(self):
+        """Test that a late cycle restarts the schedule from now"""
+        scheduler = self.make_scheduler('stretch')
+        scheduler.wait()
+        self.clock.now += 0.35
+        scheduler.wait()
+        scheduler.wait()
+
+        self.assertAlmostEqual(self.clock.now, 100.45)
+        self.assertEqual(scheduler.stats['jitter_max'], 0.0)
+
+    def test_delay(self):
+        """Test that the delay counts down to the next deadline and never goes negative"""
+        scheduler = self.make_scheduler('skip')
+        self.assertEqual(scheduler.delay(), 0.0)
+        scheduler.wait()
+        self.clock.now += 0.03
+        self.assertAlmostEqual(scheduler.delay(), 0.07)
+        self.clock.now += 0.2
+        self.assertEqual(scheduler.delay(), 0.0)
+
+    def test_unknown_policy(self):
+        # ensure not able to make a scheduler with an unknown policy
+        with self.assertRaises(ValueError):
+            TickScheduler(0.1, 'sometimes')
+
+if __name__ == "__main__":
+    unittest.main()
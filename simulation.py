@@ -0,0 +1,138 @@
+import os
+import time
+import heapq
+import random
+import argparse
+import itertools
+from virtual_machine import VirtualMachine, CLOCK_RATE_RANGE, INTERNAL_EVENT_PROBABILITY
+from event_log import EventLog
+from event_store import EventStore
+
+# Virtual time 0 is written to the logs as 2025-01-01 00:00:00 UTC, so the
+# same seed always produces byte-identical log files
+SIMULATION_EPOCH = 1735689600.0
+
+class SimulatedMachine(VirtualMachine):
+    """A VirtualMachine driven by a Simulation instead of sockets and sleeps"""
+    def __init__(self, simulation, machine_id, num_machines, rng, log_dir, **options):
+        self.simulation = simulation
+        super().__init__(machine_id, num_machines, None, 0, rng=rng, log_dir=log_dir, **options)
+
+    def _setup_logging(self, log_filename):
+        """Stamp events with the virtual time and write them when the run ends"""
+        return EventLog(
+            log_filename, self.log_format,
+            clock=self.simulation.wall_time, converter=time.gmtime, background=False
+        )
+
+    def _setup_event_store(self, store_filename):
+        """Stamp stored events with the virtual time in nanoseconds"""
+        return EventStore(
+            store_filename, self.machine_id, self.clock_rate,
+            clock=lambda: round(self.simulation.now * 1e9), wall_offset_ns=round(SIMULATION_EPOCH * 1e9)
+        )
+
+    def _setup_network(self):
+        """Messages are delivered by the simulation, so nothing is bound"""
+        pass
+
+    def _send_message(self, peer_port, message):
+        """Schedule delivery of a message to a peer in virtual time"""
+        message.timestamp = self.simulation.wall_time()
+        # with a port base of 0 a peer's port is its machine id
+        self.simulation.deliver(peer_port, message)
+
+    def stop(self):
+        """Stop the machine and write out its log"""
+        self.running = False
+        self.logger.close()
+
+class Simulation:
+    """Deterministic discrete-event simulation of a set of virtual machines.
+
+    Ticks and message deliveries are kept on a priority queue ordered by
+    virtual time, and every random choice comes from one seeded RNG, so a
+    run never sleeps and the same seed always gives the same run.
+    """
+    def __init__(self, num_machines=3, seed=None, log_dir='.', latency=0.001, startup_delay=2.0, clock_mode='lamport',
+                 clock_rate_range=CLOCK_RATE_RANGE, internal_event_probability=INTERNAL_EVENT_PROBABILITY,
+                 event_store=False):
+        self.num_machines = num_machines
+        self.seed = seed
+        self.latency = latency
+        self.startup_delay = startup_delay
+        self.now = 0.0
+
+        # Events are (time, sequence, kind, machine_id, payload); the sequence
+        # number breaks ties between events at the same time in FIFO order
+        self.events = []
+        self.sequence = itertools.count()
+
+        rng = random.Random(seed)
+        self.machines = [
+            SimulatedMachine(self, i, num_machines, random.Random(rng.getrandbits(64)), log_dir,
+                             clock_mode=clock_mode, clock_rate_range=clock_rate_range,
+                             internal_event_probability=internal_event_probability, event_store=event_store)
+            for i in range(num_machines)
+        ]
+
+    def wall_time(self):
+        """The wall-clock time corresponding to the current virtual time"""
+        return SIMULATION_EPOCH + self.now
+
+    def schedule(self, delay, kind, machine_id, payload=None):
+        """Queue an event to happen delay virtual seconds from now"""
+        heapq.heappush(self.events, (self.now + delay, next(self.sequence), kind, machine_id, payload))
+
+    def deliver(self, machine_id, message):
+        """Queue a message to arrive at a machine after the network latency"""
+        self.schedule(self.latency, 'deliver', machine_id, message)
+
+    def run(self, duration):
+        """Run the simulation until duration virtual seconds have passed"""
+        for machine in self.machines:
+            machine.running = True
+            self.schedule(self.startup_delay, 'tick', machine.machine_id)
+
+        while self.events and self.events[0][0] <= duration:
+            self.now, _, kind, machine_id, payload = heapq.heappop(self.events)
+            machine = self.machines[machine_id]
+            if kind == 'tick':
+                machine._tick()
+                self.schedule(machine.cycle_time, 'tick', machine_id)
+            elif kind == 'deliver':
+                machine._receive(payload)
+
+        self.now = duration
+        for machine in self.machines:
+            machine.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the logical clock simulation in virtual time")
+    parser.add_argument('output_dir', help="folder to write machine_N.log files to")
+    parser.add_argument('--machines', type=int, default=3, help="number of virtual machines")
+    parser.add_argument('--duration', type=float, default=60, help="simulated seconds to run for")
+    parser.add_argument('--seed', type=int, default=None, help="seed for a reproducible run")
+    parser.add_argument('--latency', type=float, default=0.001, help="simulated network latency in seconds")
+    parser.add_argument('--clock-mode', choices=('lamport', 'vector'), default='lamport', help="keep vector clocks as well as Lamport clocks")
+    parser.add_argument('--clock-rates', type=int, nargs=2, default=CLOCK_RATE_RANGE, metavar=('LOW', 'HIGH'),
+                        help="range of ticks per second to draw each machine's clock rate from")
+    parser.add_argument('--internal-probability', type=float, default=INTERNAL_EVENT_PROBABILITY,
+                        help="probability that a tick with no message is an internal event")
+    parser.add_argument('--event-store', action='store_true', help="also write machine_N.evt event stores")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.time()
+    simulation = Simulation(args.machines, args.seed, args.output_dir, args.latency, clock_mode=args.clock_mode,
+                            clock_rate_range=args.clock_rates, internal_event_probability=args.internal_probability,
+                            event_store=args.event_store)
+    simulation.run(args.duration)
+    elapsed = time.time() - start
+
+    print(f"Simulated {args.duration} seconds in {elapsed:.2f} seconds of wall time")
+    print(f"Logs written to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
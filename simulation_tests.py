@@ -0,0 +1,93 @@
+import os
+import re
+import unittest
+from simulation import Simulation
+from harness import ScratchFolder
+
+# simulation.py tests
+class TestSimulation(ScratchFolder, unittest.TestCase):
+    def read_logs(self, num_machines):
+        logs = []
+        for i in range(num_machines):
+            with open(os.path.join(self.log_dir, f"machine_{i}.log")) as f:
+                logs.append(f.read())
+        return logs
+
+    def test_deterministic(self):
+        """Test that the same seed gives byte-identical logs"""
+        Simulation(3, seed=42, log_dir=self.log_dir).run(120)
+        first = self.read_logs(3)
+        Simulation(3, seed=42, log_dir=self.log_dir).run(120)
+        second = self.read_logs(3)
+
+        self.assertEqual(first, second)
+        self.assertIn("Machine initialized with clock rate", first[0])
+
+    def test_lamport_invariant(self):
+        """Test that logical clocks only increase and receipts exceed the sent clock"""
+        simulation = Simulation(4, seed=1, log_dir=self.log_dir)
+        received = []
+        for machine in simulation.machines:
+            original_tick = machine._tick
+            def tick(machine=machine, original_tick=original_tick):
+                before = machine.logical_clock
+                pending = None if machine.message_queue.empty() else machine.message_queue.queue[0]
+                original_tick()
+                self.assertGreater(machine.logical_clock, before)
+                if pending is not None:
+                    received.append(pending)
+                    self.assertGreater(machine.logical_clock, pending.logical_clock)
+            machine._tick = tick
+        simulation.run(60)
+
+        self.assertTrue(received)
+
+    def test_vector_deltas(self):
+        """Test that vector clock messages carry only changed entries and rebuild the sender's vector"""
+        for num_machines in (3, 12):
+            simulation = Simulation(num_machines, seed=2, log_dir=self.log_dir, clock_mode='vector')
+            sent, sizes = {}, []
+            for machine in simulation.machines:
+                original_send = machine._send_message
+                def send(peer_port, message, machine=machine, original_send=original_send):
+                    sent[(message.sender_id, message.message_id, peer_port)] = tuple(machine.vector_clock)
+                    sizes.append(len(message.vector_delta))
+                    original_send(peer_port, message)
+                machine._send_message = send
+                original_receive = machine._receive
+                def receive(message, machine=machine, original_receive=original_receive):
+                    original_receive(message)
+                    key = (message.sender_id, message.message_id, machine.machine_id)
+                    self.assertEqual(message.vector_clock, sent[key])
+                machine._receive = receive
+            simulation.run(60)
+
+            # far fewer entries than a full vector
+            self.assertTrue(sizes)
+            self.assertLess(sum(sizes) / len(sizes), num_machines / 2 + 1)
+
+    def test_workload_settings(self):
+        """Test that the clock rate range and internal event probability shape the workload"""
+        simulation = Simulation(5, seed=4, log_dir=self.log_dir, clock_rate_range=(3, 4),
+                                internal_event_probability=0.0)
+        simulation.run(30)
+        logs = self.read_logs(5)
+        self.assertTrue(all(3 <= machine.clock_rate <= 4 for machine in simulation.machines))
+        self.assertFalse(any("Internal event" in log for log in logs))
+        # every machine is sent to, however many there are
+        self.assertTrue(all("Received message" in log for log in logs))
+
+        Simulation(5, seed=4, log_dir=self.log_dir, internal_event_probability=1.0).run(30)
+        logs = self.read_logs(5)
+        self.assertFalse(any("Sent message" in log for log in logs))
+
+    def test_log_format(self):
+        """Test that logs use the same line format as real runs"""
+        Simulation(3, seed=3, log_dir=self.log_dir).run(10)
+        line_format = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} - .*Logical clock: \d+$")
+        lines = self.read_logs(3)[0].splitlines()
+
+        self.assertTrue(all(line_format.match(line) for line in lines[1:]))
+
+if __name__ == "__main__":
+    unittest.main()
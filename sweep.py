@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from simulation import Simulation
+from virtual_machine import CLOCK_RATE_RANGE, INTERNAL_EVENT_PROBABILITY
+from batch_analysis import CACHE_DIR_NAME, analyze_folder, write_aggregate
+
+# 'simulation' runs in virtual time and takes a fraction of a second per
+# run; 'realtime' runs real machine processes over sockets for duration
+# seconds, each run on its own range of ports
+MODES = ('simulation', 'realtime')
+
+# Settings of every configuration that does not override them
+DEFAULTS = {
+    'machines': 3,
+    'duration': 60,
+    'runs': 5,
+    'clock_rate_range': list(CLOCK_RATE_RANGE),
+    'internal_event_probability': INTERNAL_EVENT_PROBABILITY,
+    'mode': 'simulation',
+}
+
+# Settings of the sweep as a whole
+SWEEP_KEYS = ('output_dir', 'seed', 'host', 'port_base', 'configurations')
+
+def load_sweep(filename):
+    """Read a sweep config: defaults and sweep settings at the top, overrides per configuration"""
+    with open(filename) as f:
+        config = json.load(f)
+    unknown = set(config) - set(DEFAULTS) - set(SWEEP_KEYS)
+    for name, overrides in config.get('configurations', {}).items():
+        unknown |= set(overrides) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown sweep settings: {', '.join(sorted(unknown))}")
+    if not config.get('configurations'):
+        raise ValueError("A sweep needs at least one configuration")
+    return config
+
+def run_seed(seed, name, run):
+    """The seed of one run, derived from the sweep seed so every run differs but is reproducible"""
+    if seed is None:
+        return None
+    return random.Random(f"{seed}/{name}/{run}").getrandbits(32)
+
+def expand(config):
+    """One task per run of every configuration, each with its own folder and ports"""
+    root = config.get('output_dir', 'sweep')
+    defaults = {key: config[key] for key in DEFAULTS if key in config}
+    tasks = []
+    for name, overrides in config['configurations'].items():
+        settings = dict(DEFAULTS, **defaults, **overrides)
+        if settings['mode'] not in MODES:
+            raise ValueError(f"Unknown sweep mode: {settings['mode']}")
+        for run in range(1, settings['runs'] + 1):
+            tasks.append(dict(
+                settings, name=name, run=run,
+                folder=os.path.join(root, name, f"{name}_run{run}"),
+                seed=run_seed(config.get('seed'), name, run),
+            ))
+
+    # runs that may overlap in time never share a port
+    port = config.get('port_base', 9000)
+    for task in tasks:
+        task['host'] = config.get('host', 'localhost')
+        task['port_base'] = port
+        port += task['machines']
+    return tasks
+
+def execute(task, root, cache_dir, plots=True):
+    """Run one task and analyse its logs; runs in a worker process"""
+    os.makedirs(task['folder'], exist_ok=True)
+    # a previous run with more machines leaves logs behind
+    for name in os.listdir(task['folder']):
+        if name.startswith('machine_'):
+            os.remove(os.path.join(task['folder'], name))
+
+    if task['mode'] == 'simulation':
+        Simulation(
+            task['machines'], task['seed'], task['folder'],
+            clock_rate_range=task['clock_rate_range'],
+            internal_event_probability=task['internal_event_probability'],
+        ).run(task['duration'])
+    else:
+        # imported here so simulation sweeps do not need the socket machinery
+        from main import run_machines
+        options = {
+            'clock_rate_range': task['clock_rate_range'],
+            'internal_event_probability': task['internal_event_probability'],
+        }
+        run_machines(task['machines'], task['host'], task['port_base'], options,
+                     task['duration'], task['seed'], task['folder'])
+    return analyze_folder(task['folder'], root, cache_dir, plots)
+
+def run_sweep(config, jobs=None, plots=True):
+    """Run every task of a sweep across a process pool and write the aggregate report.
+
+    Simulated runs are CPU-bound, so by default there is one worker per
+    core; real-time runs mostly sleep, so they all run at once.
+    """
+    tasks = expand(config)
+    root = config.get('output_dir', 'sweep')
+    cache_dir = os.path.join(root, CACHE_DIR_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    if jobs is None:
+        realtime = all(task['mode'] == 'realtime' for task in tasks)
+        jobs = len(tasks) if realtime else os.cpu_count()
+
+    # record what was run, seeds included, next to the results
+    with open(os.path.join(root, "sweep.json"), 'w') as f:
+        json.dump({'config': config, 'runs': tasks}, f, indent=2)
+        f.write("\n")
+
+    summaries, errors = {}, []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(execute, task, root, cache_dir, plots) for task in tasks]
+        for future in futures:
+            run_folder, summary, _, error = future.result()
+            if error:
+                errors.append(error)
+                continue
+            summaries[run_folder] = summary
+    report_txt, report_json = write_aggregate(summaries, root)
+    return summaries, errors, report_txt, report_json
+
+def main():
+    parser = argparse.ArgumentParser(description="Run and analyse a parameter sweep of simulations")
+    parser.add_argument('config', help="sweep config file (JSON)")
+    parser.add_argument('--jobs', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--no-plots', action='store_true', help="skip writing plots for each run")
+    args = parser.parse_args()
+
+    try:
+        config = load_sweep(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.time()
+    summaries, errors, report_txt, report_json = run_sweep(config, args.jobs, not args.no_plots)
+    for error in errors:
+        print(f"Error: {error}")
+    print(f"Ran and analysed {len(summaries)} runs in {time.time() - start:.2f} seconds")
+    print(f"Aggregate report written to {report_txt} and {report_json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from sweep import load_sweep, expand, run_sweep
+
+# sweep.py tests
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        """Set up a scratch folder and a small sweep config"""
+        self.root = tempfile.mkdtemp()
+        self.config = {
+            'output_dir': os.path.join(self.root, 'sweep'),
+            'seed': 7,
+            'duration': 10,
+            'runs': 2,
+            'configurations': {
+                'slow': {'clock_rate_range': [1, 2]},
+                'busy': {'machines': 4, 'internal_event_probability': 0.0},
+            },
+        }
+
+    def tearDown(self):
+        """Clean up the scratch folder"""
+        shutil.rmtree(self.root)
+
+    def test_expand(self):
+        """Test that every run gets its own folder, seed and ports"""
+        tasks = expand(self.config)
+        self.assertEqual([(task['name'], task['run']) for task in tasks],
+                         [('slow', 1), ('slow', 2), ('busy', 1), ('busy', 2)])
+        self.assertEqual(tasks[0]['folder'], os.path.join(self.root, 'sweep', 'slow', 'slow_run1'))
+        self.assertEqual(tasks[2]['machines'], 4)
+        self.assertEqual(tasks[2]['clock_rate_range'], [1, 6])
+        self.assertEqual(len({task['seed'] for task in tasks}), 4)
+        self.assertEqual([task['seed'] for task in expand(self.config)], [task['seed'] for task in tasks])
+        # port ranges do not overlap
+        self.assertEqual([task['port_base'] for task in tasks], [9000, 9003, 9006, 9010])
+
+    def test_unknown_setting(self):
+        """Test that a misspelt setting is rejected"""
+        self.config['configurations']['slow']['clock_rate'] = [1, 2]
+        config_file = os.path.join(self.root, 'sweep.json')
+        with open(config_file, 'w') as f:
+            json.dump(self.config, f)
+        with self.assertRaises(ValueError):
+            load_sweep(config_file)
+
+    def test_run_sweep(self):
+        """Test that a sweep runs every task and aggregates by configuration"""
+        summaries, errors, report_txt, report_json = run_sweep(self.config, jobs=2, plots=False)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(summaries), 4)
+        with open(report_json) as f:
+            report = json.load(f)
+        self.assertEqual(sorted(report['configurations']), ['busy', 'slow'])
+        self.assertEqual(report['configurations']['busy']['machines'], 8)
+        self.assertTrue(os.path.exists(report_txt))
+        for summary in summaries.values():
+            if len(summary['machines']) == 3:
+                self.assertTrue(all(machine['tick_rate'] <= 2 for machine in summary['machines']))
+            else:
+                self.assertTrue(all(machine['event_counts']['internal'] == 0 for machine in summary['machines']))
+
+if __name__ == '__main__':
+    unittest.main()
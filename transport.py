@@ -0,0 +1,765 @@
+import socket
+import select
+import struct
+import threading
+from multiprocessing import shared_memory, resource_tracker
+import time
+import random
+from collections import deque
+from message import (Message, FrameReader, decode_batch, encode_batch, encode_frame, encode_ready, decode_ready,
+                     MESSAGE_STRUCT)
+
+# Transports move messages between virtual machines. Each one provides:
+#   start()                 begin accepting messages from peers
+#   wait_ready(peer_ids, timeout, is_running)
+#                           block until every peer is reachable and has
+#                           announced itself; returns the peers still missing
+#   send(peer_id, message)  deliver a message to another machine
+#   poll(limit=None)        hand up to limit pending messages to on_message
+#   close()                 release the transport's resources
+# and keeps send counters in a stats dict.
+
+# How SocketTransport.send delivers a message:
+#   inline  send it on the caller's thread, blocking until it is written
+#   queued  hand it to the peer's own sender thread and return at once; a
+#           peer whose queue is full, or whose send times out, loses
+#           messages instead of holding up the clock cycle
+SEND_DISPATCH_MODES = ('inline', 'queued')
+
+# Messages waiting for one peer before further ones are dropped, and
+# seconds a queued send may block before the peer counts as stalled
+SEND_QUEUE_LIMIT = 10000
+SEND_TIMEOUT = 1.0
+
+# Messages a sender thread writes to its peer in one frame
+SEND_BATCH_LIMIT = 1000
+
+def free_port_base(count):
+    """A port base with count free consecutive ports"""
+    for _ in range(100):
+        base = random.randint(20000, 60000 - count)
+        sockets = []
+        try:
+            for port in range(base, base + count):
+                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sockets.append(s)
+                s.bind(('localhost', port))
+            return base
+        except OSError:
+            continue
+        finally:
+            for s in sockets:
+                s.close()
+    raise RuntimeError(f"No {count} free consecutive ports")
+
+class SocketTransport:
+    """Sends messages over persistent TCP connections, one per peer"""
+    def __init__(self, machine_id, host, port_base, on_message, logger, wire_format='binary',
+                 dispatch='inline', send_queue_limit=SEND_QUEUE_LIMIT, send_timeout=SEND_TIMEOUT):
+        if dispatch not in SEND_DISPATCH_MODES:
+            raise ValueError(f"Unknown send dispatch: {dispatch}")
+        self.host = host
+        self.port_base = port_base
+        self.port = port_base + machine_id
+        self.on_message = on_message
+        self.logger = logger
+        # 'binary' for the compact struct encoding, 'json' for debugging
+        self.wire_format = wire_format
+        self.running = False
+
+        # Peers that have announced they are listening, for the startup barrier
+        self.machine_id = machine_id
+        self.ready_peers = set()
+        self.ready_condition = threading.Condition()
+        # Accepted inbound connections, shut down on close as a process exit would
+        self.clients = set()
+
+        # Persistent outbound connections, opened lazily and reused per peer
+        self.connections = {}
+        self.connections_lock = threading.RLock()
+        self.connected_peers = set()
+        # Peers whose last send failed, so earlier messages on the broken
+        # connection may be lost too; the next message carries its whole
+        # vector clock rather than a delta the peer cannot apply
+        self.resync_peers = set()
+        self.stats = {
+            'connects': 0,
+            'reconnects': 0,
+            'messages_sent': 0,
+            'bytes_sent': 0,
+            'send_dropped': 0,
+            'send_timeouts': 0,
+        }
+
+        # In queued dispatch, send() appends to outbound and a dispatcher
+        # thread hands each message to its peer's PeerSender, started on the
+        # peer's first message. Waking a thread costs more than the append,
+        # so the clock cycle wakes only the dispatcher, and only when it is
+        # not already due to run
+        self.dispatch = dispatch
+        self.send_queue_limit = send_queue_limit
+        self.send_timeout = send_timeout
+        self.senders = {}
+        self.outbound = deque()
+        self.dispatch_condition = threading.Condition()
+        self.dispatch_scheduled = False
+        self.dispatcher = None
+
+        # Set up socket for receiving messages
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(5)
+
+    def start(self):
+        """Start the listener thread for incoming connections, and the dispatcher in queued dispatch"""
+        self.running = True
+        listener_thread = threading.Thread(target=self._listen_for_connections)
+        listener_thread.daemon = True
+        listener_thread.start()
+        if self.dispatch == 'queued':
+            self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self.dispatcher.start()
+
+    def wait_ready(self, peer_ids, timeout, is_running):
+        """Announce this machine to every peer and wait for theirs in return"""
+        deadline = time.monotonic() + timeout
+        unannounced = set(peer_ids)
+        while is_running():
+            for peer_id in list(unannounced):
+                peer_port = self.port_base + peer_id
+                with self.connections_lock:
+                    try:
+                        # opens the pooled connection later sends will reuse
+                        self._get_connection(peer_port).sendall(encode_frame(encode_ready(self.machine_id)))
+                        unannounced.discard(peer_id)
+                    except OSError:
+                        # the peer is not listening yet
+                        self._drop_connection(peer_port)
+
+            with self.ready_condition:
+                missing = (set(peer_ids) - self.ready_peers) | unannounced
+                remaining = deadline - time.monotonic()
+                if not missing or remaining <= 0:
+                    return missing
+                self.ready_condition.wait(min(remaining, 0.01))
+        return set(peer_ids) - self.ready_peers
+
+    def poll(self, limit=None):
+        """Messages are handed over by the receive threads as they arrive"""
+        pass
+
+    def close(self):
+        """Close the listening socket and all pooled connections"""
+        # queued messages get one send timeout, shared by all peers, to go out
+        deadline = time.monotonic() + self.send_timeout
+        if self.dispatcher is not None:
+            with self.dispatch_condition:
+                self.running = False
+                self.dispatch_condition.notify()
+            self.dispatcher.join()
+        for sender in self.senders.values():
+            sender.close()
+        for sender in self.senders.values():
+            sender.join(deadline - time.monotonic())
+        self.running = False
+
+        # Wake up the listener thread blocked in accept() before closing
+        try:
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server_socket.close()
+
+        with self.connections_lock:
+            for connection in self.connections.values():
+                connection.close()
+            self.connections.clear()
+            # wakes the receive threads, and tells senders this end is gone
+            for client_socket in self.clients:
+                try:
+                    client_socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def _dispatch(self):
+        """Hand queued messages to their peers' senders until the transport closes"""
+        outbound = self.outbound
+        while True:
+            with self.dispatch_condition:
+                self.dispatch_scheduled = False
+                while not outbound and self.running:
+                    self.dispatch_condition.wait()
+                if not outbound:
+                    return
+            while outbound:
+                peer_id, message = outbound.popleft()
+                sender = self.senders.get(peer_id)
+                if sender is None:
+                    sender = PeerSender(self, peer_id, self.send_queue_limit, self.send_timeout)
+                    # peer_stats() reads senders from other threads
+                    with self.connections_lock:
+                        self.senders[peer_id] = sender
+                sender.put(message)
+
+    def _listen_for_connections(self):
+        """Listen for incoming connections from other machines"""
+        while self.running:
+            try:
+                client_socket, _ = self.server_socket.accept()
+                handler = threading.Thread(target=self._handle_client, args=(client_socket,))
+                handler.daemon = True
+                handler.start()
+            except Exception as e:
+                if self.running:
+                    self.logger.error(f"Error accepting connection: {e}")
+
+    def _handle_client(self, client_socket):
+        """Handle messages from a connected client"""
+        reader = FrameReader()
+        with self.connections_lock:
+            self.clients.add(client_socket)
+        try:
+            while self.running:
+                data = client_socket.recv(65536)
+                if not data:
+                    break
+
+                # A single read may hold several frames, or only part of one
+                for frame in reader.feed(data):
+                    peer_id = decode_ready(frame)
+                    if peer_id is not None:
+                        with self.ready_condition:
+                            self.ready_peers.add(peer_id)
+                            self.ready_condition.notify_all()
+                        continue
+
+                    try:
+                        messages = decode_batch(frame)
+                    except (ValueError, KeyError) as e:
+                        self.logger.error(f"Dropped malformed message: {e}")
+                        continue
+
+                    for message in messages:
+                        self.on_message(message)
+        except Exception as e:
+            if self.running:
+                self.logger.error(f"Error handling client: {e}")
+        finally:
+            with self.connections_lock:
+                self.clients.discard(client_socket)
+            client_socket.close()
+
+    def _connect(self, peer_port, timeout=None):
+        """Open a new connection to a peer and count it"""
+        connection = socket.create_connection((self.host, peer_port), timeout)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.connections_lock:
+            if peer_port in self.connected_peers:
+                self.stats['reconnects'] += 1
+            else:
+                self.connected_peers.add(peer_port)
+                self.stats['connects'] += 1
+        return connection
+
+    def _get_connection(self, peer_port):
+        """Return the pooled connection to a peer, opening it if needed"""
+        connection = self.connections.get(peer_port)
+        if connection is None:
+            connection = self.connections[peer_port] = self._connect(peer_port)
+        return connection
+
+    def _take_connection(self, peer_port, timeout):
+        """Take a peer's connection out of the pool, or open one, for its sender thread"""
+        with self.connections_lock:
+            connection = self.connections.pop(peer_port, None)
+        if connection is None:
+            return self._connect(peer_port, timeout)
+        connection.settimeout(timeout)
+        return connection
+
+    def _drop_connection(self, peer_port):
+        """Close and forget a broken connection so the next send reconnects"""
+        connection = self.connections.pop(peer_port, None)
+        if connection:
+            connection.close()
+
+    def send(self, peer_id, message):
+        """Send a message to a peer machine over its persistent connection"""
+        if self.dispatch == 'queued':
+            self.outbound.append((peer_id, message))
+            # one wakeup per burst of sends, however many peers they go to
+            if not self.dispatch_scheduled:
+                self.dispatch_scheduled = True
+                with self.dispatch_condition:
+                    self.dispatch_condition.notify()
+            return
+        peer_port = self.port_base + peer_id
+        if peer_id in self.resync_peers:
+            message.send_full_vector()
+        data = message.to_frame(self.wire_format)
+        with self.connections_lock:
+            connection = self.connections.get(peer_port)
+            if connection is not None and _peer_closed(connection):
+                # the first send on it would still succeed, and be lost; the
+                # peer may have restarted, so send it the whole vector clock
+                self._drop_connection(peer_port)
+                message.send_full_vector()
+                data = message.to_frame(self.wire_format)
+            # A pooled connection may also break without the peer closing
+            # it, so retry once on a fresh connection before giving up
+            reused = peer_port in self.connections
+            for attempt in range(2 if reused else 1):
+                try:
+                    self._get_connection(peer_port).sendall(data)
+                    self.resync_peers.discard(peer_id)
+                    self.stats['messages_sent'] += 1
+                    self.stats['bytes_sent'] += len(data)
+                    return
+                except Exception as e:
+                    self._drop_connection(peer_port)
+                    error = e
+                    if peer_id not in self.resync_peers:
+                        self.resync_peers.add(peer_id)
+                        message.send_full_vector()
+                        data = message.to_frame(self.wire_format)
+            self.logger.error(f"Error sending message to port {peer_port}: {error}")
+
+    def peer_stats(self):
+        """Counters of each peer's sender thread in queued dispatch, by peer id"""
+        with self.connections_lock:
+            senders = sorted(self.senders.items())
+        return {peer_id: dict(sender.stats) for peer_id, sender in senders}
+
+def _peer_closed(connection):
+    """Whether the peer has closed a pooled connection, checked without blocking.
+
+    Peers never write back on these connections, so a readable socket
+    means end of file or an error.
+    """
+    try:
+        if not select.select([connection], [], [], 0)[0]:
+            return False
+        return connection.recv(1, socket.MSG_PEEK) == b''
+    except OSError:
+        return True
+
+class PeerSender:
+    """Sends one peer's messages from a thread of its own.
+
+    The caller only appends to a bounded deque, so a slow or dead peer
+    delays its own messages and never the clock cycle. Messages that queue
+    up while a send is in progress go out together in one frame, and
+    since each peer has one sender they arrive in the order they were sent.
+    After messages are dropped or lost on a broken connection, the next
+    one sent carries its whole vector clock rather than a delta.
+    """
+    def __init__(self, transport, peer_id, limit, timeout):
+        self.transport = transport
+        self.peer_port = transport.port_base + peer_id
+        self.limit = limit
+        self.timeout = timeout
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.closing = False
+        self.connection = None
+        # set when a message was dropped with nothing queued after it
+        self.resync = False
+        self.stats = {'messages_sent': 0, 'dropped': 0, 'timeouts': 0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, message):
+        """Queue a message, or drop it if the queue is full; never blocks on the network"""
+        with self.condition:
+            if len(self.pending) >= self.limit or self.closing:
+                self._dropped(1)
+                self.resync = True
+                return False
+            if self.resync:
+                message.send_full_vector()
+                self.resync = False
+            self.pending.append(message)
+            self.condition.notify()
+            return True
+
+    def close(self):
+        """Send what is queued and stop; join() waits for it"""
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+
+    def join(self, timeout):
+        """Wait up to timeout seconds for the queue to drain, then cut the connection"""
+        self.thread.join(max(0, timeout))
+        if self.thread.is_alive() and self.connection is not None:
+            # unblocks a send to a stalled peer; what is left is dropped
+            self.connection.close()
+
+    def _dropped(self, count):
+        # the transport's counters are shared by every sender thread
+        self.stats['dropped'] += count
+        with self.transport.connections_lock:
+            self.transport.stats['send_dropped'] += count
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+                batch = [self.pending.popleft() for _ in range(min(len(self.pending), SEND_BATCH_LIMIT))]
+            self._send(batch)
+        if self.connection is not None:
+            self.connection.close()
+
+    def _send(self, batch):
+        """Write a batch in one frame, retrying once on a fresh connection if the old one broke"""
+        data = encode_frame(encode_batch(batch, self.transport.wire_format))
+        for attempt in range(2):
+            reused = self.connection is not None
+            try:
+                if self.connection is None:
+                    self.connection = self.transport._take_connection(self.peer_port, self.timeout)
+                if _peer_closed(self.connection):
+                    # the first send on it would still succeed, and be lost; the
+                    # peer may have restarted, so send it the whole vector clock
+                    self.connection.close()
+                    self.connection = self.transport._connect(self.peer_port, self.timeout)
+                    batch[0].send_full_vector()
+                    data = encode_frame(encode_batch(batch, self.transport.wire_format))
+                self.connection.sendall(data)
+                self.stats['messages_sent'] += len(batch)
+                with self.transport.connections_lock:
+                    self.transport.stats['messages_sent'] += len(batch)
+                    self.transport.stats['bytes_sent'] += len(data)
+                return
+            except socket.timeout as e:
+                # a stalled peer would stall the next batch too, so give up on this one
+                self.stats['timeouts'] += 1
+                with self.transport.connections_lock:
+                    self.transport.stats['send_timeouts'] += 1
+                error = e
+                reused = False
+            except OSError as e:
+                error = e
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+            if not reused:
+                break
+            # earlier batches on the broken connection may be lost as well
+            batch[0].send_full_vector()
+            data = encode_frame(encode_batch(batch, self.transport.wire_format))
+        self._dropped(len(batch))
+        with self.condition:
+            if self.pending:
+                self.pending[0].send_full_vector()
+            else:
+                self.resync = True
+        if self.transport.running:
+            self.transport.logger.error(f"Error sending {len(batch)} messages to port {self.peer_port}: {error}")
+
+# Names of the segments this process created, which stay registered with
+# its resource tracker when it also attaches to them
+_created_segments = set()
+
+def _attach_shared_memory(name):
+    """Attach to an existing segment without registering it for cleanup here"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before Python 3.13 every attachment is registered with the resource
+    # tracker, which would unlink the owner's segment when this process
+    # exits, so take this one segment back out of it
+    memory = shared_memory.SharedMemory(name=name)
+    if name not in _created_segments:
+        resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
+
+class SharedMemoryRing:
+    """Lock-free single-producer/single-consumer ring of fixed-size messages.
+
+    The producer only ever writes the head index and the consumer only ever
+    writes the tail index. Both are free-running 64-bit counters on their own
+    cache lines, so neither side needs a lock.
+
+    Python has no memory barriers, so this relies on the CPU: aligned
+    8-byte stores must be atomic, and one process's stores must become
+    visible to the other in the order they were made. x86-64 guarantees
+    both. As a check that does not depend on the index, every slot ends
+    with a sequence number, written after the message: the message in
+    slot n is complete when the number is n + 1. The consumer reads the
+    number before and after the message and stops at a slot that is not
+    yet complete, or that was overwritten while it read, leaving it for
+    the next poll.
+    """
+    INDEX = struct.Struct('Q')
+    HEAD_OFFSET = 0
+    TAIL_OFFSET = 64
+    DATA_OFFSET = 128
+    # the sequence number follows the message at the next aligned offset
+    SEQUENCE_OFFSET = (MESSAGE_STRUCT.size + 7) // 8 * 8
+    SLOT_SIZE = SEQUENCE_OFFSET + INDEX.size
+
+    def __init__(self, name, capacity=1024, create=False):
+        self.name = name
+        self.owner = create
+        if create:
+            size = self.DATA_OFFSET + capacity * self.SLOT_SIZE
+            try:
+                self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # left behind by a run that did not shut down cleanly
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _created_segments.add(name)
+            self.INDEX.pack_into(self.memory.buf, self.HEAD_OFFSET, 0)
+            self.INDEX.pack_into(self.memory.buf, self.TAIL_OFFSET, 0)
+        else:
+            self.memory = _attach_shared_memory(name)
+        self.buffer = self.memory.buf
+        self.capacity = (len(self.buffer) - self.DATA_OFFSET) // self.SLOT_SIZE
+
+    def push(self, message):
+        """Write a message into the ring; returns False if the ring is full"""
+        (head,) = self.INDEX.unpack_from(self.buffer, self.HEAD_OFFSET)
+        (tail,) = self.INDEX.unpack_from(self.buffer, self.TAIL_OFFSET)
+        if head - tail >= self.capacity:
+            return False
+        offset = self.DATA_OFFSET + (head % self.capacity) * self.SLOT_SIZE
+        MESSAGE_STRUCT.pack_into(
+            self.buffer, offset, message.sender_id, message.logical_clock, message.timestamp, message.message_id
+        )
+        # mark the slot complete, then publish it, only after it has been written
+        self.INDEX.pack_into(self.buffer, offset + self.SEQUENCE_OFFSET, head + 1)
+        self.INDEX.pack_into(self.buffer, self.HEAD_OFFSET, head + 1)
+        return True
+
+    def pop_all(self, limit=None):
+        """Read every message currently in the ring, or at most limit of them"""
+        (head,) = self.INDEX.unpack_from(self.buffer, self.HEAD_OFFSET)
+        (tail,) = self.INDEX.unpack_from(self.buffer, self.TAIL_OFFSET)
+        if limit is not None:
+            head = min(head, tail + limit)
+        messages = []
+        while tail < head:
+            offset = self.DATA_OFFSET + (tail % self.capacity) * self.SLOT_SIZE
+            sequence = offset + self.SEQUENCE_OFFSET
+            if self.INDEX.unpack_from(self.buffer, sequence)[0] != tail + 1:
+                break
+            message = Message.from_fields(*MESSAGE_STRUCT.unpack_from(self.buffer, offset))
+            if self.INDEX.unpack_from(self.buffer, sequence)[0] != tail + 1:
+                break
+            messages.append(message)
+            tail += 1
+        # free the slots only after they have been read
+        self.INDEX.pack_into(self.buffer, self.TAIL_OFFSET, tail)
+        return messages
+
+    def close(self):
+        """Detach from the ring, destroying it if this side created it"""
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+            _created_segments.discard(self.name)
+
+class SharedMemoryTransport:
+    """Sends messages through shared-memory rings between machines on one host.
+
+    Every machine owns one inbound ring per peer and attaches lazily to its
+    peers' rings for sending. There are no receive threads: pending messages
+    are picked up by poll() at the start of each clock cycle. Messages always
+    use the fixed binary layout, whatever the wire format.
+    """
+    def __init__(self, machine_id, num_machines, name_prefix, on_message, logger, capacity=1024):
+        self.machine_id = machine_id
+        self.name_prefix = name_prefix
+        self.on_message = on_message
+        self.logger = logger
+        self.stats = {
+            'connects': 0,
+            'reconnects': 0,
+            'messages_sent': 0,
+            'bytes_sent': 0,
+            'send_dropped': 0,
+        }
+
+        # Rings are created by their consumer so they exist before peers send
+        self.inbound = [
+            SharedMemoryRing(self._ring_name(peer_id, machine_id), capacity, create=True)
+            for peer_id in range(num_machines) if peer_id != machine_id
+        ]
+        self.outbound = {}
+
+    def _ring_name(self, sender_id, receiver_id):
+        return f"{self.name_prefix}_{sender_id}_{receiver_id}"
+
+    def start(self):
+        """Inbound rings are ready as soon as they are created"""
+        pass
+
+    def wait_ready(self, peer_ids, timeout, is_running):
+        """Wait until every peer has created the ring this machine sends into.
+
+        A peer creates its inbound rings before anything else, so being able
+        to attach to them is its announcement that it is up.
+        """
+        deadline = time.monotonic() + timeout
+        missing = set(peer_ids)
+        while is_running():
+            for peer_id in list(missing):
+                try:
+                    self.outbound[peer_id] = SharedMemoryRing(self._ring_name(self.machine_id, peer_id))
+                    self.stats['connects'] += 1
+                    missing.discard(peer_id)
+                except FileNotFoundError:
+                    pass
+            if not missing or time.monotonic() >= deadline:
+                break
+            time.sleep(0.005)
+        return missing
+
+    def poll(self, limit=None):
+        """Hand the messages waiting in the inbound rings to on_message.
+
+        With a limit, messages beyond it stay in their rings, so a full
+        receiver pushes back on its senders instead of growing its queue.
+        """
+        for ring in self.inbound:
+            messages = ring.pop_all(limit)
+            for message in messages:
+                self.on_message(message)
+            if limit is not None:
+                limit -= len(messages)
+                if limit <= 0:
+                    break
+
+    def send(self, peer_id, message):
+        """Write a message into the ring read by the peer"""
+        try:
+            ring = self.outbound.get(peer_id)
+            if ring is None:
+                ring = SharedMemoryRing(self._ring_name(self.machine_id, peer_id))
+                self.outbound[peer_id] = ring
+                self.stats['connects'] += 1
+            pushed = ring.push(message)
+        except Exception as e:
+            self.logger.error(f"Error sending message to Machine {peer_id}: {e}")
+            return
+
+        if pushed:
+            self.stats['messages_sent'] += 1
+            self.stats['bytes_sent'] += MESSAGE_STRUCT.size
+        else:
+            self.stats['send_dropped'] += 1
+            self.logger.error(f"Dropped message to Machine {peer_id}: ring is full")
+
+    def close(self):
+        """Detach from all rings and destroy the inbound ones"""
+        for ring in self.outbound.values():
+            ring.close()
+        self.outbound.clear()
+        for ring in self.inbound:
+            ring.close()
+        self.inbound = []
+
+class InMemoryNetwork:
+    """Carries messages between machines in one process, for tests.
+
+    A send only encodes the message into the channel from sender to
+    receiver; nothing arrives until deliver() is called, so the caller
+    decides the order of arrivals. Each channel is first in, first out,
+    like a TCP connection. Pass connect as a VirtualMachine's transport.
+    """
+    def __init__(self):
+        self.transports = {}
+        # (sender id, receiver id) -> encoded batches not yet delivered
+        self.channels = {}
+
+    def connect(self, machine):
+        """Create and attach the transport of a machine"""
+        transport = InMemoryTransport(self, machine.machine_id, machine._receive, machine.wire_format)
+        self.transports[machine.machine_id] = transport
+        return transport
+
+    def pending(self):
+        """The (sender id, receiver id) channels with messages in flight"""
+        return [channel for channel, batches in self.channels.items() if batches]
+
+    def deliver(self, sender_id, receiver_id):
+        """Deliver the oldest message in flight on a channel; returns the delivered messages"""
+        messages = decode_batch(self.channels[(sender_id, receiver_id)].popleft())
+        receiver = self.transports.get(receiver_id)
+        if receiver is not None and receiver.running:
+            for message in messages:
+                receiver.on_message(message)
+        return messages
+
+    def deliver_all(self):
+        """Deliver everything in flight, channel by channel; returns the number of messages"""
+        delivered = 0
+        for sender_id, receiver_id in self.pending():
+            while self.channels[(sender_id, receiver_id)]:
+                delivered += len(self.deliver(sender_id, receiver_id))
+        return delivered
+
+class InMemoryTransport:
+    """A machine's end of an InMemoryNetwork"""
+    def __init__(self, network, machine_id, on_message, wire_format='binary'):
+        self.network = network
+        self.machine_id = machine_id
+        self.on_message = on_message
+        self.wire_format = wire_format
+        self.running = False
+        self.stats = {'connects': 0, 'reconnects': 0, 'messages_sent': 0, 'bytes_sent': 0}
+
+    def start(self):
+        self.running = True
+
+    def wait_ready(self, peer_ids, timeout, is_running):
+        """Peers are ready as soon as their transports are attached"""
+        return set(peer_ids) - set(self.network.transports)
+
+    def send(self, peer_id, message):
+        """Encode a message into the channel to a peer, as it would go on the wire"""
+        channel = self.network.channels.get((self.machine_id, peer_id))
+        if channel is None:
+            channel = self.network.channels[(self.machine_id, peer_id)] = deque()
+            self.stats['connects'] += 1
+        data = encode_batch([message], self.wire_format)
+        channel.append(data)
+        self.stats['messages_sent'] += 1
+        self.stats['bytes_sent'] += len(data)
+
+    def poll(self, limit=None):
+        """Messages arrive when the network delivers them"""
+        pass
+
+    def close(self):
+        self.running = False
+
+class NullTransport:
+    """A transport that only counts its sends, for benchmarks and tests of a machine on its own"""
+    def __init__(self):
+        self.stats = {'connects': 0, 'reconnects': 0, 'messages_sent': 0, 'bytes_sent': 0}
+
+    def start(self):
+        pass
+
+    def wait_ready(self, peer_ids, timeout, is_running):
+        return set()
+
+    def send(self, peer_id, message):
+        self.stats['messages_sent'] += 1
+
+    def poll(self, limit=None):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,250 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import subprocess
+import tempfile
+import unittest
+import logging
+from message import Message
+from transport import SharedMemoryRing, SharedMemoryTransport, SocketTransport, SEND_DISPATCH_MODES, free_port_base
+from virtual_machine import VirtualMachine
+
+# transport.py tests
+class TestSharedMemoryRing(unittest.TestCase):
+    def setUp(self):
+        """Create a ring and attach to it as the producer"""
+        name = f"lctest_{os.getpid()}"
+        self.consumer = SharedMemoryRing(name, capacity=4, create=True)
+        self.producer = SharedMemoryRing(name)
+
+    def tearDown(self):
+        """Detach the producer and destroy the ring"""
+        self.producer.close()
+        self.consumer.close()
+
+    def test_push_pop(self):
+        """Test messages come out of the ring in order"""
+        for i in range(3):
+            self.assertTrue(self.producer.push(Message(1, i)))
+        messages = self.consumer.pop_all()
+
+        self.assertEqual([m.logical_clock for m in messages], [0, 1, 2])
+        self.assertEqual(self.consumer.pop_all(), [])
+
+    def test_full_ring(self):
+        """Test that a full ring rejects messages until it is drained"""
+        for i in range(4):
+            self.assertTrue(self.producer.push(Message(1, i)))
+        self.assertFalse(self.producer.push(Message(1, 4)))
+
+        self.assertEqual(len(self.consumer.pop_all()), 4)
+        # indices keep counting past the capacity
+        self.assertTrue(self.producer.push(Message(1, 5)))
+        self.assertEqual(self.consumer.pop_all()[0].logical_clock, 5)
+
+    def test_pop_limit(self):
+        """Test that messages beyond the limit stay in the ring"""
+        for i in range(3):
+            self.producer.push(Message(1, i))
+
+        self.assertEqual([m.logical_clock for m in self.consumer.pop_all(2)], [0, 1])
+        self.assertEqual([m.logical_clock for m in self.consumer.pop_all()], [2])
+
+    def test_incomplete_slot(self):
+        """Test that a slot published before its sequence number is left for the next read"""
+        self.producer.push(Message(1, 0))
+        # publish a second slot whose message and sequence number are not visible yet
+        SharedMemoryRing.INDEX.pack_into(self.producer.buffer, SharedMemoryRing.HEAD_OFFSET, 2)
+        self.assertEqual([m.logical_clock for m in self.consumer.pop_all()], [0])
+
+        offset = SharedMemoryRing.DATA_OFFSET + SharedMemoryRing.SLOT_SIZE
+        SharedMemoryRing.INDEX.pack_into(self.producer.buffer, offset + SharedMemoryRing.SEQUENCE_OFFSET, 2)
+        self.assertEqual(len(self.consumer.pop_all()), 1)
+
+    def test_attach_from_other_process(self):
+        """Test that a producer process exiting leaves the consumer's ring in place"""
+        script = ("import sys; from message import Message; from transport import SharedMemoryRing; "
+                  "ring = SharedMemoryRing(sys.argv[1]); ring.push(Message(2, 9)); ring.close()")
+        result = subprocess.run([sys.executable, "-c", script, self.consumer.name],
+                                capture_output=True, text=True, timeout=30)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        # the child's resource tracker would have warned about, and unlinked, a tracked segment
+        self.assertNotIn("leaked", result.stderr)
+        self.assertEqual([m.logical_clock for m in self.consumer.pop_all()], [9])
+        SharedMemoryRing(self.consumer.name).close()
+
+class TestSharedMemoryTransport(unittest.TestCase):
+    def test_send_and_poll(self):
+        """Test sending between machines with shared-memory transports"""
+        # the port base only names the rings, so concurrent runs need different ones
+        port_base = free_port_base(3)
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        machines = [
+            VirtualMachine(i, 3, 'localhost', port_base, transport='shared_memory', log_dir=log_dir)
+            for i in range(3)
+        ]
+        try:
+            sender, receiver = machines[0], machines[1]
+            message = Message(sender.machine_id, 7)
+            sender._send_message(receiver.port, message)
+
+            # nothing arrives until the receiver polls
+            self.assertTrue(receiver.message_queue.empty())
+            receiver.transport.poll()
+
+            self.assertEqual(receiver.last_received_message.sender_id, sender.machine_id)
+            self.assertEqual(receiver.last_received_message.logical_clock, 7)
+            self.assertEqual(receiver.last_received_message.timestamp, message.timestamp)
+            self.assertEqual(sender.transport.stats['messages_sent'], 1)
+        finally:
+            for vm in machines:
+                vm.stop()
+
+    def test_full_ring(self):
+        """Test that sends into a full ring are counted as send drops in the metrics"""
+        port_base = free_port_base(2)
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        machines = [
+            VirtualMachine(i, 2, 'localhost', port_base, transport='shared_memory', log_dir=log_dir, metrics=True)
+            for i in range(2)
+        ]
+        try:
+            sender, receiver = machines
+            capacity = receiver.transport.inbound[0].capacity
+            for clock in range(capacity + 3):
+                sender._send_message(receiver.port, Message(sender.machine_id, clock))
+
+            self.assertEqual(sender.transport.stats['messages_sent'], capacity)
+            self.assertEqual(sender.transport.stats['send_dropped'], 3)
+            self.assertIn('lc_send_dropped_total{machine="0"} 3', sender.render_metrics().splitlines())
+        finally:
+            for vm in machines:
+                vm.stop()
+
+class TestQueuedDispatch(unittest.TestCase):
+    def setUp(self):
+        self.port_base = free_port_base(3)
+        self.logger = logging.getLogger("transport_tests")
+        self.logger.disabled = True
+        self.transports = []
+
+    def tearDown(self):
+        for transport in self.transports:
+            transport.close()
+
+    def transport(self, machine_id, on_message=lambda message: None, dispatch='queued', **options):
+        transport = SocketTransport(machine_id, 'localhost', self.port_base, on_message, self.logger,
+                                    dispatch=dispatch, **options)
+        transport.start()
+        self.transports.append(transport)
+        return transport
+
+    def wait_for(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.005)
+
+    def test_delivery_order(self):
+        """Test that queued messages reach the peer in the order they were sent"""
+        received = []
+        self.transport(1, received.append)
+        sender = self.transport(0)
+        for i in range(500):
+            sender.send(1, Message(0, i, i))
+
+        self.wait_for(lambda: len(received) == 500)
+        self.assertEqual([message.logical_clock for message in received], list(range(500)))
+        self.assertEqual(sender.stats['messages_sent'], 500)
+        self.assertEqual(sender.peer_stats(), {1: {'messages_sent': 500, 'dropped': 0, 'timeouts': 0}})
+
+    def test_dead_peer(self):
+        """Test that messages to a peer that is not listening are dropped and counted"""
+        sender = self.transport(0)
+        for i in range(10):
+            sender.send(2, Message(0, i, i))
+
+        self.wait_for(lambda: sender.stats['send_dropped'] == 10)
+        self.assertEqual(sender.peer_stats()[2]['dropped'], 10)
+        self.assertEqual(sender.stats['messages_sent'], 0)
+
+    def test_resync_after_loss(self):
+        """Test that the first message after a lost one carries the whole vector clock"""
+        for dispatch in SEND_DISPATCH_MODES:
+            self.port_base = free_port_base(2)
+            sender = self.transport(0, dispatch=dispatch)
+            lost = Message(0, 1, 0, [(0, 1)])
+            lost.vector_clock = (1, 0)
+            sender.send(1, lost)
+            self.wait_for(lambda: sender.stats['send_dropped'] or sender.resync_peers)
+
+            received = []
+            self.transport(1, received.append)
+            message = Message(0, 3, 1, [(0, 3)])
+            message.vector_clock = (3, 2)
+            sender.send(1, message)
+            self.wait_for(lambda: received)
+            self.assertEqual(received[0].vector_delta, [(0, 3), (1, 2)], dispatch)
+
+    def test_restarted_peer(self):
+        """Test that no message is lost on a pooled connection the peer closed when it restarted"""
+        for dispatch in SEND_DISPATCH_MODES:
+            self.port_base = free_port_base(2)
+            received = []
+            receiver = self.transport(1, received.append)
+            sender = self.transport(0, dispatch=dispatch)
+            sender.send(1, Message(0, 1, 0))
+            self.wait_for(lambda: received)
+
+            receiver.close()
+            restarted = []
+            self.transport(1, restarted.append)
+            sender.send(1, Message(0, 2, 1))
+            self.wait_for(lambda: restarted)
+            self.assertEqual([message.logical_clock for message in restarted], [2], dispatch)
+            self.assertEqual(sender.stats['reconnects'], 1, dispatch)
+            self.assertEqual(sender.stats['send_dropped'], 0, dispatch)
+
+    def test_stalled_peer(self):
+        """Test that a peer that stops reading never holds up the caller"""
+        # a listener that accepts connections but never reads from them
+        stalled = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        stalled.bind(('localhost', self.port_base + 1))
+        stalled.listen(5)
+        self.addCleanup(stalled.close)
+
+        received = []
+        self.transport(2, received.append)
+        sender = self.transport(0, send_queue_limit=1000, send_timeout=0.5)
+        # keep both peers busy until the stalled one's buffers are full and a send times out
+        slowest, sent, deadline = 0.0, 0, time.monotonic() + 10.0
+        while not sender.stats['send_timeouts']:
+            self.assertLess(time.monotonic(), deadline)
+            for i in range(50):
+                started = time.perf_counter()
+                sender.send(1, Message(0, sent, sent))
+                sender.send(2, Message(0, sent, sent))
+                slowest = max(slowest, time.perf_counter() - started)
+                sent += 1
+            time.sleep(0.001)
+        # far less than the stalled peer's send timeout, even on a busy machine
+        self.assertLess(slowest, 0.25)
+
+        # the stalled peer times out and drops, while the healthy one keeps up
+        self.wait_for(lambda: len(received) == sent)
+        self.assertGreater(sender.stats['send_dropped'], 0)
+        self.assertEqual(sender.stats['send_timeouts'], sender.peer_stats()[1]['timeouts'])
+        self.assertEqual(sender.peer_stats()[2]['dropped'], 0)
+
+        # closing waits at most one send timeout for the stalled peer
+        started = time.monotonic()
+        sender.close()
+        self.assertLess(time.monotonic() - started, 1.5)
+
+if __name__ == "__main__":
+    unittest.main()
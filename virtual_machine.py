@@ -1,67 +1,260 @@
+import os
 import random
-import socket
-import threading
 import time
 import queue
-import logging
 from message import Message
+from transport import SocketTransport, SharedMemoryTransport, SEND_QUEUE_LIMIT, SEND_TIMEOUT
+from scheduler import TickScheduler
+from metrics import MachineMetrics, MetricsServer, write_metrics
+from event_store import EventStore
+from event_log import (EventLog, LOG_EXTENSIONS, EVENT_RECEIVE, EVENT_RECEIVE_BATCH,
+                       EVENT_SEND, EVENT_BROADCAST, EVENT_INTERNAL, EVENT_DELIVER)
+
+# What a machine does with an incoming message when its queue is full:
+#   block     wait for room, pushing back on the sender
+#   drop      discard the message
+#   coalesce  merge it into the newest queued message, keeping the larger
+#             logical clock, which is all the Lamport update needs
+BACKPRESSURE_POLICIES = ('block', 'drop', 'coalesce')
+
+class MessageQueue(queue.Queue):
+    """A machine's queue of received messages, holding at most limit messages if given.
+
+    A blocking queue is bounded as a plain Queue. With drop or coalesce
+    the Queue itself is unbounded, so put never waits, and _put, which
+    Queue.put calls holding the queue's lock, applies the limit against
+    the queue as it is, however the clock cycle drains it. A coalesced
+    message keeps the messages merged into it in coalesced, so their
+    receipt can still be logged.
+    """
+    def __init__(self, limit=None, policy='block'):
+        super().__init__((limit or 0) if policy == 'block' else 0)
+        self.limit = limit or None
+        self.policy = policy
+        self.stats = {'dropped': 0, 'coalesced': 0}
+
+    def _put(self, message):
+        if self.limit is None or len(self.queue) < self.limit:
+            self.queue.append(message)
+        elif self.policy == 'drop':
+            self.stats['dropped'] += 1
+        else:
+            newest = self.queue[-1]
+            if message.vector_clock is not None and newest.vector_clock is not None:
+                merged = tuple(map(max, message.vector_clock, newest.vector_clock))
+                message.vector_clock = newest.vector_clock = merged
+            # the message with the larger clock stays, carrying the other
+            kept, merged = (message, newest) if message.logical_clock > newest.logical_clock else (newest, message)
+            # only the queued message can already carry others
+            carried = newest.coalesced if newest.coalesced is not None else []
+            carried.append(merged)
+            newest.coalesced = None
+            kept.coalesced = carried
+            self.queue[-1] = kept
+            self.stats['coalesced'] += 1
+
+    def count_dropped(self):
+        """Count a message given up on without being put, such as when the machine stops"""
+        with self.mutex:
+            self.stats['dropped'] += 1
+
+# 'lamport' keeps only the scalar logical clock; 'vector' also keeps a full
+# vector clock and sends each peer the entries changed since the last
+# message to it
+CLOCK_MODES = ('lamport', 'vector')
+
+# Defaults for the random workload: clock rates are drawn from this range of
+# ticks per second, and a tick with no message is an internal event with
+# this probability, otherwise a send to one peer or to all of them, chosen
+# uniformly. With 3 machines this is the original 1-in-4 choice of each
+CLOCK_RATE_RANGE = (1, 6)
+INTERNAL_EVENT_PROBABILITY = 0.25
 
 class VirtualMachine:
-    def __init__(self, machine_id, num_machines, host, port_base):
+    def __init__(self, machine_id, num_machines, host, port_base, wire_format='binary', rng=None, log_dir='.',
+                 transport='socket', tick_policy='skip', stats_interval=10,
+                 drain_limit=1, queue_limit=None, backpressure='block', log_format='text',
+                 startup_timeout=10.0, clock_mode='lamport', clock_rate_range=CLOCK_RATE_RANGE,
+                 internal_event_probability=INTERNAL_EVENT_PROBABILITY, metrics=False, metrics_port=None,
+                 event_store=False, send_dispatch='inline', send_queue_limit=SEND_QUEUE_LIMIT,
+                 send_timeout=SEND_TIMEOUT, clock=time.monotonic, sleep=time.sleep, log_clock=None,
+                 log_background=True):
         self.machine_id = machine_id
         self.num_machines = num_machines
         self.logical_clock = 0
         self.host = host
+        # 'binary' for the compact struct encoding, 'json' for debugging
+        self.wire_format = wire_format
+        # 'socket' for TCP, 'shared_memory' for rings between same-host
+        # machines, or a function that creates the transport for a machine,
+        # such as InMemoryNetwork.connect in tests
+        self.transport_type = transport
         # for debugging
         self.last_received_message = None
         
-        # Determine clock rate (1-6 ticks per second)
-        self.clock_rate = random.randint(1, 6)
+        # Source of all random choices, seedable for reproducible runs
+        self.rng = rng if rng is not None else random.Random()
+        
+        # Determine clock rate (1-6 ticks per second by default)
+        low, high = clock_rate_range
+        if not 1 <= low <= high:
+            raise ValueError(f"Invalid clock rate range: {clock_rate_range}")
+        self.clock_rate = self.rng.randint(low, high)
         self.cycle_time = 1.0 / self.clock_rate
+        if not 0 <= internal_event_probability <= 1:
+            raise ValueError(f"Invalid internal event probability: {internal_event_probability}")
+        self.internal_event_probability = internal_event_probability
+        
+        # Pace ticks against absolute deadlines; tick_policy decides what
+        # happens to ticks missed by a slow cycle (skip, catch_up or stretch).
+        # clock and sleep can be replaced to run the machine in fake time
+        self.clock = clock
+        self.scheduler = TickScheduler(self.cycle_time, tick_policy, clock, sleep)
+        self.next_report = None
+        # seconds between scheduler stats lines in the log
+        self.stats_interval = stats_interval
+        
+        # Set up message queue, bounded to queue_limit messages if given
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.message_queue = MessageQueue(queue_limit, backpressure)
+        self.queue_limit = queue_limit or None
+        # what to do with a message when the queue is full
+        self.backpressure = backpressure
+        # messages processed per tick, or None to drain the whole queue
+        self.drain_limit = drain_limit
+        self.queue_stats = self.message_queue.stats
         
-        # Set up message queue
-        self.message_queue = queue.Queue()
+        # Id of the next message this machine sends; with the sender's id it
+        # ties a send to its receipts in the logs
+        self.next_message_id = 0
         
-        # Set up networking
+        # Vector clock mode keeps one entry per machine next to the scalar
+        # clock. Deltas rely on each peer receiving our messages in order,
+        # so we remember the vector last sent to each peer and the vector
+        # last heard from each sender. Every transport keeps the order, but
+        # a socket send can fail or be dropped; the first message to a peer
+        # after a lost one then carries the whole vector (see PeerSender)
+        if clock_mode not in CLOCK_MODES:
+            raise ValueError(f"Unknown clock mode: {clock_mode}")
+        if clock_mode == 'vector' and transport == 'shared_memory':
+            raise ValueError("Vector clocks need variable-size messages, which the shared_memory transport does not carry")
+        self.clock_mode = clock_mode
+        self.vector_clock = [0] * num_machines if clock_mode == 'vector' else None
+        self.sent_vectors = {}
+        self.received_vectors = {}
+        
+        # Set up networking; with 'queued' send dispatch the clock cycle
+        # only queues outgoing messages and a thread per peer sends them
+        if send_dispatch == 'queued' and transport == 'shared_memory':
+            raise ValueError("Queued send dispatch is for the socket transport; shared memory sends never block")
+        self.send_dispatch = send_dispatch
+        self.send_queue_limit = send_queue_limit
+        self.send_timeout = send_timeout
+        self.port_base = port_base
         self.port = port_base + machine_id
         self.peers = []
         for i in range(num_machines):
             if i != machine_id:
                 self.peers.append(port_base + i)
         
-        # Set up logging
-        log_filename = f"machine_{machine_id}.log"
-        self.logger = logging.getLogger(f"Machine-{machine_id}")
-        self.logger.setLevel(logging.INFO)
-        handler = logging.FileHandler(log_filename, mode='w')
-        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
-        self.logger.addHandler(handler)
+        # Set up logging; 'text' for the readable line format, or 'csv'/'binary'.
+        # log_clock, in seconds since the epoch, stamps the log and event
+        # store instead of the real time, and with log_background False
+        # the log is only written when flushed or closed, not by a thread
+        self.log_format = log_format
+        self.log_clock = log_clock
+        self.log_background = log_background
+        self.logger = self._setup_logging(
+            os.path.join(log_dir, f"machine_{machine_id}.{LOG_EXTENSIONS[log_format]}")
+        )
+        # Every event but free-form lines also goes to machine_N.evt, a
+        # memory-mappable columnar file with nanosecond timestamps
+        if event_store:
+            self.logger.store = self._setup_event_store(os.path.join(log_dir, f"machine_{machine_id}.evt"))
         
+        # Hot-path histograms, written to machine_N.prom with every stats
+        # line and, with a metrics port, served over HTTP on metrics_port +
+        # machine_id. None when instrumentation is off
+        self.metrics = MachineMetrics() if metrics or metrics_port is not None else None
+        self.metrics_file = os.path.join(log_dir, f"machine_{machine_id}.prom")
+        self.metrics_port = metrics_port
+        self.metrics_server = None
         
-        # Set up socket for receiving messages
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        # Set up the transport for exchanging messages with peers
+        self._setup_network()
         
         # Flag to control the machine's execution
         self.running = False
         
+        # Longest to wait for peers at startup before ticking anyway
+        self.startup_timeout = startup_timeout
+        self.startup_time = None
+        
         # Log initialization
         print(f"Machine {machine_id} initialized with clock rate: {self.clock_rate} ticks/second")
         self.logger.info(f"Machine initialized with clock rate: {self.clock_rate} ticks/second")
     
-    def start(self):
-        """Start the virtual machine's operation"""
+    def _setup_logging(self, log_filename):
+        """Create the machine's event log, written by a background thread"""
+        if self.log_clock is None:
+            return EventLog(log_filename, self.log_format, background=self.log_background)
+        return EventLog(log_filename, self.log_format, clock=self.log_clock, converter=time.gmtime,
+                        background=self.log_background)
+    
+    def _setup_event_store(self, store_filename):
+        """Create the machine's event store, stamped with the monotonic clock"""
+        if self.log_clock is None:
+            return EventStore(store_filename, self.machine_id, self.clock_rate)
+        return EventStore(store_filename, self.machine_id, self.clock_rate,
+                          clock=lambda: round(self.log_clock() * 1e9), wall_offset_ns=0)
+    
+    def _setup_network(self):
+        """Create the transport that carries messages to and from peers"""
+        if callable(self.transport_type):
+            self.transport = self.transport_type(self)
+        elif self.transport_type == 'socket':
+            self.transport = SocketTransport(
+                self.machine_id, self.host, self.port_base, self._receive, self.logger, self.wire_format,
+                self.send_dispatch, self.send_queue_limit, self.send_timeout
+            )
+        elif self.transport_type == 'shared_memory':
+            self.transport = SharedMemoryTransport(
+                self.machine_id, self.num_machines, f"lc{self.port_base}", self._receive, self.logger
+            )
+        else:
+            raise ValueError(f"Unknown transport: {self.transport_type}")
+    
+    def start(self, on_ready=None):
+        """Start the virtual machine's operation.
+
+        on_ready, if given, is called with the measured startup time once
+        the startup barrier has been passed.
+        """
         self.running = True
         
-        # Start listener thread for incoming connections
-        listener_thread = threading.Thread(target=self._listen_for_connections)
-        listener_thread.daemon = True
-        listener_thread.start()
+        # Start accepting messages from peers
+        self.transport.start()
+        if self.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.host, self.metrics_port + self.machine_id, self.render_metrics)
+            self.metrics_server.start()
         
-        # Give time for all machines to start up
-        time.sleep(2)
+        # Wait until every peer is up, or the timeout runs out
+        started = self.clock()
+        peer_ids = [peer - self.port_base for peer in self.peers]
+        missing = self.transport.wait_ready(peer_ids, self.startup_timeout, lambda: self.running)
+        self.startup_time = self.clock() - started
+        if not self.running:
+            return
+        if missing:
+            self.logger.error(
+                f"Startup barrier timed out after {self.startup_time * 1000:.1f} ms, " +
+                f"missing machines: {', '.join(str(peer_id) for peer_id in sorted(missing))}"
+            )
+        else:
+            self.logger.info(f"Startup barrier: all {len(peer_ids)} peers ready after {self.startup_time * 1000:.1f} ms")
+        if on_ready:
+            on_ready(self.startup_time)
         
         # Start the main clock cycle
         self._run_clock_cycle()
@@ -69,116 +262,244 @@ class VirtualMachine:
     def stop(self):
         """Stop the virtual machine's operation"""
         self.running = False
-        self.server_socket.close()
+        self.transport.close()
+        
+        self.logger.info(self.scheduler.summary())
+        self.logger.info(
+            f"Queue stats: dropped: {self.queue_stats['dropped']}, " +
+            f"coalesced: {self.queue_stats['coalesced']}"
+        )
+        stats = self.transport.stats
+        self.logger.info(
+            f"Connection stats: connects: {stats['connects']}, " +
+            f"reconnects: {stats['reconnects']}, " +
+            f"messages sent: {stats['messages_sent']}, " +
+            f"bytes sent: {stats['bytes_sent']}, " +
+            f"send dropped: {stats.get('send_dropped', 0)}"
+        )
+        if self.send_dispatch == 'queued':
+            self.logger.info("Send queue stats: " + "; ".join(
+                f"Machine {peer_id}: sent: {peer['messages_sent']}, dropped: {peer['dropped']}, "
+                f"timeouts: {peer['timeouts']}"
+                for peer_id, peer in self.transport.peer_stats().items()
+            ))
+        if self.metrics is not None:
+            write_metrics(self.metrics_file, self.render_metrics())
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        self.logger.close()
     
-    def _listen_for_connections(self):
-        """Listen for incoming connections from other machines"""
-        while self.running:
+    def render_metrics(self):
+        """The machine's metrics in the Prometheus text exposition format"""
+        stats = self.transport.stats
+        return self.metrics.render(
+            {'machine': self.machine_id},
+            gauges=[
+                ('logical_clock', "Current logical clock", self.logical_clock),
+                ('queue_length', "Messages waiting in the queue", self.message_queue.qsize()),
+                ('clock_rate', "Configured ticks per second", self.clock_rate),
+            ],
+            counters=[
+                ('ticks', "Clock cycles run", self.scheduler.stats['ticks']),
+                ('skipped_ticks', "Ticks skipped after overruns", self.scheduler.stats['skipped']),
+                ('caught_up_ticks', "Ticks run late to catch up after overruns", self.scheduler.stats['caught_up']),
+                ('messages_sent', "Messages sent by the transport", stats['messages_sent']),
+                ('bytes_sent', "Bytes sent by the transport", stats['bytes_sent']),
+                ('send_dropped', "Outgoing messages dropped at a full send queue or failed send",
+                 stats.get('send_dropped', 0)),
+                ('send_timeouts', "Queued sends that timed out on a stalled peer", stats.get('send_timeouts', 0)),
+                ('messages_dropped', "Messages dropped at a full queue", self.queue_stats['dropped']),
+                ('messages_coalesced', "Messages coalesced at a full queue", self.queue_stats['coalesced']),
+            ],
+        )
+    
+    def _receive(self, message):
+        """Queue a message delivered by the transport"""
+        self.last_received_message = message
+        if self.metrics is not None:
+            message.delivered_at = time.perf_counter()
+        if self.vector_clock is not None and message.vector_delta is not None:
+            self._apply_delta(message)
+        self.logger.event(EVENT_DELIVER, message.sender_id, logical_clock=message.logical_clock,
+                          message_id=message.message_id, vector=message.vector_clock)
+        if self.queue_limit is None or self.backpressure != 'block':
+            # a full queue drops or coalesces the message itself
+            self.message_queue.put(message)
+        else:
+            # wait for room, but give up once the machine is stopped
+            while True:
+                try:
+                    self.message_queue.put(message, timeout=0.1)
+                    return
+                except queue.Full:
+                    if not self.running:
+                        self.message_queue.count_dropped()
+                        return
+    
+    def _take_messages(self):
+        """Take up to drain_limit messages from the queue"""
+        messages = []
+        while self.drain_limit is None or len(messages) < self.drain_limit:
             try:
-                client_socket, _ = self.server_socket.accept()
-                handler = threading.Thread(target=self._handle_client, args=(client_socket,))
-                handler.daemon = True
-                handler.start()
-            except Exception as e:
-                if self.running:
-                    self.logger.error(f"Error accepting connection: {e}")
+                messages.append(self.message_queue.get_nowait())
+            except queue.Empty:
+                break
+        return messages
     
-    def _handle_client(self, client_socket):
-        """Handle messages from a connected client"""
-        try:
-            while self.running:
-                data = client_socket.recv(1024)
-                if not data:
-                    break
-                
-                # Process the received message
-                message = Message.from_json(data.decode())
-                self.message_queue.put(message)
-                self.last_received_message = message
-        except Exception as e:
-            if self.running:
-                self.logger.error(f"Error handling client: {e}")
-        finally:
-            client_socket.close()
+    def _new_message(self):
+        """Create a message stamped with the current logical clock and a fresh id"""
+        message = Message(self.machine_id, self.logical_clock, self.next_message_id)
+        self.next_message_id += 1
+        return message
+    
+    def _for_peer(self, message, peer_id):
+        """The message to send a peer; in vector mode, a copy with the entries changed since our last message to it"""
+        if self.vector_clock is None:
+            return message
+        sent = self.sent_vectors.get(peer_id)
+        if sent is None:
+            sent = self.sent_vectors[peer_id] = [0] * self.num_machines
+        delta = []
+        for index, clock in enumerate(self.vector_clock):
+            if clock != sent[index]:
+                delta.append((index, clock))
+                sent[index] = clock
+        copy = Message.from_fields(message.sender_id, message.logical_clock, message.timestamp, message.message_id)
+        copy.vector_delta = delta
+        copy.vector_clock = tuple(self.vector_clock)
+        return copy
+    
+    def _apply_delta(self, message):
+        """Rebuild a message's full vector clock from its sender's last one"""
+        known = self.received_vectors.get(message.sender_id)
+        if known is None:
+            known = self.received_vectors[message.sender_id] = [0] * self.num_machines
+        for index, clock in message.vector_delta:
+            known[index] = clock
+        message.vector_clock = tuple(known)
+    
+    def _vector(self):
+        """A snapshot of the vector clock for the log, or None in Lamport mode"""
+        return None if self.vector_clock is None else tuple(self.vector_clock)
     
     def _send_message(self, peer_port, message):
         """Send a message to a peer machine"""
-        client_socket = None
-        try:
-            client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            client_socket.connect((self.host, peer_port))
-            client_socket.sendall(message.to_json().encode())
-        except Exception as e:
-            self.logger.error(f"Error sending message to port {peer_port}: {e}")
-        finally:
-            if client_socket:
-                client_socket.close()
+        if self.metrics is None:
+            self.transport.send(peer_port - self.port_base, message)
+            return
+        started = time.perf_counter()
+        self.transport.send(peer_port - self.port_base, message)
+        self.metrics.send_seconds.observe(time.perf_counter() - started)
 
     def _run_clock_cycle(self):
         """Run the main clock cycle of the virtual machine"""
+        self.next_report = self.scheduler.clock() + self.stats_interval
         while self.running:
-            cycle_start = time.time()
+            # Wait for this tick's deadline to maintain clock rate
+            self.scheduler.wait()
+            if not self.running:
+                break
+            self.step()
+
+    def step(self):
+        """Run one clock cycle now, without waiting for its deadline"""
+        started = time.perf_counter() if self.metrics is not None else None
+        
+        # Pick up messages from transports without receive threads; when
+        # blocking, leave what does not fit for the senders to wait on
+        room = None
+        if self.queue_limit is not None and self.backpressure == 'block':
+            room = max(0, self.queue_limit - self.message_queue.qsize())
+        self.transport.poll(room)
+        self._tick()
+        if started is not None:
+            self.metrics.tick_duration_seconds.observe(time.perf_counter() - started)
+        self._report_stats()
+    
+    def _report_stats(self):
+        """Log the scheduler stats, and write the metrics, once every stats_interval seconds"""
+        if self.next_report is not None and self.scheduler.clock() >= self.next_report:
+            self.logger.info(self.scheduler.summary())
+            if self.metrics is not None:
+                write_metrics(self.metrics_file, self.render_metrics())
+            self.next_report += self.stats_interval
+
+    def _tick(self):
+        """Perform the work of a single clock cycle"""
+        # Process messages if available
+        if self.metrics is not None:
+            self.metrics.queue_depth.observe(self.message_queue.qsize())
+        messages = self._take_messages()
+        if messages and self.metrics is not None:
+            now = time.perf_counter()
+            for message in messages:
+                if message.delivered_at is not None:
+                    self.metrics.receive_to_process_seconds.observe(now - message.delivered_at)
+        if messages:
+            # Update logical clock according to Lamport's rule, taking the
+            # max over the whole batch
+            received_clock = max(message.logical_clock for message in messages)
+            self.logical_clock = max(self.logical_clock, received_clock) + 1
+            if self.vector_clock is not None:
+                # and the entry-wise max of the vectors, then tick our own entry
+                for message in messages:
+                    if message.vector_clock is not None:
+                        self.vector_clock = list(map(max, self.vector_clock, message.vector_clock))
+                self.vector_clock[self.machine_id] += 1
             
-            # Process a message if available
-            if not self.message_queue.empty():
-                message = self.message_queue.get()
-                
-                # Update logical clock according to Lamport's rule
-                self.logical_clock = max(self.logical_clock, message.logical_clock) + 1
-                
-                # Log the message receipt
-                queue_length = self.message_queue.qsize()
-                self.logger.info(
-                    f"Received message from Machine {message.sender_id}, " +
-                    f"Queue length: {queue_length}, " +
-                    f"Logical clock: {self.logical_clock}"
-                )
+            # Log the message receipt, including messages coalesced into
+            # the ones taken, so every send still has its receipt
+            if self.backpressure == 'coalesce':
+                messages = [merged for message in messages for merged in [message] + (message.coalesced or [])]
+            queue_length = self.message_queue.qsize()
+            if len(messages) == 1:
+                self.logger.event(EVENT_RECEIVE, messages[0].sender_id, queue_length, self.logical_clock,
+                                  message_id=messages[0].message_id, vector=self._vector())
+            else:
+                senders = ", ".join(f"{message.sender_id} (id {message.message_id})" for message in messages)
+                self.logger.event(EVENT_RECEIVE_BATCH, len(messages), queue_length, self.logical_clock, senders,
+                                  vector=self._vector())
+        else:
+            # No message to process, generate random action: an internal
+            # event, or a send to one of the peers or to all of them
+            if not self.peers or self.rng.random() < self.internal_event_probability:
+                action = None
             else:
-                # No message to process, generate random action
-                action = random.randint(1, 4)
+                action = self.rng.randint(1, len(self.peers) + 1)
+            
+            if action is not None and action <= len(self.peers):
+                # Sending is an event, so the clock ticks first and the
+                # message carries the send event's own clock
+                self._tick_own()
+                message = self._new_message()
                 
-                if 1 <= action <= len(self.peers):
-                    # Send message to other machines
-                    message = Message(self.machine_id, self.logical_clock)
-                    
-                    # Send to one particular machine
-                    target = self.peers[action - 1]
-                    self._send_message(target, message)
+                # Send to one particular machine
+                target = self.peers[action - 1]
+                target_id = target - (self.port - self.machine_id)
+                self._send_message(target, self._for_peer(message, target_id))
 
-                    # update logical clock
-                    self.logical_clock += 1
-
-                    # log operation
-                    target_id = target - (self.port - self.machine_id)
-                    self.logger.info(
-                        f"Sent message to Machine {target_id}, " +
-                        f"Logical clock: {self.logical_clock}"
-                    )
-                    
-                elif action == len(self.peers) + 1:
-                    # Send to all other machines
-                    message = Message(self.machine_id, self.logical_clock)
+                # log operation
+                self.logger.event(EVENT_SEND, target_id, logical_clock=self.logical_clock,
+                                  message_id=message.message_id, vector=self._vector())
                 
-                    for peer in self.peers:
-                        self._send_message(peer, message)
-
-                    # update logical clock
-                    self.logical_clock += 1
+            elif action == len(self.peers) + 1:
+                # Send to all other machines
+                self._tick_own()
+                message = self._new_message()
+            
+                for peer in self.peers:
+                    self._send_message(peer, self._for_peer(message, peer - (self.port - self.machine_id)))
 
-                    self.logger.info(
-                        f"Sent message to ALL other machines, " +
-                        f"Logical clock: {self.logical_clock}"
-                    )
-                
-                else:
-                    # Internal event
-                    self.logical_clock += 1
-                    self.logger.info(
-                        f"Internal event, " +
-                        f"Logical clock: {self.logical_clock}"
-                    )
+                self.logger.event(EVENT_BROADCAST, logical_clock=self.logical_clock,
+                                  message_id=message.message_id, vector=self._vector())
             
-            # Calculate sleep time to maintain clock rate
-            elapsed = time.time() - cycle_start
-            sleep_time = max(0, self.cycle_time - elapsed)
-            time.sleep(sleep_time) 
\ No newline at end of file
+            else:
+                # Internal event
+                self._tick_own()
+                self.logger.event(EVENT_INTERNAL, logical_clock=self.logical_clock, vector=self._vector())
+
+    def _tick_own(self):
+        """Advance the clocks for a local event"""
+        self.logical_clock += 1
+        if self.vector_clock is not None:
+            self.vector_clock[self.machine_id] += 1
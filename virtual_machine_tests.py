@@ -1,94 +1,266 @@
+import os
 import unittest
 import threading
 import time
+import random
 from virtual_machine import VirtualMachine
 from message import Message
+from transport import InMemoryNetwork, free_port_base
+from harness import Cluster, ManualClock, ScratchFolder
+from happens_before import analyze_causality
 
-class TestVirtualMachine(unittest.TestCase):
+class TestVirtualMachine(ScratchFolder, unittest.TestCase):
     def setUp(self):
-        """Set up the test environment"""
-        self.host = 'localhost'
-        self.port_base = 9000
+        """Set up machines on an in-memory network in fake time"""
+        super().setUp()
         self.num_machines = 3
-        self.machines = []
-        self.threads = []
-
-        # Create virtual machines
-        for i in range(self.num_machines):
-            vm = VirtualMachine(i, self.num_machines, self.host, self.port_base)
-            self.machines.append(vm)
+        self.cluster = Cluster(self.num_machines, seed=1, log_dir=self.log_dir)
+        self.machines = self.cluster.machines
 
     def tearDown(self):
-        """Clean up the test environment"""
-        for vm in self.machines:
-            vm.stop()
-        for thread in self.threads:
-            thread.join()
+        """Stop the machines"""
+        self.cluster.close()
 
     def test_initialization(self):
         """Test the initialization of virtual machines"""
         for i, vm in enumerate(self.machines):
             self.assertEqual(vm.machine_id, i)
             self.assertEqual(vm.num_machines, self.num_machines)
-            self.assertEqual(vm.host, self.host)
-            self.assertEqual(vm.port, self.port_base + i)
+            self.assertEqual(vm.port, i)
+            self.assertEqual(vm.peers, [j for j in range(self.num_machines) if j != i])
             self.assertTrue(vm.logger)
-            self.assertTrue(vm.server_socket)
+            self.assertIs(self.cluster.network.transports[i], vm.transport)
 
     def test_start_stop(self):
-        """Test starting and stopping virtual machines"""
-        for vm in self.machines:
-            thread = threading.Thread(target=vm.start)
-            self.threads.append(thread)
-            thread.start()
-            time.sleep(1)  # Give some time for the machine to start
-            self.assertTrue(vm.running)
-            vm.stop()
-            thread.join()
-            self.assertFalse(vm.running)
+        """Test that start runs clock cycles at the clock rate until the machine is stopped"""
+        clock = ManualClock()
+
+        def sleep(seconds):
+            clock.sleep(seconds)
+            if vm.logical_clock >= 20:
+                vm.stop()
+
+        vm = VirtualMachine(0, 1, 'memory', 0, log_dir=self.log_dir, transport=InMemoryNetwork().connect,
+                            clock=clock, sleep=sleep)
+        vm.start()
+
+        # with no peers every tick is an internal event, the first one at time 0
+        self.assertFalse(vm.running)
+        self.assertEqual(vm.startup_time, 0.0)
+        self.assertEqual(vm.logical_clock, 20)
+        self.assertAlmostEqual(clock.now, 20 / vm.clock_rate)
+        self.assertEqual(vm.scheduler.stats['jitter_max'], 0.0)
 
     def test_message_sending(self):
         """Test sending and receiving messages between virtual machines"""
         sender = self.machines[0]
         receiver = self.machines[1]
 
-        sender_thread = threading.Thread(target=sender.start)
-        receiver_thread = threading.Thread(target=receiver.start)
-        self.threads.extend([sender_thread, receiver_thread])
-
-        sender_thread.start()
-        receiver_thread.start()
-
-        # wait for machines to start
-        time.sleep(2)
-
         # assert queues are empty
         self.assertTrue(sender.message_queue.empty())
         self.assertTrue(receiver.message_queue.empty())
 
-        # send a message from sender to receiver
-        sender_time = sender.logical_clock
-        message = Message(sender.machine_id, sender_time)
-        sender._send_message(receiver.port, message)
-
-         # stop the sender (no more sends)
-        sender.stop()
-        sender_thread.join()
-
-        # wait for message to be received
-        time.sleep(1)
+        # send a message from sender to receiver; it stays in flight until delivered
+        sender_time = 7
+        sender._send_message(receiver.port, Message(sender.machine_id, sender_time))
+        self.assertIsNone(receiver.last_received_message)
+        self.assertEqual(self.cluster.network.pending(), [(0, 1)])
+        self.cluster.network.deliver(0, 1)
 
         # test message received
         self.assertIsNotNone(receiver.last_received_message)
         # test message is correct
         self.assertEqual(receiver.last_received_message.sender_id, sender.machine_id)
         self.assertEqual(receiver.last_received_message.logical_clock, sender_time)
-        # test update invariant (max of current clock, received clock)
-        self.assertGreaterEqual(receiver.logical_clock, receiver.last_received_message.logical_clock)
-        self.assertGreaterEqual(receiver.logical_clock, sender_time)
 
-        sender.stop()
-        receiver.stop()
+        # test update invariant (max of current clock, received clock) + 1
+        self.cluster.step(1)
+        self.assertEqual(receiver.logical_clock, sender_time + 1)
+        self.assertEqual(self.cluster.violations, [])
+
+    def test_coalesced_receipts(self):
+        """Test that coalesced messages are logged as received, so every send is matched"""
+        log_dir = os.path.join(self.log_dir, "coalesce")
+        os.mkdir(log_dir)
+        cluster = Cluster(3, seed=4, log_dir=log_dir, log_format='csv', queue_limit=1, backpressure='coalesce',
+                          drain_limit=None)
+        cluster.run_random(300, random.Random(2), deliver_probability=0.7)
+        # stop sending, then deliver and take everything still in flight
+        for machine in cluster.machines:
+            machine.internal_event_probability = 1
+        cluster.network.deliver_all()
+        for machine_id in range(3):
+            cluster.step(machine_id)
+        cluster.close()
+
+        self.assertGreater(sum(machine.queue_stats['coalesced'] for machine in cluster.machines), 0)
+        _, summary = analyze_causality(log_dir)
+        self.assertEqual(summary['matched_receipts'], summary['expected_receipts'])
+        self.assertEqual(summary['unmatched_receipts'], 0)
+
+class TestSocketTransport(ScratchFolder, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.port_base = free_port_base(3)
+        self.machines = [VirtualMachine(i, 3, 'localhost', self.port_base, log_dir=self.log_dir) for i in range(3)]
+
+    def tearDown(self):
+        for vm in self.machines:
+            vm.stop()
+
+    def test_connection_reuse(self):
+        """Test that repeated sends to a peer reuse one pooled connection"""
+        sender = self.machines[0]
+        receiver = self.machines[1]
+
+        # only the listener is needed on the receiving side
+        receiver.transport.start()
+
+        for _ in range(5):
+            sender._send_message(receiver.port, Message(sender.machine_id, 0))
+
+        stats = sender.transport.stats
+        self.assertEqual(stats['connects'], 1)
+        self.assertEqual(stats['reconnects'], 0)
+        self.assertEqual(stats['messages_sent'], 5)
+        self.assertGreater(stats['bytes_sent'], 0)
+        self.assertIn(receiver.port, sender.transport.connections)
+
+class MachineThreads(ScratchFolder, unittest.TestCase):
+    """Machines on sockets, each started in a thread of its own"""
+    num_machines = 3
+
+    def setUp(self):
+        super().setUp()
+        self.machines = []
+        self.threads = []
+
+    def tearDown(self):
+        for vm in self.machines:
+            vm.stop()
+        for thread in self.threads:
+            thread.join()
+
+    def start_machines(self, count, **options):
+        """Create num_machines machines and start the first count of them"""
+        ready = threading.Barrier(count + 1, timeout=5)
+        port_base = free_port_base(self.num_machines)
+        for i in range(self.num_machines):
+            vm = VirtualMachine(i, self.num_machines, 'localhost', port_base, log_dir=self.log_dir, **options)
+            self.machines.append(vm)
+        for vm in self.machines[:count]:
+            thread = threading.Thread(target=vm.start, kwargs={'on_ready': lambda startup_time: ready.wait()})
+            self.threads.append(thread)
+            thread.start()
+        ready.wait()
+
+class TestStartupBarrier(MachineThreads):
+    def test_all_peers_ready(self):
+        """Test that machines start ticking as soon as every peer is up"""
+        self.start_machines(self.num_machines)
+
+        for vm in self.machines:
+            self.assertLess(vm.startup_time, 1.0)
+            self.assertEqual(vm.transport.ready_peers, {i for i in range(self.num_machines) if i != vm.machine_id})
+
+    def test_timeout(self):
+        """Test that a machine starts anyway once the timeout runs out"""
+        self.start_machines(1, startup_timeout=0.2)
+
+        self.assertGreaterEqual(self.machines[0].startup_time, 0.2)
+        self.assertTrue(self.machines[0].running)
+
+class TestQueuedDispatch(MachineThreads):
+    def test_queued_dispatch(self):
+        """Test that machines with queued send dispatch exchange messages"""
+        self.start_machines(self.num_machines, send_dispatch='queued', clock_rate_range=(50, 50),
+                            internal_event_probability=0)
+        deadline = time.monotonic() + 5.0
+        while any(vm.last_received_message is None or len(vm.transport.peer_stats()) < self.num_machines - 1
+                  for vm in self.machines):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        for vm in self.machines:
+            self.assertEqual(sorted(vm.transport.peer_stats()), [i for i in range(self.num_machines) if i != vm.machine_id])
+            self.assertEqual(vm.transport.stats['send_dropped'], 0)
+
+    def test_queued_dispatch_shared_memory(self):
+        """Test that queued send dispatch is refused for the shared memory transport"""
+        with self.assertRaises(ValueError):
+            VirtualMachine(0, 3, 'localhost', 0, transport='shared_memory', send_dispatch='queued')
+
+class TestMessageQueue(ScratchFolder, unittest.TestCase):
+    def make_machine(self, **options):
+        """Create a single machine whose queue is filled by hand"""
+        self.vm = VirtualMachine(0, 3, 'memory', 0, log_dir=self.log_dir, transport=InMemoryNetwork().connect,
+                                 **options)
+        return self.vm
+
+    def tearDown(self):
+        self.vm.stop()
+
+    def test_drain_all(self):
+        """Test that a batch is processed in one tick using the max clock"""
+        vm = self.make_machine(drain_limit=None)
+        for clock in (5, 12, 3):
+            vm._receive(Message(1, clock))
+        vm._tick()
+
+        self.assertTrue(vm.message_queue.empty())
+        self.assertEqual(vm.logical_clock, 13)
+
+    def test_drain_limit(self):
+        """Test that at most drain_limit messages are processed per tick"""
+        vm = self.make_machine(drain_limit=2)
+        for clock in range(5):
+            vm._receive(Message(1, clock))
+        vm._tick()
+
+        self.assertEqual(vm.message_queue.qsize(), 3)
+        self.assertEqual(vm.logical_clock, 2)
+
+    def test_drop(self):
+        """Test that a full queue drops new messages"""
+        vm = self.make_machine(queue_limit=2, backpressure='drop')
+        for clock in range(4):
+            vm._receive(Message(1, clock))
+
+        self.assertEqual(vm.message_queue.qsize(), 2)
+        self.assertEqual(vm.queue_stats['dropped'], 2)
+
+    def test_coalesce(self):
+        """Test that a full queue keeps the largest clock in its newest entry"""
+        vm = self.make_machine(queue_limit=2, backpressure='coalesce')
+        for clock in (1, 2, 9, 4):
+            vm._receive(Message(1, clock))
+
+        self.assertEqual([m.logical_clock for m in vm.message_queue.queue], [1, 9])
+        self.assertEqual(vm.queue_stats['coalesced'], 2)
+
+    def test_coalesce_while_draining(self):
+        """Test that a full queue drained by another thread never loses or miscounts a message"""
+        vm = self.make_machine(queue_limit=1, backpressure='coalesce', drain_limit=None)
+        count = 20000
+        taken = []
+        done = threading.Event()
+
+        def drain():
+            while not done.is_set() or not vm.message_queue.empty():
+                taken.extend(vm._take_messages())
+
+        thread = threading.Thread(target=drain)
+        thread.start()
+        for clock in range(1, count + 1):
+            vm._receive(Message(1, clock, clock))
+        done.set()
+        thread.join()
+
+        self.assertEqual(len(taken) + vm.queue_stats['coalesced'], count)
+        self.assertEqual(max(m.logical_clock for m in taken), count)
+        # every message is either taken or carried by one that is
+        ids = [merged.message_id for m in taken for merged in [m] + (m.coalesced or [])]
+        self.assertEqual(sorted(ids), list(range(1, count + 1)))
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()